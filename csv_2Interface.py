@@ -14,11 +14,13 @@ Data is considered as station, therefore the shape of the output numpy array is:
 __author__= "Nicolai Holzer"
 __author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 __date__ ="2011-04-15"
-__version__ = "v0.1.4" #MajorVersion(backward_incompatible).MinorVersion(backward_compatible).Patch(Bug_fixes)
+__version__ = "v0.1.6" #MajorVersion(backward_incompatible).MinorVersion(backward_compatible).Patch(Bug_fixes)
 
 
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-06-08: v0.1.6 non-numeric cells are summarized per column, optional bad cell report
+#2011-06-07: v0.1.5 CSV file is parsed in one pass with column-wise numpy conversion
 #2001-04-15: v0.1.4 little changes for NcML attributes
 #2011-01-14: v0.1.3 logging implemented, functionalities changed
 #2010-12-14: v0.1.2 parser added, functionalities changed
@@ -30,6 +32,8 @@ __version__ = "v0.1.4" #MajorVersion(backward_incompatible).MinorVersion(backwar
 #-------------------------------------------------------------------------------
 #standard libraries
 import sys
+import os
+import itertools
 import csv #Python integrated API for handling CSV data
 from optparse import OptionParser #Parser
 import logging
@@ -68,6 +72,10 @@ NUMPYDATA_DTYPE = 'float32' #Data type of output numpy array
 NODATA = -9999 #Value to be used for missing or no data in CSV file
 
 CSV_DIALECT = 'excel'
+CSV_CHUNK_ROWS = 65536 #Number of CSV rows that are converted to numpy at once
+CSV_BADCELL_ROWS = 10 #Number of row numbers of non-numeric cells listed per column
+CSV_BADCELL_VALUES = 10 #Number of distinct non-numeric values listed per column
+CSV_BADCELL_SUFFIX = '__badcells.csv' #Filename suffix of report of non-numeric cells
 
 MODULE_LOGGER_ROOT = 'csv' #Logger root name
 
@@ -111,9 +119,8 @@ class ControlModelCsv:
         of the data interface"""
 
         #Make a copy of the CSV-file as numpy file (only numeric values)
-        pDocCsvNumpy = self.pModelCsvRead.createCsvNumpy(self.pParserOptions.dataType)
-        pNumpyData = self.pModelCsvRead.readCsvData(pDocCsvNumpy, \
-            self.pParserOptions.nodataValue, self.pParserOptions.isVarName)
+        pNumpyData = self.pModelCsvRead.readCsvData(self.pParserOptions.dataType, \
+            self.pParserOptions.nodataValue, self.pParserOptions.isVarName, self.pParserOptions.isBadCellReport)
 
         #Optional: Get specific information from Csv-file. Depending on data
         if self.pParserOptions.isSpecificData:
@@ -173,6 +180,7 @@ class ModelCsvRead:
         self.numpyDataName = outfileName+FILENAME_SUFFIX_NUMPYDATA
         self.ncmlName = outfileName+FILENAME_SUFFIX_NCML
         self.numpymetaName = outfileName+FILENAME_SUFFIX_NUMPYXML
+        self.badCellReportName = outfileName+CSV_BADCELL_SUFFIX
 
         #Use Processing Tools
         self.pProcessNcml = ProcessNcml(self.ncmlName)
@@ -185,93 +193,104 @@ class ModelCsvRead:
         #"""Destructor"""
 
 
-    def createCsvNumpy(self, dataType_):
-        """Creates a empty numpy array with same shape as CSV file and return this numpy array.
-        Argument dataType defines the data type of the resulting numpy array."""
-
-        pDocCsv = self.__openCsvFile()
-
-        #Get shape of CSV-file, so that numpy array can be created
-        #Iterate trough all rows and enumerate
-        nCsvRows = 0
-        for csvRow in pDocCsv:
-            nCsvRows = nCsvRows + 1
-        nCsvCols = len(csvRow)
-
-        #Second step: Create empty numpy file for reading input data
-        pDataType = self.pProcessingTool.dataType_2Numpy(dataType_) #Convert to numpy dtype
-        pDocCsvNumpy = numpy.zeros((nCsvRows, nCsvCols), dtype = pDataType)
+    def readCsvData(self, dataType_, nodata_, isVarName_, isBadCellReport_ = False):
+        """
+        Read CSV file in one pass and return numpy array with complete CSV data.
+        Save variable names to variable name list if variable names are available.
 
-        self.pLogger.debug("Number of rows found in cvs-file: '" + str(nCsvRows) + "'") #number of rows, e.g. 2493
-        self.pLogger.debug("Number of columns found in cvs-file: '" + str(nCsvCols) + "'") #number of columns, e.g. 12
-    
-        return pDocCsvNumpy
+        INPUT_PARAMETERS:
+        dataType      - data type of resulting numpy array (string)
+        nodata        - value to be used for cells that are not numeric
+        isVarName     - first row of CSV file contains variable names (bool)
+        isBadCellReport - write all non-numeric cells to report file (bool)
 
+        RETURN_VALUE:
+        Numpy array with CSV data, dimension order: time (rows), variable (columns)
 
-    def readCsvData(self, pDocCsvNumpy_, nodata_, isVarName_):
-        """Save data of CSV file to previously created empty numpy array (pDocCsvNumpy).
-        Returns numpy array with complete CSV data. Save variable names to variable name
-        list if variable names are available"""
+        COMMENTS:
+        Rows are read in chunks of 'CSV_CHUNK_ROWS' and each column of a chunk
+        is converted at once by numpy. The output array grows by doubling its
+        size, so that no preceding pass for counting the rows is necessary.
+        Non-numeric cells are collected per column and logged as one warning
+        per column at the end.
+        """
 
         #Get input dataset and define settings
         #-------------------------------------------------------------------------------
-     
+        pDataType = numpy.dtype(self.pProcessingTool.dataType_2Numpy(dataType_)) #Convert to numpy dtype
+        nodataValue = numpy.cast[pDataType](nodata_) #nodataValue = e.g. float(nodata_)
+
         if isVarName_: #If variable names in first row
             self.pVarNames = list()
 
-        #Open once again CSV file for reading now data to array
-        pDocCsvNumpy = pDocCsvNumpy_
         pDocCsv = self.__openCsvFile()
-        pDataType = pDocCsvNumpy.dtype
+        fileSize = max(os.path.getsize(self.csvFileName), 1)
 
         #Define progress bar settings
         widgetsBar = ['Import status: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
                    ' ', ETA(), ' ', FileTransferSpeed()]
-        progressBar = ProgressBar(widgets=widgetsBar, maxval=pDocCsvNumpy.shape[0]).start()
+        progressBar = ProgressBar(widgets=widgetsBar, maxval=fileSize).start()
 
 
-        #Read CSV-file cell by cell and save it to numpy array
+        #Read CSV-file chunk by chunk and save it to numpy array
         #-------------------------------------------------------------------------------
         #Rows represent time, columns data
-        cnRow = 0 #Counter rows, index is cnRow-1
-        for row in pDocCsv: #Each row in file
-            cnCol = 0 #Counter columns, index is cnCol-1
-            cnRow = cnRow + 1
-            #print cnRow
-
-            for col in row: #Each cell in row
-                cnCol = cnCol + 1
-                #print cnCol
-
-                try: #Only read float values = data values 
-                    input = numpy.cast[pDataType](col) #input = e.g. float(col)
-                    pDocCsvNumpy[cnRow-1, cnCol-1] = input   #save each cell value to numpy array
-
-                    #print 'Value at row:', cnRow, '; column: ', cnCol, '; value: ' \
-                    #, pDocCsvNumpy[cnRow-1, cnCol-1] #Index values beginning with '0', not number of cols, rows
-
-                except: #Values that are not numbers, like alphabetic values or ''
-                    input = numpy.cast[pDataType](nodata_) #input = e.g. float(nodata_)
-                    pDocCsvNumpy[cnRow-1, cnCol-1] = input   #Save default no-data value to cell
-
-                    self.pLogger.warning("Value '" + str(col) + "' at row '" + str(cnRow) + "' and column '" + str(cnCol) + \
-                    "' is not of data type '" + str(pDataType) + "'. Use nodata value '" + str(pDocCsvNumpy[cnRow-1, cnCol-1]) + "' instead.")
-                    #Index values beginning with '0', not number of cols, rows
-
-                    if isVarName_:
-                        if cnRow == 1: #If first row has no numbers, it is assumed that these are the column names
-                            if col != '':
-                                self.pVarNames.append(col) 
-                            else: #If col = '' write col number
-                                self.pVarNames.append('variable #'+str(cnCol-1)) #zero based
-                            #print 'Variable names yet detected at first row:', self.pVarNames
-
-                progressBar.update(cnRow)# Progress bar
-
-        if isVarName_:   #If first row has var_names, delete first row that consists of nodata_values in numpy array
-            pDocCsvNumpy = numpy.delete(pDocCsvNumpy, 0, 0 )
+        pDocCsvNumpy = None
+        nCsvRows = 0 #Number of data rows already stored in numpy array
+        nCsvCols = 0
+        firstRow = 1 #Row number in CSV file of first row of chunk
+
+        while True:
+            pRowList = list(itertools.islice(pDocCsv, CSV_CHUNK_ROWS))
+            if len(pRowList) == 0:
+                break
+
+            if pDocCsvNumpy is None: #First chunk: shape of columns and variable names
+                nCsvCols = len(pRowList[0])
+                pDocCsvNumpy = numpy.empty((CSV_CHUNK_ROWS, nCsvCols), dtype = pDataType)
+                self.__initBadCells(nCsvCols, isBadCellReport_)
+
+                if isVarName_: #First row contains the column names
+                    for cnCol, col in enumerate(pRowList[0]):
+                        if col != '':
+                            self.pVarNames.append(col)
+                        else: #If col = '' write col number
+                            self.pVarNames.append('variable #'+str(cnCol)) #zero based
+                    del pRowList[0]
+                    firstRow = 2
+
+            pChunk = self.__parseCsvRows(pRowList, nCsvCols, pDataType, nodataValue, firstRow)
+
+            if nCsvRows + pChunk.shape[0] > pDocCsvNumpy.shape[0]: #Double size of output array
+                pDocCsvNumpyNew = numpy.empty((max(2*pDocCsvNumpy.shape[0], nCsvRows + pChunk.shape[0]), nCsvCols), \
+                    dtype = pDataType)
+                pDocCsvNumpyNew[:nCsvRows] = pDocCsvNumpy[:nCsvRows]
+                pDocCsvNumpy = pDocCsvNumpyNew
+
+            pDocCsvNumpy[nCsvRows:nCsvRows + pChunk.shape[0]] = pChunk
+            nCsvRows = nCsvRows + pChunk.shape[0]
+            firstRow = firstRow + pChunk.shape[0]
+
+            progressBar.update(min(self.pCsvFile.tell(), fileSize))# Progress bar
+
+        self.pCsvFile.close()
+        progressBar.finish()
+
+        if pDocCsvNumpy is None:
+            raise Exception("Error: CSV file '" + str(self.csvFileName) + "' does not contain any data.")
+
+        pDocCsvNumpy = pDocCsvNumpy[:nCsvRows]
+
+        self.pLogger.debug("Number of rows found in cvs-file: '" + str(nCsvRows) + "'") #number of rows, e.g. 2493
+        self.pLogger.debug("Number of columns found in cvs-file: '" + str(nCsvCols) + "'") #number of columns, e.g. 12
+
+        if isVarName_:
             self.pLogger.info("Detected variable names in first row of file: '" + str(self.pVarNames) + "'")
 
+        self.__logBadCells(pDataType, nodataValue, isVarName_)
+        if isBadCellReport_:
+            self.__writeBadCellReport()
+
         return pDocCsvNumpy
 
 
@@ -377,13 +396,153 @@ class ModelCsvRead:
 
         #csv.reader(csvfile[, dialect='excel'][, fmtparam])
         try:
-            pDocCsv = csv.reader(open(self.csvFileName, 'r') , dialect= CSV_DIALECT)
+            self.pCsvFile = open(self.csvFileName, 'r')
+            pDocCsv = csv.reader(self.pCsvFile, dialect= CSV_DIALECT)
         except:
             raise Exception ("Opening of file '" + str(self.csvFileName) + "' failed. Check if it exists and if filename suffix is set.")
        
         return pDocCsv
 
 
+    def __parseCsvRows(self, pRowList_, nCols_, pDataType_, nodataValue_, firstRow_):
+        """
+        Convert a chunk of CSV rows to a numpy array of data type 'pDataType'. Cells that
+        are not numeric, like alphabetic values or '', are set to 'nodataValue'.
+
+        INPUT_PARAMETERS:
+        pRowList      - list of CSV rows, each row as list of strings
+        nCols         - number of columns of CSV file (int)
+        pDataType     - numpy data type of resulting array
+        nodataValue   - value for cells that are not numeric
+        firstRow      - row number in CSV file of first row in list (int)
+
+        RETURN_VALUE:
+        Numpy array with shape (len(pRowList), nCols)
+        """
+
+        #Rows with a differing number of cells are cut or filled up with ''
+        if any(len(row) != nCols_ for row in pRowList_):
+            pRowList_ = [row[:nCols_] + [''] * (nCols_ - len(row)) for row in pRowList_]
+
+        pCells = numpy.array(pRowList_, dtype = str).reshape(len(pRowList_), nCols_)
+        pChunk = numpy.empty(pCells.shape, dtype = pDataType_)
+
+        for cnCol in range(nCols_):
+            pColumn = pCells[:, cnCol]
+            try: #Fast path: complete column is numeric, converted directly so that integers are not rounded
+                pChunk[:, cnCol] = pColumn.astype(pDataType_)
+            except (ValueError, OverflowError):
+                #Test each distinct string only once, numeric mask for column by index
+                pUnique, pInverse = numpy.unique(pColumn, return_inverse = True)
+                pIsNumber = numpy.array([self.__isNumber(value, pDataType_) for value in pUnique], dtype = bool)
+                pValid = pIsNumber[pInverse]
+
+                pChunk[:, cnCol] = nodataValue_
+                pChunk[pValid, cnCol] = pColumn[pValid].astype(pDataType_)
+
+                #Count of each distinct non-numeric value in this chunk
+                pCounts = numpy.bincount(pInverse)
+                pBadValues = dict()
+                for cnUnique in numpy.flatnonzero(~pIsNumber):
+                    pBadValues[pUnique[cnUnique]] = pCounts[cnUnique]
+
+                pBadIndex = numpy.flatnonzero(~pValid)
+                self.__addBadCells(cnCol, pBadIndex + firstRow_, pColumn[pBadIndex], pBadValues)
+
+        return pChunk
+
+
+    def __initBadCells(self, nCols_, isBadCellReport_):
+        """Initialize collection of non-numeric cells for each of 'nCols' columns. If
+        'isBadCellReport' is set, all positions are kept for the report file, otherwise only
+        the first 'CSV_BADCELL_ROWS' positions per column"""
+
+        self.isBadCellReport = isBadCellReport_
+        self.pBadCells = list()
+        for cnCol in range(nCols_):
+            self.pBadCells.append({'count': 0, 'rows': list(), 'values': list(), 'distinct': dict()})
+
+        return
+
+
+    def __addBadCells(self, cnCol_, pRows_, pValues_, pDistinct_):
+        """Add non-numeric cells of one column of a chunk to collection. pRows: row numbers
+        in CSV file (numpy array), pValues: cell values (numpy array), pDistinct: dictionary of
+        distinct values with number of occurrences"""
+
+        pBadCell = self.pBadCells[cnCol_]
+
+        if not self.isBadCellReport: #Only keep first row numbers for summary
+            nRowsMissing = CSV_BADCELL_ROWS - min(pBadCell['count'], CSV_BADCELL_ROWS)
+            pRows_ = pRows_[:nRowsMissing]
+            pValues_ = pValues_[:nRowsMissing]
+
+        if len(pRows_) > 0:
+            pBadCell['rows'].append(pRows_)
+            pBadCell['values'].append(pValues_)
+
+        pBadCell['count'] = pBadCell['count'] + sum(pDistinct_.values())
+        for value, count in pDistinct_.items():
+            pBadCell['distinct'][value] = pBadCell['distinct'].get(value, 0) + count
+
+        return
+
+
+    def __logBadCells(self, pDataType_, nodataValue_, isVarName_):
+        """Log one warning for each column that contains non-numeric cells"""
+
+        for cnCol, pBadCell in enumerate(self.pBadCells):
+            if pBadCell['count'] == 0:
+                continue
+
+            colName = str(cnCol + 1)
+            if isVarName_:
+                colName = colName + " ('" + str(self.pVarNames[cnCol]) + "')"
+
+            pFirstRows = numpy.concatenate(pBadCell['rows'])[:CSV_BADCELL_ROWS]
+            pDistinct = sorted(pBadCell['distinct'].items(), key = lambda item: item[1], reverse = True)
+
+            self.pLogger.warning("Column " + colName + " contains '" + str(pBadCell['count']) + \
+                "' values that are not of data type '" + str(pDataType_) + "'. Use nodata value '" + \
+                str(nodataValue_) + "' instead. First rows: '" + str(pFirstRows.tolist()) + \
+                "'; Distinct values (value, count) of '" + str(len(pDistinct)) + "': '" + \
+                str(pDistinct[:CSV_BADCELL_VALUES]) + "'")
+
+        return
+
+
+    def __writeBadCellReport(self):
+        """Write all non-numeric cells as CSV file with row, column and value to
+        report file 'badCellReportName'"""
+
+        self.pLogger.info("Report of non-numeric cells will be saved as '" + str(self.badCellReportName) + "'...")
+
+        pReportFile = open(self.badCellReportName, 'w')
+        pReport = csv.writer(pReportFile, dialect = CSV_DIALECT)
+        pReport.writerow(['row', 'column', 'value'])
+
+        for cnCol, pBadCell in enumerate(self.pBadCells):
+            if pBadCell['count'] == 0:
+                continue
+            pRows = numpy.concatenate(pBadCell['rows'])
+            pValues = numpy.concatenate(pBadCell['values'])
+            pReport.writerows(zip(pRows.tolist(), [cnCol + 1] * len(pRows), pValues.tolist()))
+
+        pReportFile.close()
+        return
+
+
+    def __isNumber(self, value_, pDataType_):
+        """Return True if string can be converted to a number of numpy data type 'pDataType',
+        e.g. '1.5' is no number of an integer data type"""
+
+        try:
+            pDataType_.type(value_)
+            return True
+        except (ValueError, OverflowError):
+            return False
+
+
     #Data specific functions
     #-------------------------------------------------------------------------------
 
@@ -393,9 +552,9 @@ class ModelCsvRead:
         Example: Scale data values in case that units prefix have to be changed
         (e.g. from hPa to Pa) due to defined unit in standard_name entry."""
 
-        #pCsvData = numpy.load(self.numpyDataName)
+        #pCsvData = numpy.load(self.numpyDataName, mmap_mode='r+') #Data is converted in place
         #--> Nothing to do at the moment
-        #numpy.save(self.numpyDataName, pCsvData) #Better then 'tofile'. Also possible: 'dump'
+        #pCsvData = self.pProcessingTool.convertNumpyDataUnits(pCsvData, 0, 'hPa', 'Pa', None, self.pProcessNcml, 'variable_name')
 
         return
 
@@ -474,6 +633,7 @@ def main():
     pParser.set_defaults(isSpecificData = False)
     pParser.set_defaults(dataType = NUMPYDATA_DTYPE)
     pParser.set_defaults(isVarName = False) #First row of CSV file contains variable name information
+    pParser.set_defaults(isBadCellReport = False)
 
 
     pParser.add_option("-c", "--complModel", action="store_true",  dest='completeModel', help="Complete data model by functions particularly written for specific data (default = %default)")
@@ -481,6 +641,7 @@ def main():
     pParser.add_option('-l', '--log', action = 'store', dest='logLevel', choices = ['debug','info','warning','error','critical'], nargs = 1, help="Minimum level for printing information to the console (default = %default)")
     pParser.add_option('-n', '--nodata', action = 'store', dest='nodataValue', nargs = 1, help="Set nodata value (default = %default)")
     pParser.add_option('-p', '--path', action = 'store', type ='string', dest='dataPath', nargs = 1, help="Directory for input / output files (default = %default)")
+    pParser.add_option('-r', '--report', action='store_true',  dest='isBadCellReport', help="Write all non-numeric cells to report file with suffix '" + CSV_BADCELL_SUFFIX + "' (default = %default)")
     pParser.add_option('-s', '--specData', action='store_true',  dest='isSpecificData', help="Only extract specific data as implemented in function 'choseSpecificData' (default = %default)")
     pParser.add_option('-t', '--dtype', action = 'store', dest='dataType', choices = [''] + NUMPY_DTYPES, nargs = 1, help="Define output data type of numpy array (default = %default)")
     pParser.add_option('-v', '--varNames', action='store_true',  dest='isVarName', help='First row in CSV file contains variable names (default = %default)')
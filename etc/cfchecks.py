@@ -22,11 +22,14 @@
 #__author__= "Nicolai Holzer"
 #__author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 #__date__ ="2011-01-05"
-#__version__ = "v0.1.0"
+#__version__ = "v0.1.3"
 #
 #
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-05-06: v0.1.3 monotonic check of coordinate values vectorized
+#2011-05-04: v0.1.2 checks can be run on a netCDF4 handle and the internal data model instead of cdms
+#2011-05-02: v0.1.1 compiled standard name and area type tables cached, udunits read once
 #2010-12-21: v0.1.0 program adapted so that it can also be run from the data interface
 #
 #===============================================================================
@@ -53,10 +56,24 @@ Options:
 '''
 
 from sys import *
-import cdms2 as cdms, re, string, types, numpy.oldnumeric as Numeric, numpy
+import re, string, types, numpy.oldnumeric as Numeric, numpy
 
-from cdms2.axis import FileAxis
-from cdms2.auxcoord import FileAuxAxis1D
+#===============================================================================
+#cdms is only needed if files are not checked by the use of the netCDF4 adapter (see class 'NetCdfDatasetAdapter')
+try:
+    import cdms2 as cdms
+    from cdms2.axis import FileAxis
+    from cdms2.auxcoord import FileAuxAxis1D
+except ImportError:
+    cdms = None
+    FileAxis = () #isinstance(x, ()) is always False
+    FileAuxAxis1D = ()
+
+try:
+    from netCDF4 import Dataset
+except ImportError:
+    Dataset = None
+#===============================================================================
 
 # Use ctypes to interface to the UDUNITS-2 shared library
 # The udunits2 library needs to be in a standard path o/w export LD_LIBRARY_PATH
@@ -91,10 +108,132 @@ from xml.sax import make_parser
 from xml.sax.handler import feature_namespaces
 
 
+#===============================================================================
+# New: Cache of compiled standard name / area type tables and udunits systems
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import hashlib
+
+TABLE_CACHE_SUFFIX = '.pickle' #Compiled table is saved next to the xml file with this suffix
+
+pTableCache = {} #Compiled tables resident in this process, key: (xml file name, md5 digest)
+pUnitSystemCache = {} #udunits unit systems resident in this process, key: udunits xml file name
+
+
+class CompiledTable:
+    """Plain container for a parsed standard name or area type table. Provides the same
+    attributes as 'ConstructDict' (dict) and 'ConstructList' (list) without the parser state"""
+
+    def __init__(self, handler_=None):
+        self.dict = getattr(handler_, 'dict', {})
+        self.list = getattr(handler_, 'list', [])
+        self.version_number = getattr(handler_, 'version_number', '')
+        self.last_modified = getattr(handler_, 'last_modified', '')
+
+
+def getFileDigest(filename_):
+    """Return md5 hex digest of the content of file 'filename'"""
+
+    pMd5 = hashlib.md5()
+    pFile = open(filename_, 'rb')
+    try:
+        while True:
+            block = pFile.read(1048576)
+            if not block:
+                break
+            pMd5.update(block)
+    finally:
+        pFile.close()
+    return pMd5.hexdigest()
+
+
+def loadCompiledTable(xmlFile_, handlerClass_):
+    """
+    Return parsed xml table 'xmlFile' as 'CompiledTable' instance.
+
+    INPUT_PARAMETERS:
+    xmlFile         - name of standard name or area type xml table
+    handlerClass    - SAX content handler class used for parsing ('ConstructDict' or 'ConstructList')
+
+    COMMENTS:
+    The table is only parsed when its content changed: the parsed result is kept in memory
+    for all following checks in this process and pickled to 'xmlFile'+TABLE_CACHE_SUFFIX,
+    keyed by the md5 digest of the xml file.
+    """
+
+    digest = getFileDigest(xmlFile_)
+    key = (xmlFile_, digest)
+    if pTableCache.has_key(key):
+        return pTableCache[key]
+
+    #Try compiled table on disk
+    cacheFileName = xmlFile_ + TABLE_CACHE_SUFFIX
+    pTable = None
+    try:
+        pCacheFile = open(cacheFileName, 'rb')
+        try:
+            (cacheDigest, cacheHandler, pTableContent) = pickle.load(pCacheFile)
+        finally:
+            pCacheFile.close()
+        if cacheDigest == digest and cacheHandler == handlerClass_.__name__:
+            pTable = CompiledTable()
+            pTable.__dict__.update(pTableContent)
+    except Exception: #Missing, outdated or corrupt cache file
+        pTable = None
+
+    #Parse xml table and save compiled table
+    if pTable is None:
+        parser = make_parser()
+        parser.setFeature(feature_namespaces, 0)
+        pHandler = handlerClass_()
+        parser.setContentHandler(pHandler)
+        parser.parse(xmlFile_)
+        pTable = CompiledTable(pHandler)
+
+        try:
+            pCacheFile = open(cacheFileName, 'wb')
+            try:
+                pickle.dump((digest, handlerClass_.__name__, pTable.__dict__), pCacheFile, pickle.HIGHEST_PROTOCOL)
+            finally:
+                pCacheFile.close()
+        except (IOError, OSError): #Read-only directory: keep table only in memory
+            pass
+
+    pTableCache[key] = pTable
+    return pTable
+
+
+def loadUnitSystem(udunitsXml_):
+    """Return udunits unit system of xml database 'udunitsXml'. The database is only read
+    once per process, otherwise 'None' is returned if it could not be read."""
+
+    if pUnitSystemCache.has_key(udunitsXml_):
+        return pUnitSystemCache[udunitsXml_]
+
+    # Temporarily ignore messages to std error stream to prevent "Definition override" warnings
+    # being dislayed see Trac #50
+    uemh = CFUNCTYPE(c_int,c_char_p)
+    ut_set_error_message_handler = CFUNCTYPE(uemh,uemh)(("ut_set_error_message_handler",udunits))
+    ut_write_to_stderr = uemh(("ut_write_to_stderr",udunits))
+    ut_ignore = uemh(("ut_ignore",udunits))
+
+    old_handler = ut_set_error_message_handler(ut_ignore)
+    unitSystem = udunits.ut_read_xml(udunitsXml_)
+    old_handler = ut_set_error_message_handler(ut_write_to_stderr)
+
+    if not unitSystem:
+        return None
+    pUnitSystemCache[udunitsXml_] = unitSystem
+    return unitSystem
+
+
 #===============================================================================
 # New function
 
-def startCfChecksFromInterface(infile_):
+def startCfChecksFromInterface(infile_, pVarList_=None, pNetCdf_=None):
     """
     Function to run the CfChecker out from another program.
 
@@ -104,9 +243,14 @@ def startCfChecksFromInterface(infile_):
 
     INPUT_PARAMETERS:
     infile      - name of NetCDF file with filename suffix
+    VarList     - optional: variable list of the internal data model. Data attached to these
+                  variables is used for value checks instead of reading it again from the file
+    NetCdf      - optional: already opened netCDF4 Dataset of the file that is shared with the checker
 
     COMMENTS:
     Other changes marked within '==========' notation in the program code
+    If the netCDF4 module is available the file is not opened with cdms but checked through
+    the adapter class 'NetCdfDatasetAdapter'.
     """
 
     #code obtained and adapted from function 'def getargs(arglist)'
@@ -155,13 +299,233 @@ def startCfChecksFromInterface(infile_):
     inst = CFChecker(uploader=uploader, useFileName=useFileName, badc=badc, coards=coards, cfStandardNamesXML=standardName, cfAreaTypesXML=areaTypes, udunitsDat=udunitsDat, version=version)
 
     #Check file
-    rc = inst.checker(files)
+    if pNetCdf_ is None and Dataset is None: #Fall back to cdms
+        rc = inst.checker(files)
+    else:
+        if not os.path.exists(files):
+            raise Exception("Error in CfCheck: File '" + str(files) + "' does not exist in current directory '" + str(os.getcwd()) + "'.")
+
+        if pNetCdf_ is None: #Open lazy netCDF4 handle, data values are only read on request
+            pNetCdf = Dataset(files, 'r')
+        else:
+            pNetCdf = pNetCdf_
+        try:
+            rc = inst.checker(files, NetCdfDatasetAdapter(pNetCdf, pVarList_))
+        finally:
+            if pNetCdf_ is None:
+                pNetCdf.close()
     #rc > 0 --> Number of errors that occured;
     #rc < 0 --> Number of warnings that occured (no errors occured)
     #rc == 0 --> No errors and warnings occured
     
     return rc #Return error status
 
+
+def convertAttributeValue(value_):
+    """Convert a netCDF4 attribute value to the type that is returned by cdms: strings as
+    'str' and numeric values as one dimensional numpy array"""
+
+    if isinstance(value_, basestring):
+        return str(value_)
+    return numpy.array(value_, ndmin=1)
+
+
+class NetCdfVariableAdapter:
+    """
+    Adapter providing the part of the cdms 'FileVariable' interface that is used by 'CFChecker'
+    for a variable of an opened netCDF4 Dataset.
+
+    Attributes are read once from the NetCDF handle, data values are taken from the data
+    array of the internal data model if it is given, otherwise they are read lazily from the
+    NetCDF handle when 'getValue' is called.
+    """
+
+    def __init__(self, name_, pNetCdfVar_, pDataNumpy_=None):
+        self.attributes = dict()
+        for attrName in pNetCdfVar_.ncattrs():
+            self.attributes[str(attrName)] = convertAttributeValue(pNetCdfVar_.getncattr(attrName))
+        self.__dict__.update(self.attributes) #cdms provides attributes also as members, e.g. 'var.units'
+
+        self.id = str(name_)
+        self._obj_ = pNetCdfVar_ #'_obj_.dimensions' is used by the checker
+        self.pDataNumpy = pDataNumpy_
+        self.shape = tuple(pNetCdfVar_.shape)
+        if pNetCdfVar_.dtype.kind == 'S': #NetCDF char variable, 'c' in cdms
+            self.dtype = numpy.dtype('c')
+        else:
+            self.dtype = numpy.dtype(pNetCdfVar_.dtype)
+
+    def __len__(self):
+        if len(self.shape) == 0:
+            return 0
+        return self.shape[0]
+
+    def getAxisIds(self):
+        return [str(dim) for dim in self._obj_.dimensions]
+
+    def getAxisIndex(self, axisId_):
+        pAxisIds = self.getAxisIds()
+        if axisId_ in pAxisIds:
+            return pAxisIds.index(axisId_)
+        return -1
+
+    def typecode(self):
+        return self.dtype.char
+
+    def getValue(self):
+        if self.pDataNumpy is not None:
+            return self.pDataNumpy
+        return self._obj_[:]
+
+    def isTime(self):
+        if self.attributes.get('axis', '') == 'T':
+            return True
+        if self.id.lower() in TIME:
+            return True
+        return ' since ' in str(self.attributes.get('units', ''))
+
+
+class NetCdfAxisAdapter(NetCdfVariableAdapter):
+    """Adapter for a coordinate variable (one dimensional variable with the same name as its
+    dimension), corresponds to the cdms 'FileAxis'"""
+
+
+class NetCdfDimensionAdapter:
+    """Adapter for a dimension without coordinate variable, corresponds to a cdms virtual axis"""
+
+    def __init__(self, name_, length_):
+        self.id = str(name_)
+        self.attributes = dict()
+        self.shape = (int(length_),)
+        self.dtype = numpy.dtype(numpy.int32)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def getAxisIds(self):
+        return [self.id]
+
+    def getAxisIndex(self, axisId_):
+        if axisId_ == self.id:
+            return 0
+        return -1
+
+    def typecode(self):
+        return self.dtype.char
+
+    def getValue(self):
+        return numpy.arange(self.shape[0], dtype=self.dtype)
+
+    def isTime(self):
+        return False
+
+
+class NetCdfVariableTable:
+    """Holds all variables including coordinate variables, corresponds to cdms 'file._file_'"""
+
+    def __init__(self, pVariables_):
+        self.variables = pVariables_
+
+
+class NetCdfDatasetAdapter:
+    """
+    Adapter providing the part of the cdms 'CdmsFile' interface that is used by 'CFChecker'
+    for an opened netCDF4 Dataset, so that the checker neither needs cdms nor reopens the file.
+
+    INPUT_PARAMETERS:
+    NetCdf      - opened netCDF4 Dataset, may be shared with the caller
+    VarList     - optional: variable list of the internal data model, attached data arrays are
+                  used for the value checks
+    """
+
+    def __init__(self, pNetCdf_, pVarList_=None):
+
+        pDataDict = dict() #In-memory data of the internal model, key: variable name
+        if pVarList_ is not None:
+            for pVar in pVarList_:
+                try:
+                    pDataDict[pVar.getName()] = pVar.getData()
+                except AttributeError: #No data attached to variable
+                    pass
+
+        self.attributes = dict()
+        for attrName in pNetCdf_.ncattrs():
+            self.attributes[str(attrName)] = convertAttributeValue(pNetCdf_.getncattr(attrName))
+
+        self.axes = dict() #Coordinate variables and dimensions
+        self.variables = dict() #Variables without coordinate variables
+        pAllVariables = dict() #All variables including coordinate variables
+
+        for varName, pNetCdfVar in pNetCdf_.variables.items():
+            varName = str(varName)
+            pDimensions = [str(dim) for dim in pNetCdfVar.dimensions]
+            if len(pDimensions) == 1 and pDimensions[0] == varName:
+                pVar = NetCdfAxisAdapter(varName, pNetCdfVar, pDataDict.get(varName))
+                self.axes[varName] = pVar
+            else:
+                pVar = NetCdfVariableAdapter(varName, pNetCdfVar, pDataDict.get(varName))
+                self.variables[varName] = pVar
+            pAllVariables[varName] = pVar
+
+        for dimName, pDim in pNetCdf_.dimensions.items():
+            dimName = str(dimName)
+            if not self.axes.has_key(dimName):
+                self.axes[dimName] = NetCdfDimensionAdapter(dimName, len(pDim))
+
+        self._file_ = NetCdfVariableTable(pAllVariables)
+        self.dimensions = dict((str(dimName), len(pDim)) for dimName, pDim in pNetCdf_.dimensions.items()) #Length by dimension name
+
+    def __getitem__(self, name_):
+        if self._file_.variables.has_key(name_):
+            return self._file_.variables[name_]
+        return self.axes[name_]
+
+
+def getCfTableFileNames():
+    """Return tuple (udunits xml, standard name table, area type table) of the files that are used
+    by function 'startCfChecksFromInterface' (environment variables or defaults)"""
+
+    from os import environ
+
+    udunitsDat=UDUNITS
+    standardName=STANDARDNAME
+    areaTypes=AREATYPES
+    if environ.has_key('UDUNITS'):
+        udunitsDat=environ['UDUNITS']
+    if environ.has_key('CF_STANDARD_NAMES'):
+        standardName=environ['CF_STANDARD_NAMES']
+    if environ.has_key('CF_AREA_TYPES'):
+        areaTypes=environ['CF_AREA_TYPES']
+
+    return (udunitsDat.strip(), standardName.strip(), areaTypes.strip())
+
+
+def preloadCfTables():
+    """
+    Load the udunits database and the compiled standard name and area type tables into the
+    cache of this process, using the same files as function 'startCfChecksFromInterface'.
+    Can be used as initializer for worker processes.
+    """
+
+    (udunitsDat, standardName, areaTypes) = getCfTableFileNames()
+
+    loadUnitSystem(udunitsDat)
+    loadCompiledTable(standardName, ConstructDict)
+    loadCompiledTable(areaTypes, ConstructList)
+    return
+
+
+def getCfCheckerVersions():
+    """Return list of strings identifying the result of a check: checker version, CF version,
+    standard name table version and area type table version"""
+
+    (udunitsDat, standardName, areaTypes) = getCfTableFileNames()
+
+    pStdNameTable = loadCompiledTable(standardName, ConstructDict)
+    pAreaTypeTable = loadCompiledTable(areaTypes, ConstructList)
+    return [checkerVersion, str(Versions[-1]), pStdNameTable.version_number + " (" + pStdNameTable.last_modified + ")", \
+        pAreaTypeTable.version_number + " (" + pAreaTypeTable.last_modified + ")"]
+
 #===============================================================================
 
 
@@ -344,7 +708,7 @@ class CFChecker:
       self.warn = 0
       self.info = 0
 
-  def checker(self, file):
+  def checker(self, file, pDataset_=None):
     # Set up dictionary of all valid attributes, their type and use
     self.setUpAttributeList()
     fileSuffix = re.compile('^\S+\.nc$')
@@ -368,35 +732,22 @@ class CFChecker:
         exit(1)
 
     # Initialize udunits-2 package
-    # (Temporarily ignore messages to std error stream to prevent "Definition override" warnings
-    # being dislayed see Trac #50)
-    # Use ctypes callback functions to declare ut_error_message_handler (uemh)
-    # Don't fully understand why this works!  Solution supplied by ctypes-mailing-list. 19.01.10
-    uemh = CFUNCTYPE(c_int,c_char_p)
-    ut_set_error_message_handler = CFUNCTYPE(uemh,uemh)(("ut_set_error_message_handler",udunits))
-    ut_write_to_stderr = uemh(("ut_write_to_stderr",udunits))
-    ut_ignore = uemh(("ut_ignore",udunits))
+    #===============================================================================
 
-    old_handler = ut_set_error_message_handler(ut_ignore)
-    
-    self.unitSystem=udunits.ut_read_xml(self.udunits)
+    #udunits database and xml tables are only read once per process (and tables compiled once
+    #per content), see function 'loadCompiledTable'
+    self.unitSystem=loadUnitSystem(self.udunits)
     if not self.unitSystem:
         exit("Could not read the UDUNITS2 xml database from: %s" % self.udunits)
 
-    old_handler = ut_set_error_message_handler(ut_write_to_stderr)
-
     # Set up dictionary of standard_names and their assoc. units
-    parser = make_parser()
-    parser.setFeature(feature_namespaces, 0)
-    self.std_name_dh = ConstructDict()
-    parser.setContentHandler(self.std_name_dh)
-    parser.parse(self.standardNames)
+    self.std_name_dh = loadCompiledTable(self.standardNames, ConstructDict)
 
     if self.version >= 1.4:
         # Set up list of valid area_types
-        self.area_type_lh = ConstructList()
-        parser.setContentHandler(self.area_type_lh)
-        parser.parse(self.areaTypes)
+        self.area_type_lh = loadCompiledTable(self.areaTypes, ConstructList)
+
+    #===============================================================================
     
     print "Using CF Checker Version",checkerVersion
     print "Using Standard Name Table Version "+self.std_name_dh.version_number+" ("+self.std_name_dh.last_modified+")"
@@ -410,8 +761,12 @@ class CFChecker:
 
     #Additional error message added.
 
+    #Adapter of already opened file is used instead of cdms if it is given (see 'NetCdfDatasetAdapter')
+
     try:
-        if not os.path.exists(file):
+        if pDataset_ is not None:
+            self.f=pDataset_
+        elif not os.path.exists(file):
             raise Exception("Error in CfCheck: File '" + str(file) + "' does not exist in current directory '" + str(os.getcwd()) + "'.")
         else:
             self.f=cdms.open(file,"r")
@@ -509,7 +864,9 @@ class CFChecker:
             # I.e. Multi-dimensional coordinate var with a dimension of the same name
             # or an axis that hasn't been identified through the coordinates attribute
             # CRM035 (17.04.07)
-            if not (isinstance(self.f[var], FileAxis) or isinstance(self.f[var], FileAuxAxis1D)):
+            #===============================================================================
+            if not (isinstance(self.f[var], FileAxis) or isinstance(self.f[var], FileAuxAxis1D) or isinstance(self.f[var], NetCdfAxisAdapter)):
+            #===============================================================================
                 print "WARNING (5): Possible incorrect declaration of a coordinate variable."
                 self.warn = self.warn+1
             else:    
@@ -2280,42 +2637,20 @@ class CFChecker:
     rc=1
     var=self.f[varName]
     values=var.getValue()
-    i=0
-    for val in values[:]:
-        if i == 0:
-            # First value - no comparison to do
-            i=i+1
-            lastVal=val
-            continue
-        elif i == 1:
-            i=i+1
-            if val < lastVal:
-                # Decreasing sequence
-                type='decr'
-            elif val > lastVal:
-                # Increasing sequence
-                type='incr'
-            else:
-                # Same value - ERROR
-                print "ERROR (5): co-ordinate variable '" + var.id + "' not monotonic"
-                self.err = self.err+1
-                return 1
-
-            lastVal=val
-        else:
-            i=i+1
-            if val < lastVal and type != 'decr':
-                # ERROR - should be increasing value
-                print "ERROR (5): co-ordinate variable '" + var.id + "' not monotonic"
-                self.err = self.err+1
-                return 1
-            elif val > lastVal and type != 'incr':
-                # ERROR - should be decreasing value
-                print "ERROR (5): co-ordinate variable '" + var.id + "' not monotonic"
-                self.err = self.err+1
-                return 1
+    #===============================================================================
+    #Vectorized: sign of differences instead of comparing value by value in a loop
+    values=numpy.ma.getdata(numpy.ma.asarray(values)).ravel().astype(numpy.float64)
+    if values.size < 2:
+        return rc
+
+    diffs=numpy.diff(values)
+    if not ((diffs > 0).all() or (diffs < 0).all()):
+        print "ERROR (5): co-ordinate variable '" + var.id + "' not monotonic"
+        self.err = self.err+1
+        rc=0
 
-            lastVal=val
+    return rc
+    #===============================================================================
 
 
 def getargs(arglist):
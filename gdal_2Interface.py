@@ -14,11 +14,19 @@ Data is considered as grid, therefore the shape of the output numpy array is:
 __author__= "Nicolai Holzer"
 __author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 __date__ ="2011-04-15"
-__version__ = "v0.1.4" #MajorVersion(backward_incompatible).MinorVersion(backward_compatible).Patch(Bug_fixes)
+__version__ = "v0.1.12" #MajorVersion(backward_incompatible).MinorVersion(backward_compatible).Patch(Bug_fixes)
 
 
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-06-01: v0.1.12 band statistics (optionally approximate) cached by file modification time and size
+#2011-05-31: v0.1.11 operation 'gdalStack': files of single dates stacked into one data model
+#2011-05-30: v0.1.10 reprojection by cached source pixel index maps
+#2011-05-27: v0.1.9 operation 'reproject2Model': image warped in memory and converted in the same process
+#2011-05-26: v0.1.8 option to read band windows concurrently by worker threads
+#2011-05-25: v0.1.7 GDAL file converted window by window into a memory mapped numpy file, NCML metadata derived from dataset
+#2011-05-24: v0.1.6 raster bands read in native data type if not converted losslessly by GDAL, operation 'benchmark' added
+#2011-05-23: v0.1.5 raster bands read in block aligned windows into numpy buffers
 #2001-04-15: v0.1.4 little changes for NcML attributes
 #2011-01-14: v0.1.3 logging implemented, functionalities changed
 #2010-12-14: v0.1.2 parser added, functionalities changed
@@ -31,19 +39,33 @@ __version__ = "v0.1.4" #MajorVersion(backward_incompatible).MinorVersion(backwar
 #standard libraries
 from decimal import * #Needed for data conversion from sting to float list
 import sys
+import os
 import struct
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import glob
+import re
+from datetime import datetime
 from optparse import OptionParser #Parser
 import logging
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import Queue
 
 #related libraries
 import numpy
 
 try: #Import GDAL
     from osgeo import gdal
+    from osgeo import osr
     from osgeo.gdalconst import *
     gdal.TermProgress = gdal.TermProgress_nocb
 except ImportError:
     import gdal
+    import osr
     from gdalconst import *
 
 #local applications / library specific import
@@ -62,10 +84,14 @@ USAGE = "%prog [options] operation data\
     \noperation:\
     \n    - reproject       Reproject image to defined projection and extend\
     \n    - gdal2Model      Convert GDAL raster image file to data model\
+    \n    - reproject2Model Reproject image in memory and convert it to data model (keep reprojected image by option [-k])\
     \n    - printGdal       Read GDAL file and print it on screen\
+    \n    - gdalStack       Stack files of single dates, sorted by the date in the file name (see option [-f]), into one data model\
+    \n    - benchmark       Compare reading of in-memory Byte and Int16 rasters in native data type and as 'float32'\
     \n\
     \ndata:\
-    \n    Raster data file that is readable by the GDAL library"
+    \n    Raster data file that is readable by the GDAL library (operation 'benchmark': name of in-memory rasters,\
+    \n    operation 'gdalStack': file name pattern with wildcards, e.g. 'flood_*.tif')"
 
 DESCRIPTION= "Conversion tool of CEOP-AEGIS data model for GDAL readable raster data"
 EPILOG = "Author: "+__author__+" (E-mail: "+__author_email__+")"
@@ -96,6 +122,29 @@ EXTEND = [LAT_MIN, LAT_MAX, LON_MIN, LON_MAX]
 RASTER_XSIZE = 200
 RASTER_YSIZE = 100
 
+BENCHMARK_BANDS = 4 #Default number of bands of the benchmark rasters
+BENCHMARK_REPEAT = 3 #Number of reads per benchmark raster and data type, the fastest read is reported
+
+
+GDAL_WINDOW_ROWS = 0 #Number of raster rows read at once, if set to 0 use multiple of block height of band
+GDAL_WINDOW_ELEMENTS = 4194304 #Maximum number of values of a window read at once if GDAL_WINDOW_ROWS is 0
+GDAL_WORKERS = 1 #Number of worker threads reading band windows concurrently, if set to 0 use number of CPUs
+GDAL_WARP_MEMORY = 256 #Memory in MB used by GDAL for warping during reprojection, if set to 0 use GDAL default
+GDAL_VSIMEM_PATH = '/vsimem/' #GDAL virtual file system in memory for temporary reprojected images
+GDAL_RESAMPLING = 'nearest' #Resampling method of reprojection: 'nearest' or 'bilinear'
+GDAL_INDEXMAP_DIRECTORY = '.indexmapcache' #Directory for cached source pixel index maps of reprojections
+GDAL_STATS_DIRECTORY = '.gdalstatscache' #Directory for cached band statistics of GDAL files
+
+pIndexMapCache = {} #Source pixel index maps of reprojections already used in this process
+
+STACK_DATE_PATTERN = '%Y%m%d' #Date in file names of stacked files, with directives of 'datetime.strptime'
+STACK_SUFFIX = '_stack' #String added to the name of the first stacked file to get the name of the data model
+STACK_DATE_DIRECTIVES = {'%Y': r'\d{4}', '%y': r'\d{2}', '%m': r'\d{2}', '%d': r'\d{2}', '%j': r'\d{3}', \
+    '%H': r'\d{2}', '%M': r'\d{2}', '%S': r'\d{2}'} #Regular expressions of supported directives
+GDAL_NUMPY_DTYPES = {'Byte': numpy.dtype(numpy.uint8), 'Int16': numpy.dtype(numpy.int16), 'UInt16': numpy.dtype(numpy.uint16), \
+    'Int32': numpy.dtype(numpy.int32), 'UInt32': numpy.dtype(numpy.uint32), 'Float32': numpy.dtype(numpy.float32), \
+    'Float64': numpy.dtype(numpy.float64)} #GDAL data types and the related numpy data types
+
 
 MODULE_LOGGER_ROOT = 'gdal' #Logger root name
 
@@ -137,21 +186,58 @@ class ControlModelGdal:
     def reprojectImage(self):
         """Reproject image bands to defined projection PROJECTION_DATAMODEL and extend"""
         self.pModelGdalRead.gdalFileReprojection(self.pParserOptions.extendList, self.pParserOptions.rasterSizeList, \
-            self.pParserOptions.bandNumber, self.pParserOptions.nodataValue)
+            self.pParserOptions.bandNumber, self.pParserOptions.nodataValue, False, self.pParserOptions.warpMemory, \
+            self.pParserOptions.nWorkers, self.pParserOptions.resampling, self.pParserOptions.useIndexMaps)
 
         return
 
 
+    def reprojectImage2Model(self):
+        """Reproject image bands in memory (or to a file if parser option 'keepReprojection' is set) and
+        read the reprojected image in the same process. The data model is named after the reprojected image."""
+
+        inMemory = not self.pParserOptions.keepReprojection
+        reprFileName = self.pModelGdalRead.gdalFileReprojection(self.pParserOptions.extendList, self.pParserOptions.rasterSizeList, \
+            self.pParserOptions.bandNumber, self.pParserOptions.nodataValue, inMemory, self.pParserOptions.warpMemory, \
+            self.pParserOptions.nWorkers, self.pParserOptions.resampling, self.pParserOptions.useIndexMaps)
+
+        self.pModelGdalRead = None #Close input dataset
+        if inMemory:
+            self.pModelGdalRead = ModelGdalRead(reprFileName, self.__getReprojectionModelName(reprFileName))
+        else:
+            self.pModelGdalRead = ModelGdalRead(reprFileName)
+
+        #All bands of the reprojected image are the selected bands of the input image
+        bandNumber = self.pParserOptions.bandNumber
+        self.pParserOptions.bandNumber = None
+        try:
+            self.writeGdalNumpyData()
+            self.writeGdalMetadata()
+            if self.pParserOptions.completeModel:
+                self.completeDataModelManually()
+        finally:
+            self.pParserOptions.bandNumber = bandNumber
+            if inMemory:
+                self.pModelGdalRead = None #Close reprojected dataset before it is deleted
+                gdal.Unlink(reprFileName)
+
+        return
+
+
+    def __getReprojectionModelName(self, reprFileName_):
+        """Return name of data model files of in-memory reprojected image 'reprFileName': same directory
+        as the input file and same name as the reprojected image file would have"""
+
+        return os.path.join(os.path.dirname(self.inputFile), reprFileName_[len(GDAL_VSIMEM_PATH):])
+
+
     def writeGdalNumpyData(self):
         """Read GDAL file and save data as numpy data array according to the specifications
         of the data interface"""
 
-        #Make a copy of the GDAL-file as numpy file
-        pGdalData = self.pModelGdalRead.readGdalFile(self.pParserOptions.bandDim, \
-            self.pParserOptions.bandNumber, self.pParserOptions.dataType)
-
-        #Export data as new numpy file
-        self.pModelGdalRead.writeNumpyData(pGdalData)
+        #Copy the GDAL-file window by window into a numpy file
+        self.pModelGdalRead.writeGdalFile2Numpy(self.pParserOptions.bandDim, \
+            self.pParserOptions.bandNumber, self.pParserOptions.dataType, self.pParserOptions.windowRows, self.pParserOptions.nWorkers)
 
         return
 
@@ -160,7 +246,8 @@ class ControlModelGdal:
         """Get metadata from a GDAL readable file and write metadata to coordinate metadata file and
         NCML XML file according to the specifications of the data interface"""
 
-        self.pModelGdalRead.writeMetadataNcml()
+        self.pModelGdalRead.writeMetadataNcml(self.pParserOptions.bandDim, \
+            self.pParserOptions.bandNumber, self.pParserOptions.dataType, self.pParserOptions.storeActualRange)
         self.pModelGdalRead.writeMetadataNumpymeta()
         return
 
@@ -179,7 +266,8 @@ class ControlModelGdal:
     def printGdalMetadata(self):
         """Read GDAL readable file and print metadata on screen"""
 
-        self.pModelGdalRead.printGdalMetadata(self.pParserOptions.bandNumber, self.pParserOptions.noPrintData)
+        self.pModelGdalRead.printGdalMetadata(self.pParserOptions.bandNumber, self.pParserOptions.noPrintData, \
+            self.pParserOptions.approxStats)
         return
 
 
@@ -190,18 +278,22 @@ class ModelGdalRead:
     the class 'ControlModelGdal'"""
 
 
-    def __init__(self, infile_):
+    def __init__(self, infile_, modelName_=None):
         """
         Constructor.
 
         INPUT_PARAMETERS:
         infile        - name of GDAL file name with filename extension (string)
+        modelName     - name used for the data model files instead of 'infile', e.g. if 'infile'
+            is in the GDAL virtual file system in memory (string)
         """
         self.pDefaultSettings = DefaultSettings()
 
         self.gdalFileName = infile_ #With file name extension
         
-        infile = self.gdalFileName.rsplit('.',1) #without file name extension
+        if modelName_ is None:
+            modelName_ = self.gdalFileName
+        infile = modelName_.rsplit('.',1) #without file name extension
         self.numpyDataName = infile[0]+FILENAME_SUFFIX_NUMPYDATA
         self.ncmlName = infile[0]+FILENAME_SUFFIX_NCML
         self.numpymetaName = infile[0]+FILENAME_SUFFIX_NUMPYXML
@@ -226,7 +318,8 @@ class ModelGdalRead:
         self.pDataset = None
 
 
-    def gdalFileReprojection(self, extend_, rasterSize_, bandNumber_, nodata_):
+    def gdalFileReprojection(self, extend_, rasterSize_, bandNumber_, nodata_, inMemory_=False, \
+        warpMemory_=GDAL_WARP_MEMORY, nWorkers_=GDAL_WORKERS, resampling_=GDAL_RESAMPLING, useIndexMaps_=False):
         """
         Reproject image file to defined projection PROJECTION_DATAMODEL
 
@@ -239,14 +332,24 @@ class ModelGdalRead:
         bandNumber      - Output image file will contain input band numbers from 1 to 'bandNumber';
             if bandNumber is 'None', all bands will be reprojected (integer)
         noData          - Set nodata value (default = NODATA, if default = '' then Dataset nodata value)" (number)
+        inMemory        - If 'True' the image is reprojected into a GTiff file in the GDAL virtual file
+            system in memory GDAL_VSIMEM_PATH instead of a file of the input driver (boolean)
+        warpMemory      - Memory in MB used by GDAL for warping, if set to '0' the GDAL default (integer)
+        nWorkers        - Number of threads used by GDAL for warping, if set to '0' all CPUs (integer)
+        resampling      - Resampling method: 'nearest' or 'bilinear' (string)
+        useIndexMaps    - If 'True' the image is resampled by source pixel index maps that are computed
+            only once for the same geometry and cached in GDAL_INDEXMAP_DIRECTORY (boolean)
 
         RETURN_VALUE:
-        Reprojected image file
+        File name of the reprojected image (string)
         """
        
         #Get input dataset settings
         #-------------------------------------------------------------------------------
-        pDriver = gdal.GetDriverByName(self.pDataset.GetDriver().ShortName)
+        if inMemory_: #Not all drivers support in-memory files, unlike GTiff
+            pDriver = gdal.GetDriverByName('GTiff')
+        else:
+            pDriver = gdal.GetDriverByName(self.pDataset.GetDriver().ShortName)
 
         infile = self.gdalFileName.rsplit('.',1) #Get filename without file extension (e.g. '.tif')
 
@@ -256,6 +359,8 @@ class ModelGdalRead:
             outFileName = infile[0]+'_all'+DECLARATION_GDAL_REPROJECTION+infile[1]
         else: #Reproject bands from 1 to 'bandNumber'
             outFileName = infile[0]+'_b1to'+str(bands)+DECLARATION_GDAL_REPROJECTION+infile[1]
+        if inMemory_:
+            outFileName = GDAL_VSIMEM_PATH + os.path.basename(outFileName).rsplit('.',1)[0] + '.tif'
 
         #Get extend and RasterSize (size of image) from arguments
         latMin = extend_[0]
@@ -338,8 +443,26 @@ class ModelGdalRead:
         #-------------------------------------------------------------------------------
         self.pLogger.info("Start to reproject image '" + str(self.gdalFileName) + "' to '" + str(outFileName) + "', please wait...")
 
-        #ReprojectImage(g_in, f_out, src_wkt, dst_wkt)
-        gdal.ReprojectImage(self.pDataset, pOutDataset)
+        if useIndexMaps_:
+            self.__reprojectByIndexMaps(pOutDataset, resampling_)
+        else:
+            #ReprojectImage(g_in, f_out, src_wkt, dst_wkt, resampling, warp memory in bytes, max error, callback,
+            #callback data, warp options)
+            if resampling_ == 'bilinear':
+                resampleAlg = GRA_Bilinear
+            else:
+                resampleAlg = GRA_NearestNeighbour
+            if int(nWorkers_) <= 0:
+                numThreads = 'ALL_CPUS'
+            else:
+                numThreads = str(int(nWorkers_))
+            self.pLogger.debug("Warp memory: '" + str(warpMemory_) + "' MB, warp threads: '" + numThreads + "'")
+            try:
+                gdal.ReprojectImage(self.pDataset, pOutDataset, None, None, resampleAlg, \
+                    float(warpMemory_) * 1048576.0, 0.0, None, None, ['NUM_THREADS=' + numThreads])
+            except TypeError: #GDAL bindings without warp options: multithreading is defined by configuration option
+                gdal.SetConfigOption('GDAL_NUM_THREADS', numThreads)
+                gdal.ReprojectImage(self.pDataset, pOutDataset, None, None, resampleAlg, float(warpMemory_) * 1048576.0)
 
         #Does not yet work in this version of GDAL!
         #gdal.CreateAndReprojectImage(self.pDataset, outFileName, self.pDataset.GetProjection(), PROJECTION_DATAMODEL, pDriver,)
@@ -348,10 +471,166 @@ class ModelGdalRead:
 
         self.pLogger.info("Done. Reprojected file save with file name: '" + str(outFileName) + "'")
         
+        return outFileName
+
+
+    def __reprojectByIndexMaps(self, pOutDataset_, resampling_):
+        """
+        Resample all bands of the input dataset into the bands of the output dataset 'pOutDataset' by
+        gathering the values of the source pixels given by index maps (see function '__getIndexMaps').
+
+        COMMENTS:
+        Source pixels outside of the input image and, for 'bilinear', output values with a nodata value
+        among the neighbouring source pixels are set to the nodata value of the output band (or 0).
+        """
+
+        pIndexList, pValid = self.__getIndexMaps(pOutDataset_, resampling_)
+        rasterYSize = pOutDataset_.RasterYSize
+        rasterXSize = pOutDataset_.RasterXSize
+
+        for cnBand in range(1, pOutDataset_.RasterCount + 1, 1): #For all bands
+            pInBand = self.pDataset.GetRasterBand(cnBand) #GetRasterBand is 1-based index
+            pOutBand = pOutDataset_.GetRasterBand(cnBand)
+            pSource = pInBand.ReadAsArray().ravel()
+
+            outNodata = pOutBand.GetNoDataValue()
+            if outNodata is None:
+                outNodata = 0
+            pOutValid = pValid.copy()
+
+            if resampling_ == 'bilinear':
+                pOut = numpy.zeros(rasterYSize * rasterXSize, dtype = numpy.float64)
+                for (pIndex, pWeight) in pIndexList:
+                    pValues = pSource.take(pIndex)
+                    if not pInBand.GetNoDataValue() is None:
+                        pOutValid &= (pValues != pInBand.GetNoDataValue())
+                    pOut += pValues * pWeight
+                if pSource.dtype.kind in 'iu': #Round to integer data type of band
+                    pOut = numpy.floor(pOut + 0.5)
+                pOut = pOut.astype(pSource.dtype)
+            else: #'nearest'
+                pOut = pSource.take(pIndexList[0][0])
+
+            pOut[~pOutValid] = outNodata
+            pOutBand.WriteArray(pOut.reshape(rasterYSize, rasterXSize))
+            gdal.TermProgress(1-(float(pOutDataset_.RasterCount - cnBand) / pOutDataset_.RasterCount))
+
+        return
+
+
+    def __getIndexMaps(self, pOutDataset_, resampling_):
+        """
+        Return list of (flat source index array, weight array or None) for all source pixels that contribute
+        to an output pixel, and boolean array of output pixels inside the source image. The column and row maps
+        of the source pixels are computed only once for the same (source geotransform, source projection,
+        target geotransform, raster size) and cached in memory and in directory GDAL_INDEXMAP_DIRECTORY.
+        """
+
+        pKeyList = [str(self.pDataset.GetGeoTransform()), str(self.pDataset.GetProjection()), \
+            str(pOutDataset_.GetGeoTransform()), str(pOutDataset_.GetProjection()), \
+            str(pOutDataset_.RasterXSize), str(pOutDataset_.RasterYSize)]
+        cacheKey = hashlib.md5('|'.join(pKeyList)).hexdigest()
+
+        if not pIndexMapCache.has_key(cacheKey):
+            cacheFileName = os.path.join(GDAL_INDEXMAP_DIRECTORY, 'indexmap_' + cacheKey + '.npz')
+            if os.path.isfile(cacheFileName):
+                self.pLogger.info("Load source pixel index maps from '" + str(cacheFileName) + "'.")
+                pMaps = numpy.load(cacheFileName)
+                pIndexMapCache[cacheKey] = (pMaps['col'], pMaps['row'])
+            else:
+                pIndexMapCache[cacheKey] = self.__computeIndexMaps(pOutDataset_)
+                self.__putIndexMaps(cacheFileName, pIndexMapCache[cacheKey])
+        (pCol, pRow) = pIndexMapCache[cacheKey]
+
+        inXSize = self.pDataset.RasterXSize
+        inYSize = self.pDataset.RasterYSize
+        pValid = ((pCol >= 0) & (pCol < inXSize) & (pRow >= 0) & (pRow < inYSize)).ravel()
+
+        #Indices of type 'intp', so that flat indices of sources with more than 2**31 pixels don't overflow
+        if resampling_ == 'bilinear': #Source pixel centers are at (index + 0.5)
+            pColCenter = numpy.clip(pCol.ravel() - 0.5, 0, inXSize - 1)
+            pRowCenter = numpy.clip(pRow.ravel() - 0.5, 0, inYSize - 1)
+            pCol0 = numpy.minimum(pColCenter.astype(numpy.intp), max(inXSize - 2, 0)) #Left and upper neighbour
+            pRow0 = numpy.minimum(pRowCenter.astype(numpy.intp), max(inYSize - 2, 0))
+            pCol1 = numpy.minimum(pCol0 + 1, inXSize - 1)
+            pRow1 = numpy.minimum(pRow0 + 1, inYSize - 1)
+            pColWeight = pColCenter - pCol0
+            pRowWeight = pRowCenter - pRow0
+            pIndexList = [(pRow0 * inXSize + pCol0, (1 - pColWeight) * (1 - pRowWeight)), \
+                (pRow0 * inXSize + pCol1, pColWeight * (1 - pRowWeight)), \
+                (pRow1 * inXSize + pCol0, (1 - pColWeight) * pRowWeight), \
+                (pRow1 * inXSize + pCol1, pColWeight * pRowWeight)]
+        else: #'nearest'
+            pColIndex = numpy.clip(numpy.floor(pCol.ravel()), 0, inXSize - 1).astype(numpy.intp)
+            pRowIndex = numpy.clip(numpy.floor(pRow.ravel()), 0, inYSize - 1).astype(numpy.intp)
+            pIndexList = [(pRowIndex * inXSize + pColIndex, None)]
+
+        return pIndexList, pValid
+
+
+    def __computeIndexMaps(self, pOutDataset_):
+        """Return fractional column and row of the source pixels (float32 arrays in shape of output raster,
+        top to bottom) at the centers of the output pixels of 'pOutDataset'"""
+
+        if self.pDataset.GetProjection() == '':
+            raise Exception("Error: Input dataset '" + str(self.gdalFileName) + "' has no projection. Index maps can't be computed.")
+        self.pLogger.info("Compute source pixel index maps for reprojection, please wait...")
+
+        pSourceSrs = osr.SpatialReference()
+        pSourceSrs.ImportFromWkt(self.pDataset.GetProjection())
+        pTargetSrs = osr.SpatialReference()
+        pTargetSrs.ImportFromWkt(pOutDataset_.GetProjection())
+        pTransform = osr.CoordinateTransformation(pTargetSrs, pSourceSrs)
+
+        inGeoTrans = self.pDataset.GetGeoTransform()
+        outGeoTrans = pOutDataset_.GetGeoTransform()
+        rasterYSize = pOutDataset_.RasterYSize
+        rasterXSize = pOutDataset_.RasterXSize
+
+        pCol = numpy.empty([rasterYSize, rasterXSize], dtype = numpy.float32)
+        pRow = numpy.empty([rasterYSize, rasterXSize], dtype = numpy.float32)
+        pPixel = numpy.arange(rasterXSize) + 0.5
+        determinant = inGeoTrans[1] * inGeoTrans[5] - inGeoTrans[2] * inGeoTrans[4]
+
+        for cnRow in xrange(rasterYSize): #Row by row to limit memory of transformed points
+            pX = outGeoTrans[0] + pPixel * outGeoTrans[1] + (cnRow + 0.5) * outGeoTrans[2]
+            pY = outGeoTrans[3] + pPixel * outGeoTrans[4] + (cnRow + 0.5) * outGeoTrans[5]
+            pPoints = numpy.array(pTransform.TransformPoints(zip(pX.tolist(), pY.tolist())))
+
+            #Inverse of the geotransform of the input dataset
+            pDx = pPoints[:,0] - inGeoTrans[0]
+            pDy = pPoints[:,1] - inGeoTrans[3]
+            pCol[cnRow,:] = (inGeoTrans[5] * pDx - inGeoTrans[2] * pDy) / determinant
+            pRow[cnRow,:] = (inGeoTrans[1] * pDy - inGeoTrans[4] * pDx) / determinant
+
+        return (pCol, pRow)
+
+
+    def __putIndexMaps(self, cacheFileName_, pMaps_):
+        """Save column and row maps 'pMaps' to cache file 'cacheFileName'"""
+
+        if not os.path.isdir(GDAL_INDEXMAP_DIRECTORY):
+            try:
+                os.makedirs(GDAL_INDEXMAP_DIRECTORY)
+            except OSError: #Created by other process in the meantime or not allowed
+                if not os.path.isdir(GDAL_INDEXMAP_DIRECTORY):
+                    self.pLogger.warning("Cache directory '" + str(GDAL_INDEXMAP_DIRECTORY) + "' could not be created. Index maps are not cached.")
+                    return
+
+        #Write to temporary file first, so that other processes never read incomplete maps
+        tmpFileName = cacheFileName_ + '.' + str(os.getpid()) + '.tmp'
+        pCacheFile = open(tmpFileName, 'wb')
+        try:
+            numpy.savez(pCacheFile, col = pMaps_[0], row = pMaps_[1])
+        finally:
+            pCacheFile.close()
+        os.rename(tmpFileName, cacheFileName_)
+        self.pLogger.info("Source pixel index maps saved as '" + str(cacheFileName_) + "'.")
+
         return
 
 
-    def readGdalFile(self, bandDim_, bandNumber_, dataType_):
+    def readGdalFile(self, bandDim_, bandNumber_, dataType_, windowRows_=GDAL_WINDOW_ROWS, nWorkers_=GDAL_WORKERS):
         """
         Reads a GDAL file and returns data as numpy array
 
@@ -365,82 +644,48 @@ class ModelGdalRead:
         bandNumber      - Output image file will contain input band numbers from 1 to 'bandNumber';
             if bandNumber is 'None', all bands will be reprojected (integer)
         dataType        - Define output data type of numpy array (string)
+        windowRows      - Number of raster rows read at once; if set to '0', a multiple of the block
+            height of the band is read (integer)
+        nWorkers        - Number of worker threads reading band windows concurrently; if set to '0',
+            the number of CPUs is used (integer)
 
         RETURN_VALUE:
         numpy data array with data from GDAL input dataset
         """
         
-        #Get GDAL input dataset and define settings
-        #-------------------------------------------------------------------------------
-        
-        #Set data type for output numpy array
-        firstBand = self.pDataset.GetRasterBand(1)
-        if not dataType_ == '': #if Parser.dataType is set or if default NUMPY_DATATYPE != '' then use this value
-            pDataType = self.pProcessingTool.dataType_2Numpy(dataType_) #Convert to numpy dtype
-        elif not gdal.GetDataTypeName(firstBand.DataType) is None: #use Dataset type value if there is a type available
-            pDataType = self.pProcessingTool.dataType_2Numpy(gdal.GetDataTypeName(firstBand.DataType)) #Convert to numpy dtype
-        else:
-            raise Exception("Error: No valid data type can be set. Input value is: '" + str(dataType_) + "'")
-
-        #Define what bands should be used (from 1 to bandNumber, or all bands if bandNumber is None)
-        bands = self.__getBandNumber(bandNumber_)
-
-        #Define what numpy (NetCDF) dimension should correspond to input bands (self.pDataset.RasterCount)
-        dimY = int(self.pDataset.RasterYSize) #Last but one axis top to bottom: lat -> row
-        dimX = int(self.pDataset.RasterXSize)  #Last axis left to right: lon -> col
-       
-        if bandDim_ == 'var':
-            pDocGradsNumpy = numpy.zeros([int(bands), int(1), int(1), dimY, dimX], dtype = pDataType)
-        elif bandDim_ == 'time':
-            pDocGradsNumpy = numpy.zeros([int(1), int(bands), int(1), dimY, dimX], dtype = pDataType)
-        elif bandDim_ ==  'height':
-            pDocGradsNumpy = numpy.zeros([int(1), int(1), int(bands), dimY, dimX], dtype = pDataType)
-        else:
-            raise Exception("Error: Value of bandDim argument not allowed. Valid values are 'var', 'time' or 'height'" )
-               
+        pShape, pDataType = self.__getGdalDataShape(bandDim_, bandNumber_, dataType_)
+        pDocGradsNumpy = numpy.zeros(pShape, dtype = pDataType)
+        self.__readGdalBands(pDocGradsNumpy, bandDim_, windowRows_, nWorkers_)
 
-        #Read input dataset and save it to numpy file
-        #-------------------------------------------------------------------------------
-        #Easiest and best technique for data reading is line per line. Better would be block size reading.
-        #Reading one pixel at a time is inefficient. Reading the entire image at once is most efficient, but can cause
-        #problems if RAM is not sufficient.
-
-        for cnBand in range(1, bands + 1, 1): #For all bands defined
-            pInBand = self.pDataset.GetRasterBand(cnBand) #GetRasterBand is 1-based index
-
-            for cnRow in range(pInBand.YSize -1, -1, -1): #Each row in file, Y origin is on upper left in GDAL!
-
-                #DimRowCount must run in inverse order as cnRow (from lower left to upper left) because of Y origin
-                dimRowCn = pInBand.YSize - 1 - cnRow
-
-                #scanline = pInBand.ReadAsArray(0, cnRow, pInBand.XSize, 1, \
-                #                    pInBand.XSize, 1, GDT_Float32 )
-                #data = GdalRasterBand.ReadRaster(int nXOffset, int nYOffset, int nXSize, int nYSize, \
-                    #int nBuffXSize, int nBuffYSize, GdalDataType eBufType, int nPixelSpace, int nLineSpace)
-                scanline = pInBand.ReadRaster( 0, cnRow, pInBand.XSize, 1, \
-                                     pInBand.XSize, 1, GDT_Float32 )
+        return pDocGradsNumpy
 
-                #Convert data and cast to numpy data array
 
-                #To unpack use IEEE 754 binary32 (for 'f') or binary 64 (for 'd') format
-                scanline_tupleOfFloats = struct.unpack('f' * pInBand.XSize, scanline)# convert data to Python values
+    def writeGdalFile2Numpy(self, bandDim_, bandNumber_, dataType_, windowRows_=GDAL_WINDOW_ROWS, nWorkers_=GDAL_WORKERS):
+        """
+        Converts a GDAL file into a numpy data file without holding the complete data in memory:
+        The numpy file is created as memory mapped array of the final shape and filled window by window.
 
-                scanline_numpy = numpy.asarray(scanline_tupleOfFloats)
+        INPUT_PARAMETERS:
+        bandDim         - Define which NetCDF dimension should be represented by GDAL bands (string)
+        bandNumber      - Output file will contain input band numbers from 1 to 'bandNumber';
+            if bandNumber is 'None', all bands will be converted (integer)
+        dataType        - Define output data type of numpy array (string)
+        windowRows      - Number of raster rows read at once; if set to '0', a multiple of the block
+            height of the band is read (integer)
+        nWorkers        - Number of worker threads reading band windows concurrently; if set to '0',
+            the number of CPUs is used (integer)
+        """
 
-                if bandDim_ == 'var':
-                    pDocGradsNumpy[cnBand-1,0,0,dimRowCn,:] = scanline_numpy.astype(pDataType) #cnBand - 1 because of 1-based index
-                elif bandDim_ == 'time':
-                    pDocGradsNumpy[0,cnBand-1,0,dimRowCn,:] = scanline_numpy.astype(pDataType) #cnBand - 1 because of 1-based index
-                elif bandDim_ ==  'height':
-                    pDocGradsNumpy[0,0,cnBand-1,dimRowCn,:] = scanline_numpy.astype(pDataType) #cnBand - 1 because of 1-based index
-                else:
-                    raise Exception("Error: Value of bandDim argument ('" + str(bandDim_) + "') not allowed. Valid values are 'var', 'time' or 'height'")
+        pShape, pDataType = self.__getGdalDataShape(bandDim_, bandNumber_, dataType_)
 
-                #gdal.TermProgress(float(pInBand.YSize-cnRow) / pInBand.YSize)
-              
-            gdal.TermProgress(1-(float(self.pDataset.RasterCount - cnBand) / self.pDataset.RasterCount))
+        self.pLogger.info("Numpy output will be file saved as '"+ str(self.numpyDataName) + "'...")
+        pNumpyData = numpy.lib.format.open_memmap(str(self.numpyDataName), mode = 'w+', dtype = pDataType, shape = tuple(pShape))
+        self.__readGdalBands(pNumpyData, bandDim_, windowRows_, nWorkers_)
+        pNumpyData.flush()
+        self.pLogger.info("Done. Shape of resulting numpy file: '" + str(pNumpyData.shape) + "'; Data type: '" + str(pNumpyData.dtype) + "'.")
+        del pNumpyData #Close memory map
 
-        return pDocGradsNumpy
+        return
 
 
     def writeNumpyData(self, pNumpyData_):
@@ -453,14 +698,17 @@ class ModelGdalRead:
         return
 
 
-    def writeMetadataNcml(self):
+    def writeMetadataNcml(self, bandDim_, bandNumber_, dataType_, isActualRange_=False):
         """Create new NCML XML file according to the specifications of the data model and
-        complete this file by the metadata that can be extracted out of input metadata"""
+        complete this file by the metadata that can be extracted out of input metadata.
+        Shape and data type of the numpy data array are derived from the GDAL dataset header
+        by the same arguments as used for function 'readGdalFile'. If 'isActualRange' is 'True'
+        the attribute 'actual_range' is added from the exact statistics of the bands."""
     
-        #Get metadata information from file
+        #Get metadata information from GDAL dataset
         #-------------------------------------------------------------------------------
-        pNumpyData = numpy.load(self.numpyDataName)
-        dimVar = pNumpyData.shape[0] #Number of variables in array
+        pShape, pDataType = self.__getGdalDataShape(bandDim_, bandNumber_, dataType_)
+        dimVar = pShape[0] #Number of variables in array
 
         #Define progress bar settings
         widgetsBar = ['Creating Ncml metadata file: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
@@ -470,7 +718,7 @@ class ModelGdalRead:
         #Write metadata NCML file
         #-------------------------------------------------------------------------------
         self.pProcessNcml.createMacroNcmlFile()
-        self.pProcessNcml.fillNcmlMacroWithNumpy(pNumpyData)
+        self.pProcessNcml.fillNcmlMacroWithShape(pShape, pDataType)
 
         #Correct and complete entries
         for i_var in range(0,dimVar,1): # otherwise returns list of ints from >= start and < end: 0 .. 10
@@ -482,6 +730,18 @@ class ModelGdalRead:
             else:
                 self.pProcessNcml.changeLocalAttribute(varName, '_FillValue', 'value', str(None))
 
+            #Range of values by exact statistics of all bands of the variable (cached for the file)
+            if isActualRange_:
+                if bandDim_ == 'var':
+                    pRange = self.__getBandRange([i_var+1])
+                else:
+                    pRange = self.__getBandRange(range(1, max(pShape[1], pShape[2]) + 1))
+                if pDataType.kind in 'iu':
+                    rangeValue = str(int(pRange[0])) + ',' + str(int(pRange[1]))
+                else:
+                    rangeValue = repr(float(pRange[0])) + ',' + repr(float(pRange[1]))
+                self.pProcessNcml.addLocalAttribute(varName, 'actual_range', rangeValue, str(pDataType), ',')
+
             progressBar.update(i_var+1)# Progress bar
 
         return
@@ -519,9 +779,11 @@ class ModelGdalRead:
     #Other functions
     #-------------------------------------------------------------------------------
 
-    def printGdalMetadata(self, bandNumber_, noPrintData_):
+    def printGdalMetadata(self, bandNumber_, noPrintData_, approxStats_=False):
         """Read GDAL file and print metadata on screen. Program code derived and adapted from
-        GDAL tutorial: http://www.gdal.org/gdal_tutorial.html"""
+        GDAL tutorial: http://www.gdal.org/gdal_tutorial.html
+        Band statistics are approximated (by overviews or a subsample) if 'approxStats' is 'True'
+        (see function 'getBandStatistics')."""
 
         #Getting pDataset information
         #-------------------------------------------------------------------------------
@@ -554,11 +816,9 @@ class ModelGdalRead:
             self.pLogger.info("Band Number = '" + str(cnBand) + "'")
             self.pLogger.info("Band Type = '" + str(gdal.GetDataTypeName(band.DataType)) + "'")
 
-            minValue = band.GetMinimum()
-            maxValue = band.GetMaximum()
-            if minValue is None or maxValue is None: #use 'is' statement only for None, 'is' is identity (memory), not equality
-                (minValue, maxValue) = band.ComputeRasterMinMax(1)
+            (minValue, maxValue, meanValue, stdValue) = self.getBandStatistics(cnBand, approxStats_)
             self.pLogger.info("Minimum value = '" + str(minValue) + "', Maximum value = '" + str(maxValue) + "'")
+            self.pLogger.info("Mean value = '" + str(meanValue) + "', Standard deviation = '" + str(stdValue) + "'")
 
             if band.GetOverviewCount() > 0:
                 self.pLogger.info("Band has '" + str(band.GetOverviewCount()) + "' overviews.")
@@ -581,6 +841,242 @@ class ModelGdalRead:
         return
 
 
+    def __getGdalDataShape(self, bandDim_, bandNumber_, dataType_):
+        """Return shape (var, time, z, lat, lon) and numpy data type of the numpy data array that is
+        derived from the GDAL dataset header (see function 'readGdalFile')"""
+
+        #Set data type for output numpy array
+        firstBand = self.pDataset.GetRasterBand(1)
+        if not dataType_ == '': #if Parser.dataType is set or if default NUMPY_DATATYPE != '' then use this value
+            pDataType = self.pProcessingTool.dataType_2Numpy(dataType_) #Convert to numpy dtype
+        else: #use native data type of dataset
+            pDataType = getGdalNativeDataType(firstBand)
+
+        #Define what bands should be used (from 1 to bandNumber, or all bands if bandNumber is None)
+        bands = self.__getBandNumber(bandNumber_)
+
+        #Define what numpy (NetCDF) dimension should correspond to input bands (self.pDataset.RasterCount)
+        dimY = int(self.pDataset.RasterYSize) #Last but one axis top to bottom: lat -> row
+        dimX = int(self.pDataset.RasterXSize)  #Last axis left to right: lon -> col
+       
+        if bandDim_ == 'var':
+            pShape = [int(bands), int(1), int(1), dimY, dimX]
+        elif bandDim_ == 'time':
+            pShape = [int(1), int(bands), int(1), dimY, dimX]
+        elif bandDim_ ==  'height':
+            pShape = [int(1), int(1), int(bands), dimY, dimX]
+        else:
+            raise Exception("Error: Value of bandDim argument not allowed. Valid values are 'var', 'time' or 'height'" )
+
+        return pShape, pDataType
+
+
+    def __readGdalBands(self, pOutData_, bandDim_, windowRows_, nWorkers_=GDAL_WORKERS):
+        """Read GDAL bands into the numpy data array 'pOutData' (var, time, z, lat, lon) that may
+        also be a memory mapped array. The bands are represented by the dimension 'bandDim'.
+        If 'nWorkers' is not 1, band windows are read concurrently (see function '__readGdalBandsConcurrently')."""
+
+        pDataType = pOutData_.dtype
+        dimY = pOutData_.shape[3]
+        dimX = pOutData_.shape[4]
+        if bandDim_ == 'var':
+            bands = pOutData_.shape[0]
+        elif bandDim_ == 'time':
+            bands = pOutData_.shape[1]
+        else: #'height'
+            bands = pOutData_.shape[2]
+
+        nWorkers = int(nWorkers_)
+        if nWorkers <= 0:
+            nWorkers = multiprocessing.cpu_count()
+        if nWorkers > 1:
+            self.__readGdalBandsConcurrently(pOutData_, bandDim_, bands, windowRows_, nWorkers)
+            return
+
+        #Read input dataset and save it to numpy array
+        #-------------------------------------------------------------------------------
+        #Reading the entire image at once is most efficient, but can cause problems if RAM is not sufficient.
+        #Therefore windows of complete rows are read that are aligned to the blocks of the band.
+        #Values are read in the native data type of the band, or directly converted by GDAL to the output
+        #data type if this is lossless. Otherwise values are casted to the output data type by numpy.
+
+        for cnBand in range(1, bands + 1, 1): #For all bands defined
+            self.readGdalBand(self.__getOutBand(pOutData_, bandDim_, cnBand), cnBand, windowRows_)
+            gdal.TermProgress(1-(float(self.pDataset.RasterCount - cnBand) / self.pDataset.RasterCount))
+
+        return
+
+
+    def readGdalBand(self, pOutBand_, cnBand_, windowRows_=GDAL_WINDOW_ROWS):
+        """Read band 'cnBand' (1-based index) window by window into the (lat, lon) numpy array 'pOutBand',
+        see function 'readGdalDatasetBand'"""
+
+        readGdalDatasetBand(self.pDataset, pOutBand_, cnBand_, windowRows_)
+        return
+
+
+    def __readGdalBandsConcurrently(self, pOutData_, bandDim_, bands_, windowRows_, nWorkers_):
+        """Read the windows of bands 1 to 'bands' by 'nWorkers' threads into the numpy data array 'pOutData'.
+
+        COMMENTS:
+        GDAL releases the GIL during I/O and decoding for most drivers, therefore threads are used.
+        A GDAL dataset handle must not be used by several threads at the same time: Each worker takes
+        its own handle from a queue of 'nWorkers' handles. Since every window is written into a disjoint
+        slice of 'pOutData', the result is identical to the one of a serial run."""
+
+        #Windows of all bands: (band number, row offset, number of rows)
+        pWindowList = []
+        for cnBand in range(1, bands_ + 1, 1):
+            pInBand = self.pDataset.GetRasterBand(cnBand)
+            windowRows = getGdalWindowRows(pInBand, windowRows_)
+            for rowOffset in xrange(0, pInBand.YSize, windowRows):
+                pWindowList.append((cnBand, rowOffset, min(windowRows, pInBand.YSize - rowOffset)))
+        nWorkers = min(nWorkers_, len(pWindowList))
+
+        self.pLogger.info("Read '" + str(len(pWindowList)) + "' windows of '" + str(bands_) + "' bands with '" + str(nWorkers) + "' worker threads...")
+
+        pDatasetQueue = Queue.Queue()
+        for cnWorker in range(nWorkers):
+            pDataset = gdal.Open(self.gdalFileName, GA_ReadOnly)
+            if pDataset is None:
+                raise Exception("Opening of file '" + str(self.gdalFileName) + "' by worker thread failed.")
+            pDatasetQueue.put(pDataset)
+
+        pArgsList = [(pOutData_, bandDim_, cnBand, rowOffset, rows, pDatasetQueue) for (cnBand, rowOffset, rows) in pWindowList]
+        pPool = ThreadPool(nWorkers)
+        try:
+            cnWindow = 0
+            for cnBand in pPool.imap_unordered(self.__readGdalWindowWorker, pArgsList):
+                cnWindow = cnWindow + 1
+                gdal.TermProgress(float(cnWindow) / len(pWindowList))
+        finally:
+            pPool.close()
+            pPool.join()
+            while not pDatasetQueue.empty(): #Close dataset handles
+                pDataset = pDatasetQueue.get()
+                pDataset = None
+
+        return
+
+
+    def __readGdalWindowWorker(self, pArgs_):
+        """Read one window of a band in a worker thread by the use of a dataset handle of the queue.
+        'pArgs' is a tuple (pOutData, bandDim, band number, row offset, number of rows, queue of dataset handles)."""
+
+        (pOutData, bandDim, cnBand, rowOffset, rows, pDatasetQueue) = pArgs_
+
+        pDataset = pDatasetQueue.get()
+        try:
+            pInBand = pDataset.GetRasterBand(cnBand)
+            pWindow = numpy.empty([rows, pOutData.shape[4]], dtype = getGdalBufferDataType(pInBand, pOutData.dtype))
+            readGdalWindow(pInBand, self.__getOutBand(pOutData, bandDim, cnBand), rowOffset, pWindow)
+        finally:
+            pDatasetQueue.put(pDataset)
+
+        return cnBand
+
+
+    def __getOutBand(self, pOutData_, bandDim_, cnBand_):
+        """Return (lat, lon) view on the numpy data array 'pOutData' for the 1-based band number 'cnBand'"""
+
+        if bandDim_ == 'var':
+            return pOutData_[cnBand_-1,0,0,:,:] #cnBand - 1 because of 1-based index
+        elif bandDim_ == 'time':
+            return pOutData_[0,cnBand_-1,0,:,:]
+        else: #'height'
+            return pOutData_[0,0,cnBand_-1,:,:]
+
+
+    def getBandStatistics(self, cnBand_, approx_=False):
+        """
+        Return (minimum, maximum, mean, standard deviation) of band 'cnBand' (1-based index).
+
+        Statistics are computed by GDAL only if they are not cached for the file: The cache in directory
+        GDAL_STATS_DIRECTORY is keyed by path, modification time and size of the file. Exact statistics
+        are used for approximate requests too. If 'approx' is 'True' GDAL may compute the statistics from
+        overviews or a subsample of the pixels instead of scanning the complete band.
+        """
+
+        pStatsDict = self.__loadStatistics()
+        if pStatsDict.has_key((cnBand_, False)):
+            return pStatsDict[(cnBand_, False)]
+        if approx_ and pStatsDict.has_key((cnBand_, True)):
+            return pStatsDict[(cnBand_, True)]
+
+        self.pLogger.info("Compute statistics of band '" + str(cnBand_) + "' (approximate: '" + str(approx_) + "'), please wait...")
+        pStats = tuple(self.pDataset.GetRasterBand(cnBand_).ComputeStatistics(bool(approx_)))
+        pStatsDict[(cnBand_, bool(approx_))] = pStats
+        self.__putStatistics(pStatsDict)
+
+        return pStats
+
+
+    def __getBandRange(self, pBandList_):
+        """Return (minimum, maximum) of the bands in list 'pBandList' by their exact statistics"""
+
+        pRange = None
+        for cnBand in pBandList_:
+            pStats = self.getBandStatistics(cnBand, False)
+            if pRange is None:
+                pRange = (pStats[0], pStats[1])
+            else:
+                pRange = (min(pRange[0], pStats[0]), max(pRange[1], pStats[1]))
+
+        return pRange
+
+
+    def __getStatisticsFileName(self):
+        """Return name of the cache file of the band statistics, or None if the GDAL file is not a regular file"""
+
+        if not os.path.isfile(self.gdalFileName): #e.g. in-memory file or URL
+            return None
+
+        pStat = os.stat(self.gdalFileName)
+        pKeyList = [os.path.abspath(self.gdalFileName), str(pStat.st_mtime), str(pStat.st_size)]
+        return os.path.join(GDAL_STATS_DIRECTORY, hashlib.md5('|'.join(pKeyList)).hexdigest() + '.pickle')
+
+
+    def __loadStatistics(self):
+        """Return cached dictionary {(band number, approximate): (min, max, mean, std)} of the file"""
+
+        statsFileName = self.__getStatisticsFileName()
+        if statsFileName is None or not os.path.isfile(statsFileName):
+            return {}
+
+        pStatsFile = open(statsFileName, 'rb')
+        try:
+            return pickle.load(pStatsFile)
+        finally:
+            pStatsFile.close()
+
+
+    def __putStatistics(self, pStatsDict_):
+        """Save dictionary of band statistics 'pStatsDict' to the cache"""
+
+        statsFileName = self.__getStatisticsFileName()
+        if statsFileName is None:
+            return
+
+        if not os.path.isdir(GDAL_STATS_DIRECTORY):
+            try:
+                os.makedirs(GDAL_STATS_DIRECTORY)
+            except OSError: #Created by other process in the meantime or not allowed
+                if not os.path.isdir(GDAL_STATS_DIRECTORY):
+                    self.pLogger.warning("Cache directory '" + str(GDAL_STATS_DIRECTORY) + "' could not be created. Statistics are not cached.")
+                    return
+
+        #Write to temporary file first, so that other processes never read incomplete statistics
+        tmpFileName = statsFileName + '.' + str(os.getpid()) + '.tmp'
+        pStatsFile = open(tmpFileName, 'wb')
+        try:
+            pickle.dump(pStatsDict_, pStatsFile, pickle.HIGHEST_PROTOCOL)
+        finally:
+            pStatsFile.close()
+        os.rename(tmpFileName, statsFileName)
+
+        return
+
+
     def __getBandNumber(self, bandNumber_):
         """Define what bands should be used (from 1 to bandNumber, or all bands if bandNumber is None)"""
 
@@ -602,9 +1098,9 @@ class ModelGdalRead:
         Example: Scale data values in case that units prefix have to be changed
         (e.g. from hPa to Pa) due to defined unit in standard_name entry."""
 
-        #pGdalData = numpy.load(self.numpyDataName)
+        #pGdalData = numpy.load(self.numpyDataName, mmap_mode='r+') #Data is converted in place
         #--> Nothing to complete at the moment
-        #numpy.save(self.numpyDataName, pGdalData) #Better then 'tofile'. Also possible: 'dump'
+        #pGdalData = self.pProcessingTool.convertNumpyDataUnits(pGdalData, 0, 'hPa', 'Pa', None, self.pProcessNcml, 'variable_name')
 
         return
 
@@ -650,6 +1146,340 @@ class ModelGdalRead:
 
 #_______________________________________________________________________________
 
+class ModelGdalStack:
+    """This class stacks GDAL files of single dates with identical geometry into one data model
+    with the shape (1, time, 1, lat, lon) and is controlled by the function 'main'"""
+
+
+    def __init__(self, fileGlob_, datePattern_=STACK_DATE_PATTERN):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        fileGlob        - file name pattern of GDAL files with wildcards (string)
+        datePattern     - date in the file names with directives of 'datetime.strptime', e.g. 'A%Y%j' for
+            'TIBET_LAI.A2008001.hdf'; supported directives are the keys of STACK_DATE_DIRECTIVES (string)
+        """
+
+        self.pLogger = logging.getLogger(MODULE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+        self.datePattern = str(datePattern_)
+        self.pShape = None #Shape and data type of the stacked numpy data array, set by 'writeStackNumpy'
+        self.pDataType = None
+
+        #Sort files by date
+        pDateFileList = []
+        for fileName in glob.glob(str(fileGlob_)):
+            pDateFileList.append((self.__parseDate(fileName), fileName))
+        if len(pDateFileList) == 0:
+            raise Exception("Error: No files found for '" + str(fileGlob_) + "'.")
+        pDateFileList.sort()
+
+        self.pDateList = [pDate for (pDate, fileName) in pDateFileList]
+        self.pFileList = [fileName for (pDate, fileName) in pDateFileList]
+        for cnFile in range(1, len(self.pDateList)):
+            if self.pDateList[cnFile] == self.pDateList[cnFile-1]:
+                raise Exception("Error: Files '" + str(self.pFileList[cnFile-1]) + "' and '" + str(self.pFileList[cnFile]) + \
+                    "' have the same date '" + str(self.pDateList[cnFile]) + "'.")
+
+        infile = self.pFileList[0].rsplit('.',1) #without file name extension
+        self.modelName = infile[0] + STACK_SUFFIX + '.' + infile[1]
+        infile = self.modelName.rsplit('.',1)
+        self.numpyDataName = infile[0]+FILENAME_SUFFIX_NUMPYDATA
+        self.ncmlName = infile[0]+FILENAME_SUFFIX_NCML
+        self.numpymetaName = infile[0]+FILENAME_SUFFIX_NUMPYXML
+
+        #Use Processing Tools
+        self.pProcessingTool = ProcessingTool()
+        self.pProcessNcml = ProcessNcml(self.ncmlName)
+        self.pProcessNumpymeta = ProcessNumpymeta(self.numpymetaName)
+
+        gdal.AllRegister() #Register all drivers
+        self.pLogger.info("Stack '" + str(len(self.pFileList)) + "' files from '" + str(self.pDateList[0]) + "' to '" + \
+            str(self.pDateList[-1]) + "' into data model '" + str(infile[0]) + "'.")
+
+
+    def checkGeometry(self):
+        """Check by the headers of all files that size, geotransform, projection and data type of the first
+        band are identical to those of the first file. Raises an exception otherwise."""
+
+        pReferenceList = None
+        for fileName in self.pFileList:
+            pDataset = self.__openFile(fileName)
+            pGeometryList = [pDataset.RasterXSize, pDataset.RasterYSize, pDataset.GetGeoTransform(), \
+                pDataset.GetProjection(), gdal.GetDataTypeName(pDataset.GetRasterBand(1).DataType)]
+            pDataset = None
+
+            if pReferenceList is None:
+                pReferenceList = pGeometryList
+            elif pGeometryList != pReferenceList:
+                raise Exception("Error: Geometry of file '" + str(fileName) + "' (size x, size y, geotransform, projection, data type: '" + \
+                    str(pGeometryList) + "') differs from that of file '" + str(self.pFileList[0]) + "' ('" + str(pReferenceList) + "').")
+
+        self.pLogger.info("Geometry of all files is identical: '" + str(pReferenceList[0]) + "'*'" + str(pReferenceList[1]) + \
+            "' pixels of type '" + str(pReferenceList[4]) + "'.")
+        return
+
+
+    def writeStackNumpy(self, dataType_, windowRows_=GDAL_WINDOW_ROWS, nWorkers_=GDAL_WORKERS):
+        """
+        Read the first band of all files into a memory mapped numpy data file (1, time, 1, lat, lon).
+
+        INPUT_PARAMETERS:
+        dataType        - Define output data type of numpy array, if '' the data type of the files (string)
+        windowRows      - Number of raster rows read at once (integer)
+        nWorkers        - Number of worker threads reading files concurrently; if set to '0', the number
+            of CPUs is used (integer)
+
+        COMMENTS:
+        Each worker opens its own dataset and writes into a disjoint time slice, so the result is
+        identical to the one of a serial run.
+        """
+
+        pDataset = self.__openFile(self.pFileList[0])
+        if not dataType_ == '':
+            pDataType = self.pProcessingTool.dataType_2Numpy(dataType_) #Convert to numpy dtype
+        else:
+            pDataType = getGdalNativeDataType(pDataset.GetRasterBand(1))
+        pShape = (int(1), len(self.pFileList), int(1), int(pDataset.RasterYSize), int(pDataset.RasterXSize))
+        self.pShape = pShape
+        self.pDataType = pDataType
+        pDataset = None
+
+        self.pLogger.info("Numpy output will be file saved as '"+ str(self.numpyDataName) + "'...")
+        pNumpyData = numpy.lib.format.open_memmap(str(self.numpyDataName), mode = 'w+', dtype = pDataType, shape = pShape)
+
+        nWorkers = int(nWorkers_)
+        if nWorkers <= 0:
+            nWorkers = multiprocessing.cpu_count()
+        nWorkers = min(nWorkers, len(self.pFileList))
+
+        pArgsList = [(pNumpyData, cnTime, fileName, windowRows_) for (cnTime, fileName) in enumerate(self.pFileList)]
+        if nWorkers == 1:
+            for cnTime in range(len(pArgsList)):
+                self.__readFileWorker(pArgsList[cnTime])
+                gdal.TermProgress(float(cnTime + 1) / len(pArgsList))
+        else:
+            self.pLogger.info("Read '" + str(len(pArgsList)) + "' files with '" + str(nWorkers) + "' worker threads...")
+            pPool = ThreadPool(nWorkers)
+            try:
+                cnFile = 0
+                for cnTime in pPool.imap_unordered(self.__readFileWorker, pArgsList):
+                    cnFile = cnFile + 1
+                    gdal.TermProgress(float(cnFile) / len(pArgsList))
+            finally:
+                pPool.close()
+                pPool.join()
+
+        pNumpyData.flush()
+        self.pLogger.info("Done. Shape of resulting numpy file: '" + str(pNumpyData.shape) + "'; Data type: '" + str(pNumpyData.dtype) + "'.")
+        del pNumpyData #Close memory map
+
+        return
+
+
+    def writeStackMetadata(self):
+        """Create NCML XML file and metadata coordinate XML file of the stacked data model, with the
+        time values of the dates of the files. Function 'writeStackNumpy' must be called before."""
+
+        pFirstRead = ModelGdalRead(self.pFileList[0], self.modelName)
+        nodataValue = pFirstRead.pDataset.GetRasterBand(1).GetNoDataValue()
+
+        #Write metadata NCML file
+        self.pProcessNcml.createMacroNcmlFile()
+        self.pProcessNcml.fillNcmlMacroWithShape(self.pShape, self.pDataType)
+        self.pProcessNcml.changeLocalAttribute('variable #0', '_FillValue', 'value', str(nodataValue))
+
+        #Write coordinate metadata file: latitude and longitude from GDAL dataset, time values from dates
+        pFirstRead.writeMetadataNumpymeta()
+        pFirstRead = None
+
+        pTimes = self.pProcessingTool.createTimeValuesFromDates(self.pDateList)
+        self.pProcessNumpymeta.writeNumpyMetadataValues(pTimes, 'time')  #Either time values or min/max
+
+        self.pProcessNumpymeta.setAttribute('numpymeta', 'height', 'values', str(1))
+        self.pProcessNumpymeta.setAttribute('numpymeta', 'height', 'separator', str(','))
+
+        return
+
+
+    def __readFileWorker(self, pArgs_):
+        """Read first band of a file into its time slice. 'pArgs' is a tuple (pOutData, time index, file name, window rows)."""
+
+        (pOutData, cnTime, fileName, windowRows) = pArgs_
+
+        pDataset = self.__openFile(fileName) #Own dataset handle
+        try:
+            readGdalDatasetBand(pDataset, pOutData[0,cnTime,0,:,:], 1, windowRows)
+        finally:
+            pDataset = None
+
+        return cnTime
+
+
+    def __openFile(self, fileName_):
+        """Return GDAL dataset of file 'fileName' opened read only"""
+
+        pDataset = gdal.Open(fileName_, GA_ReadOnly)
+        if pDataset is None:
+            raise Exception ("Opening of file '" + str(fileName_) + "' failed. Check if it exists and if filename suffix is set.")
+        return pDataset
+
+
+    def __parseDate(self, fileName_):
+        """Return date (datetime) in the name of file 'fileName' defined by 'datePattern'"""
+
+        pPatternList = re.split('(%[a-zA-Z])', self.datePattern)
+        regex = ''
+        for pattern in pPatternList:
+            if STACK_DATE_DIRECTIVES.has_key(pattern):
+                regex = regex + STACK_DATE_DIRECTIVES[pattern]
+            elif pattern.startswith('%') and len(pattern) == 2:
+                raise Exception("Error: Directive '" + str(pattern) + "' of date pattern '" + str(self.datePattern) + \
+                    "' is not supported. Supported directives are: '" + str(sorted(STACK_DATE_DIRECTIVES.keys())) + "'.")
+            else:
+                regex = regex + re.escape(pattern)
+
+        pMatch = re.search(regex, os.path.basename(fileName_))
+        if pMatch is None:
+            raise Exception("Error: Date pattern '" + str(self.datePattern) + "' not found in file name '" + str(fileName_) + "'.")
+
+        return datetime.strptime(pMatch.group(0), self.datePattern)
+
+
+#_______________________________________________________________________________
+
+def readGdalDatasetBand(pDataset_, pOutBand_, cnBand_, windowRows_=GDAL_WINDOW_ROWS):
+    """Read band 'cnBand' (1-based index) of GDAL dataset 'pDataset' window by window into the (lat, lon) numpy
+    array 'pOutBand', e.g. a view on a memory mapped array. Rows are flipped since the Y origin of the data model
+    is lower left. The dataset must not be used by other threads at the same time."""
+
+    pInBand = pDataset_.GetRasterBand(cnBand_) #GetRasterBand is 1-based index
+    pBufferType = getGdalBufferDataType(pInBand, pOutBand_.dtype)
+    dimY = pOutBand_.shape[0]
+    dimX = pOutBand_.shape[1]
+
+    windowRows = getGdalWindowRows(pInBand, windowRows_)
+    pBuffer = numpy.empty([windowRows, dimX], dtype = pBufferType)
+
+    for rowOffset in xrange(0, dimY, windowRows):
+        rows = min(windowRows, dimY - rowOffset)
+        readGdalWindow(pInBand, pOutBand_, rowOffset, pBuffer[:rows,:]) #Contiguous view on buffer
+
+    return
+
+
+def readGdalWindow(pInBand_, pOutBand_, rowOffset_, pWindow_):
+    """Read the rows from 'rowOffset' of band 'pInBand' into the contiguous buffer 'pWindow' and copy them
+    to the (lat, lon) array 'pOutBand'"""
+
+    dimY = pOutBand_.shape[0]
+    rows = pWindow_.shape[0]
+    pInBand_.ReadAsArray(0, rowOffset_, pWindow_.shape[1], rows, buf_obj = pWindow_)
+
+    #Y origin is on upper left in GDAL, but lower left in data model: rows are flipped by a reversed view
+    pOutBand_[dimY-rowOffset_-rows:dimY-rowOffset_,:] = pWindow_[::-1,:]
+
+    return
+
+
+def getGdalNativeDataType(pInBand_):
+    """Return numpy data type that is related to the GDAL data type of band 'pInBand'"""
+
+    gdalTypeName = gdal.GetDataTypeName(pInBand_.DataType)
+    if not GDAL_NUMPY_DTYPES.has_key(gdalTypeName):
+        raise Exception("Error: GDAL data type '" + str(gdalTypeName) + "' is not supported. Set the output data type by option [-t].")
+    return GDAL_NUMPY_DTYPES[gdalTypeName]
+
+
+def getGdalBufferDataType(pInBand_, pDataType_):
+    """Return numpy data type of the buffer that GDAL fills with the values of band 'pInBand': Output data
+    type 'pDataType' if GDAL supports this type and the values can be converted losslessly, otherwise the
+    native data type of the band"""
+
+    pNativeType = getGdalNativeDataType(pInBand_)
+    if pDataType_ == pNativeType:
+        return pNativeType
+
+    try: #GDAL data type that is related to the output data type
+        gdalTypeName = ProcessingTool().dataType_2Gdal(str(pDataType_))[len('GDT_'):]
+    except Exception: #Not supported by GDAL
+        return pNativeType
+
+    #'GDT_Byte' is unsigned, so e.g. 'int8' can't be filled by GDAL
+    if GDAL_NUMPY_DTYPES.get(gdalTypeName) == pDataType_ and numpy.can_cast(pNativeType, pDataType_):
+        return pDataType_
+    else:
+        return pNativeType
+
+
+def getGdalWindowRows(pInBand_, windowRows_):
+    """Return number of rows of band 'pInBand' that are read at once: 'windowRows' if it is set, otherwise
+    the largest multiple of the block height of the band with less than GDAL_WINDOW_ELEMENTS values"""
+
+    if windowRows_ > 0:
+        return min(int(windowRows_), pInBand_.YSize)
+
+    blockRows = max(1, pInBand_.GetBlockSize()[1])
+    windowBlocks = max(1, GDAL_WINDOW_ELEMENTS // (blockRows * pInBand_.XSize))
+    return min(blockRows * windowBlocks, pInBand_.YSize)
+
+
+#_______________________________________________________________________________
+
+def benchmarkGdalRead(name_, rasterSizeList_, bands_, windowRows_=GDAL_WINDOW_ROWS):
+    """
+    Benchmark for reading GDAL rasters: In-memory GTiff rasters of data type 'Byte' and 'Int16'
+    are read in native data type and converted to 'float32'.
+
+    INPUT_PARAMETERS:
+    name            - name of in-memory rasters, created in GDAL virtual file system '/vsimem/' (string)
+    rasterSizeList  - Y-Rastersize, X-Rastersize of benchmark rasters (list of integer)
+    bands           - Number of bands of benchmark rasters (integer)
+    windowRows      - Number of raster rows read at once (integer)
+
+    RETURN_VALUE:
+    List of (GDAL data type, output data type, seconds, MB/s) for all reads
+    """
+
+    pLogger = logging.getLogger(MODULE_LOGGER_ROOT+"."+__name__)
+    rasterYSize = int(rasterSizeList_[0])
+    rasterXSize = int(rasterSizeList_[1])
+    pResultList = []
+
+    gdal.AllRegister()
+    pDriver = gdal.GetDriverByName('GTiff')
+    for gdalTypeName in ['Byte', 'Int16']:
+        fileName = '/vsimem/' + str(name_) + '_' + gdalTypeName + '.tif'
+
+        #Create raster with gradient values
+        pDataset = pDriver.Create(fileName, rasterXSize, rasterYSize, bands_, gdal.GetDataTypeByName(gdalTypeName))
+        pDataset.SetGeoTransform([0.0, 1.0, 0.0, float(rasterYSize), 0.0, -1.0])
+        pValues = (numpy.arange(rasterYSize * rasterXSize) % 100).reshape(rasterYSize, rasterXSize)
+        for cnBand in range(1, bands_ + 1, 1):
+            pDataset.GetRasterBand(cnBand).WriteArray(pValues.astype(GDAL_NUMPY_DTYPES[gdalTypeName]))
+        pDataset = None #Close and flush dataset
+
+        #Read raster in native data type and as 'float32'
+        pModelGdalRead = ModelGdalRead(fileName)
+        for dataType in ['', 'float32']:
+            seconds = None
+            for cnRepeat in range(BENCHMARK_REPEAT):
+                startTime = time.time()
+                pData = pModelGdalRead.readGdalFile('time', bands_, dataType, windowRows_)
+                if seconds is None or time.time() - startTime < seconds:
+                    seconds = time.time() - startTime
+            megaBytes = pData.nbytes / 1048576.0
+            pLogger.info("Benchmark: '" + gdalTypeName + "' raster " + str(bands_) + "x" + str(rasterYSize) + "x" + \
+                str(rasterXSize) + " read as '" + str(pData.dtype) + "': '" + str(seconds) + "' seconds, '" + \
+                str(megaBytes / max(seconds, 1.0e-6)) + "' MB/s")
+            pResultList.append((gdalTypeName, str(pData.dtype), seconds, megaBytes / max(seconds, 1.0e-6)))
+            pData = None
+        pModelGdalRead = None
+        gdal.Unlink(fileName)
+
+    return pResultList
+
+
 def main():
     """
     Main function.
@@ -666,6 +1496,8 @@ def main():
     #-------------------------------------------------------------------------------
     pParser = OptionParser(usage=USAGE, version = VERSION, description = DESCRIPTION, epilog = EPILOG)
 
+    pParser.set_defaults(approxStats = False)
+    pParser.set_defaults(storeActualRange = False)
     pParser.set_defaults(bandNumber = None)
     pParser.set_defaults(completeModel = False)
     pParser.set_defaults(isDoc = False)
@@ -677,18 +1509,34 @@ def main():
     pParser.set_defaults(dataType = NUMPYDATA_DTYPE)
     pParser.set_defaults(noPrintData = True)
     pParser.set_defaults(bandDim = 'time')
+    pParser.set_defaults(windowRows = GDAL_WINDOW_ROWS)
+    pParser.set_defaults(nWorkers = GDAL_WORKERS)
+    pParser.set_defaults(keepReprojection = False)
+    pParser.set_defaults(warpMemory = GDAL_WARP_MEMORY)
+    pParser.set_defaults(useIndexMaps = False)
+    pParser.set_defaults(datePattern = STACK_DATE_PATTERN)
+    pParser.set_defaults(resampling = GDAL_RESAMPLING)
     
 
+    pParser.add_option("-a", "--approx", action="store_true",  dest='approxStats', help="Operation 'printGdal': Approximate band statistics by overviews or a subsample (default = %default)")
     pParser.add_option('-b', '--band', action = 'store', type = 'int', dest='bandNumber', nargs = 1, help="Bands from 1 to 'input' on that the operation is to be employed (default = %default)")
     pParser.add_option("-c", "--complModel", action="store_true",  dest='completeModel', help="Complete data model by functions particularly written for specific data (default = %default)")
     pParser.add_option("-d", "--doc", action="store_true",  dest='isDoc', help="Give more information by printing docstrings (default = %default)")
     pParser.add_option('-e', '--extend', action = 'store', type ='float', dest='extendList', nargs = 4, help="Extend for 'reprojection': LatMin, LatMax, LonMin, LonMax (default = %default)")
+    pParser.add_option('-f', '--datepattern', action = 'store', type ='string', dest='datePattern', nargs = 1, help="Operation 'gdalStack': date in the file names with directives of 'datetime.strptime' (default = %default)")
+    pParser.add_option("-i", "--indexmaps", action="store_true",  dest='useIndexMaps', help="Reproject by source pixel index maps that are cached for images of the same geometry (default = %default)")
+    pParser.add_option("-k", "--keep", action="store_true",  dest='keepReprojection', help="Operation 'reproject2Model': Save reprojected image as file instead of keeping it in memory only (default = %default)")
     pParser.add_option('-l', '--log', action = 'store', dest='logLevel', choices = ['debug','info','warning','error','critical'], nargs = 1, help="Minimum level for printing information to the console (default = %default)")
+    pParser.add_option('-m', '--warpmem', action = 'store', type = 'int', dest='warpMemory', nargs = 1, help="Memory in MB used for warping by reprojection, '0' for GDAL default (default = %default)")
     pParser.add_option('-n', '--nodata', action = 'store', dest='nodataValue', nargs = 1, help="Set nodata value (default = %default, if default = '' then Dataset nodata value)")
     pParser.add_option('-p', '--path', action = 'store', type ='string', dest='dataPath', nargs = 1, help="Directory for input / output files (default = %default)")
     pParser.add_option('-r', '--rastersize', action = 'store', type ='int', dest='rasterSizeList', nargs = 2, help="Rastersize for 'reprojection': Y-Rastersize, X-Rastersize (default = %default)")
+    pParser.add_option('-s', '--resampling', action = 'store', dest='resampling', choices = ['nearest','bilinear'], nargs = 1, help="Resampling method for 'reprojection' (default = %default)")
     pParser.add_option('-t', '--dtype', action = 'store', dest='dataType', choices = [''] + NUMPY_DTYPES, nargs = 1, help="Define output data type of numpy array (default = %default)")
+    pParser.add_option("-u", "--actualrange", action="store_true",  dest='storeActualRange', help="Operation 'gdal2Model': save minimum and maximum of the bands as attribute 'actual_range' in the NCML file, exact statistics are computed if not cached (default = %default)")
     pParser.add_option("-v", "--nopvars", action="store_false",  dest='noPrintData', help="Beside metadata print also data variable values on screen (default = %default)")
+    pParser.add_option('-w', '--workers', action = 'store', type = 'int', dest='nWorkers', nargs = 1, help="Number of worker threads reading bands concurrently and warping by reprojection, '0' for number of CPUs (default = %default)")
+    pParser.add_option('-y', '--window', action = 'store', type = 'int', dest='windowRows', nargs = 1, help="Number of raster rows read at once, if set to '0' a multiple of the block height of the bands (default = %default)")
     pParser.add_option('-z', '--zdim', action = 'store', dest='bandDim', choices = ['var','time','height'], nargs = 1, help="Define which NetCDF dimension should represent the vertical band of the GDAL file (default = %default)")
    
     (options, args) = pParser.parse_args()
@@ -729,6 +1577,22 @@ def main():
 
         #Run program
         #-------------------------------------------------------------------------------
+        if operation_ == 'benchmark':
+            pLogger.info("Operation: Benchmark reading of GDAL rasters")
+            bands = options.bandNumber
+            if bands is None:
+                bands = BENCHMARK_BANDS
+            benchmarkGdalRead(infile_, options.rasterSizeList, bands, options.windowRows)
+            return
+
+        elif operation_ == 'gdalStack':
+            pLogger.info("Operation: Stack GDAL files to data model")
+            pModelGdalStack = ModelGdalStack(infileName, options.datePattern)
+            pModelGdalStack.checkGeometry()
+            pModelGdalStack.writeStackNumpy(options.dataType, options.windowRows, options.nWorkers)
+            pModelGdalStack.writeStackMetadata()
+            return
+
         pControlModelGdal = ControlModelGdal(infileName, options)
 
         if operation_ == 'reproject':
@@ -743,6 +1607,10 @@ def main():
             if options.completeModel:
                 pControlModelGdal.completeDataModelManually() #Complete data model manually
 
+        elif operation_ == 'reproject2Model':
+            pLogger.info("Operation: Reproject GDAL file and convert it to data model")
+            pControlModelGdal.reprojectImage2Model()
+
         elif operation_ == 'printGdal':
             pLogger.info("Operation: Print GDAL data on the screen")
             pControlModelGdal.printGdalMetadata()
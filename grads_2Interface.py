@@ -15,11 +15,15 @@ GRAPES GRIB raster files. Find more information in the documentation.
 __author__= "Nicolai Holzer"
 __author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 __date__ ="2011-03-28"
-__version__ = "v0.1.3" #MajorVersion(backward_incompatible).MinorVersion(backward_compatible).Patch(Bug_fixes)
+__version__ = "v0.1.7" #MajorVersion(backward_incompatible).MinorVersion(backward_compatible).Patch(Bug_fixes)
 
 
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-06-06: v0.1.7 variables exported by several GRADS sessions in parallel, NetCDF / NumPy stand-in for GRADS
+#2011-06-03: v0.1.6 time window of option [-s] set in GRADS, only wanted time steps are exported
+#2011-06-02: v0.1.5 GRADS fields written directly into the (memory mapped) output array
+#2011-05-16: v0.1.4 data values converted in place by Udunits2 unit conversion
 #2011-01-14: v0.1.3 logging implemented, functionalities changed
 #2010-12-14: v0.1.2 parser added, functionalities changed
 #2010-11-24: v0.1.1 comments and docstrings added
@@ -31,8 +35,10 @@ __version__ = "v0.1.3" #MajorVersion(backward_incompatible).MinorVersion(backwar
 #standard libraries
 import sys
 import time
+from datetime import datetime, timedelta
 from optparse import OptionParser #Parser
 import logging
+import multiprocessing
 
 #related libraries
 import numpy
@@ -40,7 +46,17 @@ import numpy
 #Importing GRADS
 #Extends the GrADS client class GaCore, providing methods for exchanging
 #n-dimensional NumPy array data between Python and GrADS.
-import grads.ganum as ganum
+try:
+    import grads.ganum as ganum
+except ImportError:
+    ganum = None
+    print "Warning: Import Error for API 'grads'. Only the stand-in backend 'netcdf' can be used."
+
+try:
+    from netCDF4 import Dataset #Used by stand-in backend
+except ImportError:
+    Dataset = None
+    print "Warning: Import Error for API 'netCDF4'. The stand-in backend 'netcdf' can only read numpy data arrays."
 
 #This module extends the GrADS client class by providing methods for
 #exchanging n-dimensional NumPy array data between Python and GrADS
@@ -69,7 +85,9 @@ USAGE = "%prog [options] operation data\
     \n    - testGrads       Test GRADS functionalities\
     \n\
     \ndata:\
-    \n    Raster data file that is readable by GRADS library"
+    \n    Raster data file that is readable by GRADS library (backend 'netcdf': NetCDF file or numpy data array\
+    \n    (var, time, z, lat, lon) that is read by a stand-in for GRADS, see class 'GradsStandIn'). A numpy data\
+    \n    array must not be a data model file with suffix '__data.npy', rename it e.g. to 'name.npy')"
 
 DESCRIPTION= "Conversion tool of CEOP-AEGIS data model for GRADS readable raster data"
 EPILOG = "Author: "+__author__+" (E-mail: "+__author_email__+")"
@@ -86,8 +104,14 @@ NODATA = 0 #Default nodata value of output numpy array
 #Value can't yet be extracted of Grib Metadata automatically. See Grib Metadata file for finding this value
 DATATIMESTEP = 0.5 
 
+GRADS_BACKEND = 'grads' #Backend for reading: 'grads' or stand-in 'netcdf' (see class 'GradsStandIn')
+GRADS_WORKERS = 1 #Number of GRADS sessions exporting variables in parallel, if set to 0 use number of CPUs
+GRADS_MONTHS = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC'] #GRADS month names
+
 MODULE_LOGGER_ROOT = 'grads' #Logger root name
 
+pGradsWorkerSession = None #GRADS session of a worker process, opened by function 'initGradsWorker'
+
 #_______________________________________________________________________________
 
 class ControlModelGrads:
@@ -106,9 +130,13 @@ class ControlModelGrads:
         in the module 'interface_Settings'.
         """
        
+        if str(infile_).endswith(FILENAME_SUFFIX_NUMPYDATA): #Output of the data model would be written to the input file
+            raise Exception("Error: Data model file '" + str(infile_) + "' can't be used as input. Rename the numpy data array without suffix '" + \
+            str(FILENAME_SUFFIX_NUMPYDATA) + "', e.g. to 'name.npy'.")
+
         infile = str(infile_).rsplit('__',1)
         self.inputFile = infile[0]
-        self.pModelGradsRead = ModelGradsRead(self.inputFile)
+        self.pModelGradsRead = ModelGradsRead(self.inputFile, option_.backend)
 
         self.pParserOptions = option_
         self.pLogger = logging.getLogger(MODULE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
@@ -123,15 +151,9 @@ class ControlModelGrads:
         """Read GRADS file and save data as numpy data array according to the specifications
         of the data interface"""
 
-        #Make a copy of the GRADS-file as numpy file
-        pGradsData = self.pModelGradsRead.readGradsFile(self.pParserOptions.dataType)
-              
-        #Optional to select specific data from time stamp
-        if not self.pParserOptions.specificData is None: #specificData is choosen
-            pGradsData = self.pModelGradsRead.choseSpecificData(pGradsData, self.pParserOptions.specificData)
-
-        #Export data as new numpy file
-        self.pModelGradsRead.writeNumpyData(pGradsData)
+        #Copy the GRADS-file directly into a memory mapped numpy file, optional only specific data from time stamp
+        self.pModelGradsRead.readGradsFile(self.pParserOptions.dataType, self.pModelGradsRead.numpyDataName, \
+            self.pParserOptions.specificData, self.pParserOptions.nWorkers)
         return
 
 
@@ -179,22 +201,26 @@ class ModelGradsRead:
     This class was in particularly written to handle GRAPES GRIB data."""
 
 
-    def __init__(self, infile_):
+    def __init__(self, infile_, backend_=GRADS_BACKEND):
         """
         Constructor.
 
         INPUT_PARAMETERS:
         infile        - name of GRADS file name with filename extension (string)
+        backend       - 'grads' or stand-in 'netcdf' (see function 'openGradsSession') (string)
         """
         self.pDefaultSettings = DefaultSettings()
         
         self.gradsFileName = infile_ #With file name extension
+        self.backend = backend_
 
         #infile = self.gradsFileName.rsplit('.',1) #without file name extension
         self.numpyDataName = infile_+FILENAME_SUFFIX_NUMPYDATA
         self.ncmlName = infile_+FILENAME_SUFFIX_NCML
         self.numpymetaName = infile_+FILENAME_SUFFIX_NUMPYXML
 
+        self.nodata = None #_FillValue of data variables, set by function 'writeMetadataNcml'
+
         #Use Processing Tools
         self.pProcessingTool = ProcessingTool()
         self.pProcessNcml = ProcessNcml(self.ncmlName)
@@ -203,14 +229,7 @@ class ModelGradsRead:
         self.pLogger = logging.getLogger(MODULE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
 
         #Read GRADS file
-        #Start the GRADS application, creating new instance
-        #Depending on GRADS version, 'Bin' is telling which GRADS executable to start
-        #For 2.0a7 this is 'grads' and 'gradsdap'
-        try:
-            self.pGa = ganum.GaNum(Bin='grads', Echo=False, Window=False)
-            self.pGa.open(self.gradsFileName)
-        except:
-            raise Exception ("Opening of file '" + str(self.gradsFileName) + "' failed. Check if it exists and if filename suffix is set.")
+        self.pGa = openGradsSession(self.gradsFileName, self.backend)
             
 
     def __del__(self):
@@ -219,9 +238,18 @@ class ModelGradsRead:
         del self.pGa
 
 
-    def readGradsFile(self, dataType_):
-        """Reads a GRADS file and returns GRADS data as numpy array.
-        Argument 'dataType' defines the data type of the resulting numpy array."""
+    def readGradsFile(self, dataType_, outFileName_=None, dataTime_=None, nWorkers_=GRADS_WORKERS):
+        """Reads a GRADS file and returns GRADS data as numpy array (var, time, z, lat, lon).
+        Argument 'dataType' defines the data type of the resulting numpy array. If a file name
+        'outFileName' is given, the array is a memory mapped numpy file with this name.
+        If 'dataTime' is given, only the time steps from position dataTime[0] to dataTime[1]
+        (position numbers, start value = 1) are exported by the GRADS command 'set t START STOP'.
+        If 'nWorkers' is not 1, variables are exported in parallel by 'nWorkers' GRADS sessions
+        into the memory mapped numpy file 'outFileName' (see function 'readGradsVariableWorker').
+
+        COMMENTS:
+        Each exported GRADS field is copied and casted once into its final slot of the preallocated
+        array, so at most the output array and one variable are held in memory."""
 
         pGa = self.pGa
      
@@ -240,8 +268,26 @@ class ModelGradsRead:
 
         varsNames = pGa_queryFile.vars     #names of variables in file
 
+        if dataTime_ is None:
+            timeCommand = "set t 1 last" #Get all time values
+        else: #Only wanted time stamp, position numbers (start value = 1, not 0!!!)
+            dataStart = int(dataTime_[0])
+            dataStop = int(dataTime_[1])
+            if dataStart < 1 or dataStop < dataStart or dataStop > dimT:
+                raise Exception("Error: Time stamp '" + str(dataStart) + "' to '" + str(dataStop) + "' is not within '1' to '" + str(dimT) + "'.")
+            timeCommand = "set t " + str(dataStart) + " " + str(dataStop)
+            dimT = dataStop - dataStart + 1 #Dimension value, not index value for array!!! E.g. (48-1)+1=48
+            self.pLogger.info("Export time values '" + str(dataStart) + "' to '" + str(dataStop) + "' only.")
+
         pGa("set z 1") #GRADS command to set dimensions
-        pGa("set t 1 last") #Get all time values; define timestamp later in python
+        pGa(timeCommand)
+
+        nWorkers = int(nWorkers_)
+        if nWorkers <= 0:
+            nWorkers = multiprocessing.cpu_count()
+        nWorkers = min(nWorkers, dimVar)
+        if nWorkers > 1 and outFileName_ is None:
+            raise Exception("Error: Variables can only be exported in parallel into a numpy file. No file name is given.")
 
         #Define progress bar settings
         widgetsBar = ['Import status: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
@@ -256,93 +302,51 @@ class ModelGradsRead:
 
         #Writing numpy file
         #-------------------------------------------------------------------------------
+        #Dimension order is 'var,time,level,y,x' as defined by the data model.
+        #This is neccessary so that the time variables dimension can be set to unlimited (only possible for first variable).
         pDataType = self.pProcessingTool.dataType_2Numpy(dataType_)
-        pGradsData = numpy.zeros((dimVar,dimT,dimY,dimX), dtype = pDataType)# All data
+        pShape = (dimVar, dimT, int(1), dimY, dimX)
+        if outFileName_ is None:
+            pGradsData = numpy.zeros(pShape, dtype = pDataType)# All data
+        else: #Memory mapped numpy file, data is not held in memory
+            self.pLogger.info("Numpy output will be file saved as '"+ str(outFileName_) + "'...")
+            pGradsData = numpy.lib.format.open_memmap(str(outFileName_), mode = 'w+', dtype = pDataType, shape = pShape)
         
+        #Reading all variables in GRADS file in parallel by GRADS sessions of worker processes
+        if nWorkers > 1:
+            pGradsData.flush() #Header and size of file are complete for the worker processes
+            self.pLogger.info("Export '" + str(dimVar) + "' variables by '" + str(nWorkers) + "' GRADS sessions...")
+
+            pArgsList = [(str(outFileName_), i_var, varsNames[i_var]) for i_var in range(0,dimVar,1)]
+            pPool = multiprocessing.Pool(nWorkers, initGradsWorker, (self.gradsFileName, self.backend, timeCommand))
+            try:
+                cnVar = 0
+                for i_var in pPool.imap_unordered(readGradsVariableWorker, pArgsList):
+                    cnVar = cnVar + 1
+                    progressBar.update(cnVar)# Progress bar
+            finally:
+                pPool.close()
+                pPool.join()
+
         #Reading all variables in GRADS file
-        for i_var in range(0,dimVar,1): # otherwise returns list of ints from >= start and < end: 0 .. 10
+        else:
+            for i_var in range(0,dimVar,1): # otherwise returns list of ints from >= start and < end: 0 .. 10
 
-            self.pLogger.info("Reading GRADS variable ID '" + str(i_var) + "' with name '" + str(varsNames[i_var]) + "'...")
-            pDataArray = pGa.expr(varsNames[i_var]) #Export GRADS field of specific variable as numpy-like array
+                self.pLogger.info("Reading GRADS variable ID '" + str(i_var) + "' with name '" + str(varsNames[i_var]) + "'...")
+                pDataArray = pGa.expr(varsNames[i_var]) #Export GRADS field of specific variable as numpy-like array
           
-            #Create a numpy file per file, so for all variables per file
-            pGradsData[i_var,:,:,:] = numpy.asarray(pDataArray.astype(pDataType))
-
-            progressBar.update(i_var+1)# Progress bar
-
-
-        #Change dimensions of numpy array so that it gets conform with the data model specifications
-        #-------------------------------------------------------------------------------
-        dimVar = pGradsData.shape[0] #Number of variables in array
-        dimT = pGradsData.shape[1] #Time Dimension
-        dimZ = int(1) #Level Dimensions
-        dimY = pGradsData.shape[2] #Last but one axis top to bottom: lat -> row
-        dimX = pGradsData.shape[3] #Last axis left to right: lon -> col
-
-        pBuffer = numpy.zeros((dimY,dimX), dtype = pGradsData.dtype) #Buffer for calculation
-        pGradsDataNorm = numpy.zeros((dimVar,dimT,dimZ,dimY, dimX), dtype = pGradsData.dtype) #Normed numpy data array
-
-        #Change dimension order that is "var,time,y,x' and is to be 'var,time,level,y,x'.
-        #This is neccessary so that the time variables dimension can be set to unlimited (only possible for first variable).
-        #Define progress bar settings
-        widgetsBar = ['Making data conform for data model: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
-                   ' ', ETA(), ' ', FileTransferSpeed()]
-        progressBar = ProgressBar(widgets=widgetsBar, maxval=dimVar).start()
-
-        for i_var in range(0,dimVar,1):
-            for i_time in range(0, dimT, 1):
-                pBuffer[:,:] = pGradsData[i_var,i_time,:,:] #Extract data to buffer
-                pGradsDataNorm[i_var,i_time,0,:,:] = pBuffer[:,:]  #Write Data in output numpy array
-
-            progressBar.update(i_var+1)# Progress bar
-
-        return pGradsDataNorm
-
-
-    def choseSpecificData(self, pGradsData_, dataTime_):
-        """Optional: Extract those datasets that fall within the wanted timestamp
-
-        Define time stamp in list dataTime. dataTime[0] is start value, dataTime[1]
-        end value, as time units since reference time.        
-        Example: nt = 97 values; first (1st) value first day 0h00, half hour steps,
-        96th value: second day 23h30, 97th value third day 0h00
-        Time intervall has for example to consist of 24 hours, so 47 values!
-        position numbers (start value = 1, not 0!!!), not index numbers of arrays; needed for dimension setting
-        DATASTART = 25 #12h00 first day
-        DATASTOP = 72  #11h30 second day
-        """
-
-        self.pLogger.info("Extract specific data as implemented in function 'choseSpecificData'...")
-
-        pGradsData = pGradsData_
-        dataStart = int(dataTime_[0])
-        dataStop = int(dataTime_[1])
-
-        #Define progress bar settings
-        widgetsBar = ['Extracting specific data: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
-                   ' ', ETA(), ' ', FileTransferSpeed()]
-        progressBar = ProgressBar(widgets=widgetsBar, maxval=(dataStop-(dataStart-1))).start()
-
-
-        #Get all datasets from wanted time intervall. Index of time value is defined in
-        #global variables. Export data as numpy file
-
-        #Number of time values for wanted time stamp
-        grapesTimeStamp = dataStop - dataStart + 1#dimension value, not index value for array!!! E.g. (48-1)+1=48
+                #Values of the field without mask as view, reshaped since GRADS omits the time dimension if dimT = 1.
+                #The assignment is the only copy and casts to the output data type.
+                pGradsData[i_var,:,0,:,:] = numpy.ma.getdata(pDataArray).reshape(dimT, dimY, dimX)
+                del pDataArray
 
-        #Only GRADS data of wanted time stamp
-        pGradsDataTS = numpy.zeros((pGradsData.shape[0],grapesTimeStamp,pGradsData.shape[2],\
-            pGradsData.shape[3], pGradsData.shape[4]), dtype = pGradsData.dtype)
+                progressBar.update(i_var+1)# Progress bar
 
-        #!Range: Last value not taken for iteration! So don't use DATASTOP-1, but DATASTOP!
-        i = 0
-        for j in range(dataStart-1, dataStop, 1): #array index numbers, not position numbers
-            pGradsDataTS[:,i,:,:,:] = pGradsData[:,j,:,:,:]
-            i = i+1
+        if not outFileName_ is None:
+            pGradsData.flush()
+            self.pLogger.info("Done. Shape of resulting numpy file: '" + str(pGradsData.shape) + "'; Data type: '" + str(pGradsData.dtype) + "'.")
 
-            progressBar.update(j-(dataStart-1)+1)# Progress bar
-        
-        return pGradsDataTS
+        return pGradsData
 
 
     def writeNumpyData(self, pNumpyData_):
@@ -364,7 +368,8 @@ class ModelGradsRead:
         pGa = self.pGa
         pGa_queryFile = pGa.query("file") # Query dataset information, command available for "file" and "dims"
 
-        pNumpyData = numpy.load(self.numpyDataName)
+        pNumpyData = numpy.load(self.numpyDataName, mmap_mode='r') #Only shape and data type are needed
+        self.nodata = nodata_
 
         dimVar = pNumpyData.shape[0] #Number of variables in array
         varsNames = pGa_queryFile.vars #names of variables on file
@@ -405,6 +410,7 @@ class ModelGradsRead:
         #Get metadata information from file by the use of GRADS
         #-------------------------------------------------------------------------------
         #Query dataset information, command available for "file" and "dims"
+        pGa("set t 1 last") #Reference time is the first time value of the file, not of the exported time stamp
         pGa_queryDims = pGa.query("dims")
         pGa_queryFile = pGa.query("file")
 
@@ -452,16 +458,7 @@ class ModelGradsRead:
     def printGradsMetadata(self):
         """Read GRADS file and print metadata on screen"""
 
-        infile = self.gradsFileName
-
-        ga = ganum.GaNum(Bin='grads', Echo=False, Window=True)#Starts the GRADS application
-        #Depending on GRADS version, bin is telling which GRADS executable to start
-        #For 2.0a7 this is 'grads' and 'gradsdap'
-        try:
-            fh = ga.open(infile)
-        except:
-            raise Exception("Error: GRADS file does not exist: '" + str(infile) + "'.")
-            exit()
+        ga = self.pGa #GRADS session of opened file
 
         #Query metadata information
         qh_file = ga.query("file")
@@ -553,14 +550,7 @@ class ModelGradsRead:
         #Open file
         infile = self.gradsFileName
 
-        ga = ganum.GaNum(Bin='grads', Echo=False, Window=True)#Starts the grads application
-        #Depending on Grads version, bin is telling which grads executable to start
-        #For 2.0a7 this is 'grads' and 'gradsdap'
-        try:
-            fh = ga.open(infile)
-        except:
-            raise Exception("Error: GRADS file does not exist: '" + str(infile) + "'.")
-            exit()
+        ga = openGradsSession(infile, self.backend) #Starts the grads application or the stand-in
 
         #Printing metadata on screen
         qh_file = ga.query("file")
@@ -596,17 +586,23 @@ class ModelGradsRead:
     def completeDataVariables(self):
         """Complete missing data variable value modification manually
 
-        Example: Scale data values in case that units prefix have to be changed
-        (e.g. from hPa to Pa) due to defined unit in standard_name entry."""
+        Example: Convert data values in case that units have to be changed
+        (e.g. from hPa to Pa) due to defined unit in standard_name entry.
+        Data is converted in place in the memory mapped numpy file."""
 
-        pGradsData = numpy.load(self.numpyDataName)
+        pGradsData = numpy.load(self.numpyDataName, mmap_mode='r+')
 
-        #Scale of data. Here: data is in hPa, must be in Pa
-        pGradsData = self.pProcessingTool.scaleNumpyDataVariable(pGradsData, 5, 100.0) #p_pbl
-        pGradsData = self.pProcessingTool.scaleNumpyDataVariable(pGradsData, 7, 100.0) #ps
-        pGradsData = self.pProcessingTool.scaleNumpyDataVariable(pGradsData, 8, 100.0) #psl
+        if self.nodata is None:
+            fillValue = None
+        else:
+            fillValue = float(self.nodata)
 
-        numpy.save(self.numpyDataName, pGradsData) #Better then 'tofile'. Also possible: 'dump'
+        #Conversion of data. Here: data is in hPa, must be in Pa
+        pGradsData = self.pProcessingTool.convertNumpyDataUnits(pGradsData, 5, 'hPa', 'Pa', fillValue, self.pProcessNcml, 'p_pbl')
+        pGradsData = self.pProcessingTool.convertNumpyDataUnits(pGradsData, 7, 'hPa', 'Pa', fillValue, self.pProcessNcml, 'ps')
+        pGradsData = self.pProcessingTool.convertNumpyDataUnits(pGradsData, 8, 'hPa', 'Pa', fillValue, self.pProcessNcml, 'psl')
+
+        del pGradsData #Close memory mapped file
 
         return
 
@@ -667,6 +663,247 @@ class ModelGradsRead:
 
 
 
+#_______________________________________________________________________________
+
+class GradsStandIn:
+    """Stand-in for a GRADS session (class 'ganum.GaNum') for local testing and benchmarking without GRADS.
+    It implements the surface used by this module, the GRADS commands 'set t' and 'set z', and the functions
+    'open', 'query' ('file' and 'dims') and 'expr' (name of a variable only) on top of a NetCDF file or a
+    numpy data array.
+
+    COMMENTS:
+    NetCDF file: Variables with at least the dimensions (time, lat, lon) are data variables, the first
+    z-level of variables (time, z, lat, lon) is used. Numpy data array (var, time, z, lat, lon): Variables
+    are named 'var0', 'var1', ..., latitudes and longitudes are indices and time steps are DATATIMESTEP hours
+    from 1970-01-01. Latitudes are returned in the order of the file. The numpy data array can't be a data model
+    file with suffix FILENAME_SUFFIX_NUMPYDATA, because the converted data model is saved beside the input file.
+    NetCDF files need the API 'netCDF4'."""
+
+
+    def __init__(self):
+        """Constructor"""
+
+        self.pLogger = logging.getLogger(MODULE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+        self.pFile = None
+        self.pVarDict = {} #Data variable arrays by name
+        self.varsNames = []
+        self.varsTitles = []
+        self.title = ''
+        self.pLat = None
+        self.pLon = None
+        self.pDateList = []
+        self.timeStart = 1 #Position numbers of time dimension (start value = 1, not 0!!!)
+        self.timeStop = 1
+        self.level = 1
+
+
+    def __call__(self, command_):
+        """Execute GRADS command 'command': only 'set t' and 'set z' are implemented"""
+
+        pWordList = str(command_).split()
+        if len(pWordList) >= 3 and pWordList[0] == 'set' and pWordList[1] in ['t', 'z']:
+            pValueList = [self.__getPosition(pWordList[1], value) for value in pWordList[2:4]]
+            if pWordList[1] == 't':
+                self.timeStart = pValueList[0]
+                self.timeStop = pValueList[-1]
+            else:
+                self.level = pValueList[0]
+        else:
+            self.pLogger.debug("GRADS command '" + str(command_) + "' is ignored by stand-in.")
+
+        return
+
+
+    def open(self, fileName_):
+        """Open NetCDF file or numpy data array 'fileName'"""
+
+        if str(fileName_).endswith('.npy'):
+            pData = numpy.load(fileName_, mmap_mode='r')
+            if pData.ndim != 5:
+                raise Exception("Error: Numpy data array '" + str(fileName_) + "' is not in shape (var, time, z, lat, lon).")
+            for i_var in range(pData.shape[0]):
+                self.varsNames.append('var' + str(i_var))
+                self.varsTitles.append('0  variable ' + str(i_var))
+                self.pVarDict['var' + str(i_var)] = pData[i_var]
+            self.pLat = numpy.arange(pData.shape[3], dtype = numpy.float64)
+            self.pLon = numpy.arange(pData.shape[4], dtype = numpy.float64)
+            self.pDateList = [datetime(1970, 1, 1) + timedelta(hours = n * DATATIMESTEP) for n in range(pData.shape[1])]
+            self.title = str(fileName_)
+
+        else:
+            if Dataset is None:
+                raise Exception("Error: API 'netCDF4' is not available. File '" + str(fileName_) + "' can't be read by the stand-in backend 'netcdf', only numpy data arrays '.npy'.")
+            self.pFile = Dataset(fileName_, 'r')
+            for varName in self.pFile.variables.keys():
+                pVar = self.pFile.variables[varName]
+                if pVar.ndim in [3, 4]:
+                    self.varsNames.append(str(varName))
+                    self.varsTitles.append('0  ' + str(getattr(pVar, 'long_name', varName)))
+                    self.pVarDict[str(varName)] = pVar
+
+            if len(self.varsNames) == 0:
+                raise Exception("Error: NetCDF file '" + str(fileName_) + "' has no variables (time, lat, lon) or (time, z, lat, lon).")
+            pDimList = self.pFile.variables[self.varsNames[0]].dimensions
+            self.pLat = self.__getCoordinate(pDimList[-2])
+            self.pLon = self.__getCoordinate(pDimList[-1])
+            if self.pFile.variables.has_key(pDimList[0]) and hasattr(self.pFile.variables[pDimList[0]], 'units'):
+                pTime = self.pFile.variables[pDimList[0]]
+                self.pDateList = list(num2date(pTime[:], pTime.units, getattr(pTime, 'calendar', 'standard')))
+            else:
+                self.pDateList = [datetime(1970, 1, 1) + timedelta(hours = n * DATATIMESTEP) for n in range(len(self.pFile.dimensions[pDimList[0]]))]
+            self.title = str(getattr(self.pFile, 'title', fileName_))
+
+        self.timeStop = len(self.pDateList)
+        return
+
+
+    def query(self, name_):
+        """Return container with the attributes of GRADS query 'file' or 'dims'"""
+
+        pHandle = GradsStandInHandle()
+        if name_ == 'file':
+            pHandle.title = self.title
+            pHandle.nx = len(self.pLon)
+            pHandle.ny = len(self.pLat)
+            pHandle.nz = 1
+            pHandle.nt = len(self.pDateList)
+            pHandle.nvars = len(self.varsNames)
+            pHandle.vars = list(self.varsNames)
+            pHandle.var_titles = list(self.varsTitles)
+        elif name_ == 'dims':
+            pHandle.lat = (float(numpy.min(self.pLat)), float(numpy.max(self.pLat)))
+            pHandle.lon = (float(numpy.min(self.pLon)), float(numpy.max(self.pLon)))
+            pHandle.t = (self.timeStart, self.timeStop)
+            pHandle.time = (self.__getGradsTime(self.pDateList[self.timeStart-1]), self.__getGradsTime(self.pDateList[self.timeStop-1]))
+        else:
+            raise Exception("Error: GRADS query '" + str(name_) + "' is not implemented by stand-in.")
+
+        return pHandle
+
+
+    def expr(self, name_):
+        """Return masked array (time, lat, lon) of variable 'name' for the time steps set by 'set t',
+        as GRADS the time dimension is omitted if only one time step is set"""
+
+        if not self.pVarDict.has_key(name_):
+            raise Exception("Error: Variable '" + str(name_) + "' does not exist. Only variable names are implemented by stand-in.")
+
+        pVar = self.pVarDict[name_]
+        if len(pVar.shape) == 4: #(time, z, lat, lon)
+            pData = pVar[self.timeStart-1:self.timeStop, self.level-1, :, :]
+        else: #(time, lat, lon)
+            pData = pVar[self.timeStart-1:self.timeStop, :, :]
+        pData = numpy.ma.asarray(pData)
+        if self.timeStart == self.timeStop:
+            pData = pData[0]
+
+        return pData
+
+
+    def __getPosition(self, dimension_, value_):
+        """Return position number of value 'value' (string) of GRADS command 'set t' or 'set z'"""
+
+        if value_ == 'last':
+            if dimension_ == 't':
+                return len(self.pDateList)
+            return 1
+        return int(value_)
+
+
+    def __getCoordinate(self, dimName_):
+        """Return values of coordinate variable 'dimName', or indices if the variable does not exist"""
+
+        if self.pFile.variables.has_key(dimName_):
+            return numpy.asarray(self.pFile.variables[dimName_][:], dtype = numpy.float64)
+        return numpy.arange(len(self.pFile.dimensions[dimName_]), dtype = numpy.float64)
+
+
+    def __getGradsTime(self, pDatetime_):
+        """Return date 'pDatetime' in GRADS format, e.g. '00:30Z11JAN2008'"""
+
+        return "%02d:%02dZ%02d%s%04d" % (pDatetime_.hour, pDatetime_.minute, pDatetime_.day, \
+            GRADS_MONTHS[pDatetime_.month - 1], pDatetime_.year)
+
+
+class GradsStandInHandle:
+    """Container for the result of a query of class 'GradsStandIn', printed like a GRADS query handle"""
+
+    def __str__(self):
+        return '\n'.join([str(key) + ' = ' + str(value) for (key, value) in sorted(self.__dict__.items())])
+
+
+def openGradsSession(fileName_, backend_=GRADS_BACKEND):
+    """
+    Start a GRADS session and open file 'fileName'.
+
+    INPUT_PARAMETERS:
+    fileName    - name of GRADS readable file (backend 'grads') or of NetCDF file or numpy data array
+        (backend 'netcdf') (string)
+    backend     - 'grads' for GRADS by 'ganum.GaNum', 'netcdf' for stand-in 'GradsStandIn' (string)
+
+    RETURN_VALUE:
+    GRADS session providing the GRADS commands and the functions 'query' and 'expr'
+    """
+
+    if backend_ == 'netcdf':
+        pGa = GradsStandIn()
+        pGa.open(fileName_)
+        return pGa
+
+    if ganum is None:
+        raise Exception("Error: GRADS API 'grads.ganum' is not available. Use the stand-in backend 'netcdf' for testing.")
+
+    #Start the GRADS application, creating new instance
+    #Depending on GRADS version, 'Bin' is telling which GRADS executable to start
+    #For 2.0a7 this is 'grads' and 'gradsdap'
+    try:
+        pGa = ganum.GaNum(Bin='grads', Echo=False, Window=False)
+        pGa.open(fileName_)
+    except:
+        raise Exception ("Opening of file '" + str(fileName_) + "' failed. Check if it exists and if filename suffix is set.")
+
+    return pGa
+
+
+def initGradsWorker(fileName_, backend_, timeCommand_):
+    """Initializer of a worker process: Open GRADS session of file 'fileName' once per process, set its
+    dimensions by the GRADS command 'timeCommand' and detach handlers of the logger"""
+
+    global pGradsWorkerSession
+
+    pLogger = logging.getLogger(MODULE_LOGGER_ROOT)
+    if multiprocessing.current_process().name != 'MainProcess':
+        for pHandler in pLogger.handlers[:]:
+            pLogger.removeHandler(pHandler)
+
+    pGradsWorkerSession = openGradsSession(fileName_, backend_)
+    pGradsWorkerSession("set z 1") #GRADS command to set dimensions
+    pGradsWorkerSession(timeCommand_)
+    return
+
+
+def readGradsVariableWorker(pArgs_):
+    """
+    Export one variable by the GRADS session of the worker process into its slot of a memory mapped numpy file.
+
+    INPUT_PARAMETERS:
+    pArgs       - tuple (numpy file name, variable index, variable name)
+
+    RETURN_VALUE:
+    Variable index
+    """
+
+    (outFileName, i_var, varName) = pArgs_
+
+    pGradsData = numpy.load(outFileName, mmap_mode='r+')
+    pDataArray = pGradsWorkerSession.expr(varName)
+    pGradsData[i_var,:,0,:,:] = numpy.ma.getdata(pDataArray).reshape(pGradsData.shape[1], pGradsData.shape[3], pGradsData.shape[4])
+    pGradsData.flush()
+    del pGradsData #Close memory mapped file
+
+    return i_var
+
+
 #_______________________________________________________________________________
 
 def main():
@@ -685,22 +922,26 @@ def main():
     #-------------------------------------------------------------------------------
     pParser = OptionParser(usage=USAGE, version = VERSION, description = DESCRIPTION, epilog = EPILOG)
 
+    pParser.set_defaults(backend = GRADS_BACKEND)
     pParser.set_defaults(completeModel = False)
     pParser.set_defaults(isDoc = False)
     pParser.set_defaults(logLevel = pDefaultSettings.loggerLevelConsole)
     pParser.set_defaults(nodataValue = NODATA)
     pParser.set_defaults(dataPath = pDefaultSettings.dataDirectory) 
     pParser.set_defaults(dataType = NUMPYDATA_DTYPE)
+    pParser.set_defaults(nWorkers = GRADS_WORKERS)
 
     
+    pParser.add_option('-b', '--backend', action = 'store', dest='backend', choices = ['grads','netcdf'], nargs = 1, help="Read data by GRADS or by a stand-in for GRADS reading NetCDF or numpy files (default = %default)")
     pParser.add_option("-c", "--complModel", action="store_true",  dest='completeModel', help="Complete data model by functions particularly written for specific data (default = %default)")
     pParser.add_option("-d", "--doc", action="store_true",  dest='isDoc', help="Give more information by printing docstrings (default = %default)")
     pParser.add_option('-l', '--log', action = 'store', dest='logLevel', choices = ['debug','info','warning','error','critical'], nargs = 1, help="Minimum level for printing information to the console (default = %default)")
     pParser.add_option('-n', '--nodata', action = 'store', dest='nodataValue', nargs = 1, help="Set nodata value (default = %default)")
     pParser.add_option('-p', '--path', action = 'store', type ='string', dest='dataPath', nargs = 1, help="Directory for input / output files (default = %default)")
-    pParser.add_option('-s', '--specData', action = 'store', dest='specificData', nargs = 2, help="Only extract specific data as implemented in function 'choseSpecificData' \
-        between DATASTART (arg1) and DATASTOP (arg2)") #(default = %default)")
+    pParser.add_option('-s', '--specData', action = 'store', dest='specificData', nargs = 2, help="Only extract time values between position DATASTART (arg1) \
+        and DATASTOP (arg2), start value = 1, by the GRADS command 'set t DATASTART DATASTOP'") #(default = %default)")
     pParser.add_option('-t', '--dtype', action = 'store', dest='dataType', choices = [''] + NUMPY_DTYPES, nargs = 1, help="Define output data type of numpy array (default = %default)")
+    pParser.add_option('-w', '--workers', action = 'store', type ='int', dest='nWorkers', nargs = 1, help="Number of GRADS sessions exporting variables in parallel, '0' for number of CPUs (default = %default)")
     
     (options, args) = pParser.parse_args()
 
@@ -10,11 +10,18 @@ This class is containing all possible operations that can be employed within the
 __author__= "Nicolai Holzer"
 __author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 __date__ ="2011-03-28"
-__version__ = "v0.1.2"
+__version__ = "v0.1.9"
 
 
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-05-20: v0.1.9 streaming statistics of data variables added
+#2011-05-19: v0.1.8 overview levels of grids added
+#2011-05-18: v0.1.7 temporal resampling added
+#2011-05-13: v0.1.6 boolean variables can be saved as single categorical variable
+#2011-05-10: v0.1.5 cached results of NetCDF file checks
+#2011-05-09: v0.1.4 parallel check of multiple NetCDF files added
+#2011-05-06: v0.1.3 data value check added
 #2011-01-05: v0.1.2 logging implemented
 #2010-11-22: v0.1.1 comments and docstrings added
 #2010-10-08: v0.1.0 first version
@@ -24,7 +31,9 @@ __version__ = "v0.1.2"
 #-------------------------------------------------------------------------------
 #standard libraries
 import os
+import glob
 import logging
+import multiprocessing
 
 #related libraries
 import numpy
@@ -128,7 +137,7 @@ class ControlModel:
         #Get correct inherited class of ModelDataRead
         #-------------------------------------------------------------------------------
         if os.path.exists(self.inputFile+FILENAME_SUFFIX_NUMPYDATA):
-            pNumpy = numpy.load(self.inputFile+FILENAME_SUFFIX_NUMPYDATA)
+            pNumpy = numpy.load(self.inputFile+FILENAME_SUFFIX_NUMPYDATA, mmap_mode='r') #Only header is read
 
             if pNumpy.ndim == 2: #(time, variable) considered as station data
                 self.pDataModel = ModelDataStationRead(self.inputFile)
@@ -164,8 +173,9 @@ class ControlModel:
         return
 
 
-    def readNetCdf(self):
-        """Read one or multiple NetCDF files and save data in internal model"""
+    def readNetCdf(self, isLazy_=False):
+        """Read one or multiple NetCDF files and save data in internal model. If 'isLazy' is set,
+        data variables are attached as NetCDF variables that are read on demand by slicing"""
 
         pDocNetCdf = ModelNetCdfRead(self.inputFile)
 
@@ -173,9 +183,12 @@ class ControlModel:
         self.pDataList.append(pDimList)
         pAttrList = pDocNetCdf.readGlobalAttributes()
         self.pDataList.append(pAttrList)
-        pVarList = pDocNetCdf.readVariables()
+        pVarList = pDocNetCdf.readVariables(isLazy_)
         self.pDataList.append(pVarList)
 
+        if isLazy_: #NetCDF files must remain open as long as the data is used
+            self.pDocNetCdf = pDocNetCdf
+
         return
 
 
@@ -204,11 +217,15 @@ class ControlModel:
 
         if self.pParserOptions.checkNetCdf in ['','cf','default','station','cf+default','cf+default+station'] :
             NetCdfChecker = ModelCheckNetCdf(self.inputFile, self.pDataList)
+            pCheckCache = ModelCheckCache() #Results of unchanged files are taken from cache
+            forceCheck = self.pParserOptions.forceCheck
 
             #Check for CF Convention
             #-------------------------------------------------------------------------------
             if 'cf' in self.pParserOptions.checkNetCdf:
-                errorStatus = NetCdfChecker.checkCf()
+                pCheckResult = NetCdfChecker.runCheck('cf', pCheckCache, forceCheck)
+                self.__logCachedCheckResult('CFChecker', pCheckResult)
+                errorStatus = pCheckResult['result']
                 if errorStatus > 0: #> 0 --> Number of errors that occured;
                     self.pLogger.error("CFChecker detected '" + str(errorStatus) +  "' errors for file '" + str(self.inputFile) + \
                     "', so it can not be considered as a valid CF file! Check error messages on the screen (They are not saved in the logfile)!")
@@ -222,7 +239,9 @@ class ControlModel:
             #Check if default settings are observed as defined in related XML file
             #-------------------------------------------------------------------------------
             if 'default' in self.pParserOptions.checkNetCdf: 
-                if NetCdfChecker.checkDefaultSettings() == True: #No error detected
+                pCheckResult = NetCdfChecker.runCheck('default', pCheckCache, forceCheck)
+                self.__logCachedCheckResult('Default settings comparision check', pCheckResult)
+                if pCheckResult['result'] == True: #No error detected
                     self.pLogger.info("'Default settings comparision check' for NetCdf file '" + str(self.inputFile) + "' was successfull. No errors found.")
                 else: #Error detected
                     self.pLogger.error("Summary: 'Default settings comparision check' for NetCdf file '" + str(self.inputFile) + "' failed. See error messages above.")
@@ -230,7 +249,9 @@ class ControlModel:
             #Check for Dapper In-situ Data Convention for time series station data
             #-------------------------------------------------------------------------------
             if 'station' in self.pParserOptions.checkNetCdf:
-                if NetCdfChecker.checkStation() == True: #No error detected
+                pCheckResult = NetCdfChecker.runCheck('station', pCheckCache, forceCheck)
+                self.__logCachedCheckResult('Dapper In-situ Data Convention check', pCheckResult)
+                if pCheckResult['result'] == True: #No error detected
                     self.pLogger.info("'Dapper In-situ Data Convention' check for NetCdf file '" + str(self.inputFile) + "' was successfull. No errors found.")
                 else: #Error detected
                     self.pLogger.error("Summary: 'Dapper In-situ Data Convention' check for NetCdf file '" + str(self.inputFile) + "' failed. See error messages above.")
@@ -240,6 +261,34 @@ class ControlModel:
         return
 
 
+    def __logCachedCheckResult(self, checkName_, pCheckResult_):
+        """Private function printing the messages of a check result that was taken from cache"""
+
+        if pCheckResult_['cached']:
+            self.pLogger.info(str(checkName_) + ": Use cached result for unchanged file '" + str(self.inputFile) + \
+                "'. Set parser option [-r] to force a new check.")
+            for message in pCheckResult_['messages']:
+                self.pLogger.info("Cached message: " + str(message))
+        return
+
+
+    def checkDataValues(self):
+        """Checks the data values of the internal model chunk by chunk: values outside of the valid range,
+        overflow of the declared variable type, monotonic coordinates, number of _FillValue and NaN values"""
+
+        if self.pParserOptions.checkValues:
+            pValueChecker = ModelCheckDataValues(self.pDataList[2])
+            (dataOk, pSummaryDict) = pValueChecker.checkDataValues()
+            if dataOk:
+                self.pLogger.info("Data value check for '" + str(self.inputFile) + "' was successfull. No errors found.")
+            else:
+                self.pLogger.error("Summary: Data value check for '" + str(self.inputFile) + "' failed. See error messages above.")
+        else:
+            self.pLogger.info("Set parser option [-q] if you want to check the data values of the internal data model")
+
+        return
+
+
     def writeMetadataNcml(self):
         """Create NCML metadata file out of internal model"""
 
@@ -313,11 +362,339 @@ class ControlModel:
         #-------------------------------------------------------------------------------
         pNumpyData = ModelData2Bool(self.inputFile)
 
-        pNumpyData.changeVar2BoolVars(varNr, pBadValuesListFloat)
+        if self.pParserOptions.boolAsFlags: #Single categorical variable with CF attributes 'flag_values' and 'flag_meanings'
+            pNumpyData.changeVar2FlagVar(varNr, pBadValuesListFloat)
+        else: #One boolean variable for each value
+            pNumpyData.changeVar2BoolVars(varNr, pBadValuesListFloat)
         pNumpyData.writeNumpyData()
         pNumpyData.writeMetadataNcml()
         pNumpyData.completeMetadataNcml()
 
+        if self.pParserOptions.classTable: #Optional: lookup table of new variables and their values
+            pNumpyData.writeClassTable()
+
+        return
+
+
+    def decodeFlagVars(self):
+        """Decode the flag chosen by the parser (flag meaning) of each categorical variable with CF attributes
+        'flag_values' and 'flag_meanings' of a data model dataset to a boolean variable. Other data variables
+        are not changed. The result is exported as new data model dataset with suffix '_<flag meaning>'"""
+
+        self.__readDataModelOrNetCdf(False) #Unchanged NetCDF variables are written as a whole
+
+        meaning = str(self.pParserOptions.decodeFlag)
+        outputFile = self.__getDerivedFileName('_' + meaning)
+        pVarList = self.pDataList[2]
+        pTmpFileList = list() #Decoded data, memory mapped until the dataset is written
+        for i_var in range(0, len(pVarList), 1):
+            pVar = pVarList[i_var]
+            if not 'flag_values' in [pVarAttr.getName() for pVarAttr in pVar.getAttributes()]:
+                continue
+
+            pDecoder = ModelFlagDecoder(pVar)
+            if not meaning in pDecoder.getFlagMeanings():
+                self.pLogger.warning("Flag meaning '" + meaning + "' is not defined for variable '" + str(pVar.getName()) + \
+                "'. Defined flag meanings are '" + str(pDecoder.getFlagMeanings()) + "'.")
+                continue
+
+            pTmpFileList.append(outputFile + '_' + str(pVar.getName()) + FILENAME_SUFFIX_NUMPYDATA + '.tmp')
+            pVarList[i_var] = pDecoder.decodeVariable(meaning, pTmpFileList[-1])
+
+        if len(pTmpFileList) == 0:
+            raise Exception("Error: No categorical variable with flag meaning '" + meaning + "' found in '" + str(self.inputFile) + "'.")
+
+
+        #Export new data model dataset
+        #-------------------------------------------------------------------------------
+        self.inputFile = outputFile
+
+        self.pLogger.info("Decoded data will be saved as data model dataset '" + str(self.inputFile) + "'.")
+        self.writeMetadataNcml()
+        self.writeDataNumpy()
+
+        for tmpFile in pTmpFileList:
+            os.remove(tmpFile)
+
         return
+
+
+    def resampleTime(self):
+        """Aggregate data variables of a data model dataset or a NetCDF file along the time axis to the
+        frequency and by the method chosen by the parser, e.g. half-hourly values to daily means.
+        The result is exported as new data model dataset with suffix '_<frequency>_<method>'"""
+
+        self.__readDataModelOrNetCdf()
+
+        pResample = ModelResampleTime(self.pDataList, self.pParserOptions.resampleFreq, self.pParserOptions.resampleHow)
+        self.pDataList = pResample.resampleTime()
+
+
+        #Export new data model dataset
+        #-------------------------------------------------------------------------------
+        self.inputFile = self.__getDerivedFileName('_' + str(pResample.frequency) + '_' + str(self.pParserOptions.resampleHow))
+
+        self.pLogger.info("Resampled data will be saved as data model dataset '" + str(self.inputFile) + "'.")
+        self.writeMetadataNcml()
+        self.writeDataNumpy()
+
+        return
+
+
+    def makeGridOverviews(self):
+        """Create coarsened versions of the grid of a data model dataset or a NetCDF file for the factors
+        chosen by the parser (e.g. '2,4,8') by block aggregation. Each overview level is saved as
+        NetCDF file with suffix '_ovr<factor>' beside the input data"""
+
+        self.__readDataModelOrNetCdf()
+
+        pFactorList = self.pProcessingTool.string2List(self.pParserOptions.gridOverviews, ',')
+        pCoarsen = ModelCoarsenGrid(self.pDataList, pFactorList, self.pParserOptions.resampleHow)
+        pLevelList = pCoarsen.coarsenGrid()
+
+        inputFile = self.inputFile
+        for (factor, pDataList) in pLevelList:
+            self.inputFile = self.__getDerivedFileName('_ovr' + str(factor), inputFile)
+            self.pDataList = pDataList
+
+            self.pLogger.info("Overview level with factor '" + str(factor) + "' will be saved as NetCDF file '" + str(self.inputFile) + "'.")
+            self.writeNetCdf()
+
+        self.inputFile = inputFile
+        return
+
+
+    def computeStatistics(self):
+        """Calculate statistics and histograms of the data variables of a data model dataset or a NetCDF
+        file in streaming passes. Optionally minimum and maximum are saved as attribute 'actual_range'
+        in the NCML XML file or the NetCDF file.
+
+        RETURN_VALUE:
+        Dictionary of statistics by variable name as returned by class 'ModelDataStatistics'
+        """
+
+        isDataModel = os.path.exists(self.inputFile+FILENAME_SUFFIX_NUMPYDATA)
+        ncmlFileName = self.inputFile+FILENAME_SUFFIX_NCML #Input file name may change for station data
+        self.__readDataModelOrNetCdf()
+
+        pStatistics = ModelDataStatistics(self.pDataList[2], self.pParserOptions.statsPerTime)
+        pStatsDict = pStatistics.computeStatistics()
+
+        if self.pParserOptions.storeActualRange: #Optional: save 'actual_range' attributes
+            self.pDocNetCdf = None #Close lazily read NetCDF files before they are opened for writing
+            if isDataModel:
+                pStatistics.storeActualRangeNcml(ncmlFileName)
+            elif '*' in self.inputFile:
+                self.pLogger.warning("Attribute 'actual_range' can't be saved for multiple NetCDF files '" + str(self.inputFile) + "'.")
+            elif self.inputFile.endswith(FILENAME_SUFFIX_NETCDF):
+                pStatistics.storeActualRangeNetCdf(self.inputFile)
+            else:
+                pStatistics.storeActualRangeNetCdf(self.inputFile+FILENAME_SUFFIX_NETCDF)
+
+        return pStatsDict
+
+
+    def __readDataModelOrNetCdf(self, isLazy_=True):
+        """Read internal model from data model dataset if it exists, otherwise from NetCDF file(s).
+        Data model arrays are memory mapped, NetCDF data variables are read lazily if 'isLazy' is set"""
+
+        if os.path.exists(self.inputFile+FILENAME_SUFFIX_NUMPYDATA):
+            self.readMetadataNcml()
+            self.readDataNumpy()
+        else:
+            self.readNetCdf(isLazy_)
+
+        return
+
+
+    def __getDerivedFileName(self, suffix_, inputFile_=None):
+        """Return file name (without filename suffix) of data derived from the input data by
+        adding 'suffix'. The declaration of station data remains at the end of the file name"""
+
+        if inputFile_ is None:
+            outputFile = self.inputFile
+        else:
+            outputFile = inputFile_
+
+        if outputFile.endswith(FILENAME_SUFFIX_NETCDF):
+            outputFile = outputFile[:-len(FILENAME_SUFFIX_NETCDF)]
+        if outputFile.endswith(DECLARATION_NETCDF_STATION): #Suffix of station data must remain at the end
+            return outputFile[:-len(DECLARATION_NETCDF_STATION)] + suffix_ + DECLARATION_NETCDF_STATION
+        else:
+            return outputFile + suffix_
        
 
+
+
+#_______________________________________________________________________________
+
+class ControlCheckFiles:
+    """
+    Controlling class for checking multiple NetCDF files in parallel.
+
+    Each file is checked in a worker process of a process pool by the checks of the class
+    'ModelCheckNetCdf'. The results are collected per file instead of being printed on the
+    screen by each check.
+    """
+
+
+    def __init__(self, fileNames_, option_):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        fileNames   - wildcard expression of NetCDF files (with or without .nc-filename extension),
+                      or name of a catalog text file with one NetCDF file name per line (string)
+        option      - Parser.options arguments
+        """
+
+        self.pParserOptions = option_
+        self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+
+        fileNames = str(fileNames_)
+        if os.path.isfile(fileNames) and not fileNames.endswith(FILENAME_SUFFIX_NETCDF): #Catalog file
+            pCatalog = open(fileNames, 'r')
+            try:
+                self.pFileList = [line.strip() for line in pCatalog if line.strip() != '' and not line.startswith('#')]
+            finally:
+                pCatalog.close()
+        else:
+            if not fileNames.endswith(FILENAME_SUFFIX_NETCDF): #Add filename suffix '.nc' if this is missing
+                fileNames = fileNames + FILENAME_SUFFIX_NETCDF
+            self.pFileList = sorted(glob.glob(fileNames))
+
+        if len(self.pFileList) == 0:
+            raise Exception("Error: No NetCDF files found for '" + str(fileNames_) + "'.")
+
+
+    def checkFiles(self):
+        """
+        Check all files and return list of result dictionaries (see function 'checkNetCdfFileWorker'),
+        in the same order as the files.
+        """
+
+        checkOption = self.pParserOptions.checkNetCdf
+        if checkOption == '': #No check choosen: run all checks
+            checkOption = 'cf+default+station'
+
+        nWorkers = int(self.pParserOptions.nWorkers)
+        if nWorkers <= 0:
+            nWorkers = multiprocessing.cpu_count()
+        nWorkers = min(nWorkers, len(self.pFileList))
+
+        self.pLogger.info("Check '" + str(len(self.pFileList)) + "' NetCDF files ('" + str(checkOption) + "') with '" + str(nWorkers) + "' worker processes...")
+
+        pArgsList = [(fileName, checkOption, self.pParserOptions.forceCheck) for fileName in self.pFileList]
+        if nWorkers == 1:
+            initCheckNetCdfWorker()
+            pResultList = [checkNetCdfFileWorker(pArgs) for pArgs in pArgsList]
+        else:
+            pPool = multiprocessing.Pool(nWorkers, initCheckNetCdfWorker)
+            try:
+                pResultList = pPool.map(checkNetCdfFileWorker, pArgsList, 1)
+            finally:
+                pPool.close()
+                pPool.join()
+
+        self.__logResults(pResultList)
+
+        return pResultList
+
+
+    def __logResults(self, pResultList_):
+        """Private function printing a summary line for each checked file"""
+
+        nFailed = 0
+        for pResult in pResultList_:
+            fileOk = True
+            summary = ""
+            if pResult['exception'] is not None:
+                fileOk = False
+                summary = summary + " exception: '" + str(pResult['exception']) + "';"
+            if pResult['cf'] is not None:
+                if pResult['cf']['errors'] > 0:
+                    fileOk = False
+                summary = summary + " cf: '" + str(pResult['cf']['errors']) + "' errors, '" + str(pResult['cf']['warnings']) + "' warnings;"
+            for check in ['default', 'station']:
+                if pResult[check] is not None:
+                    if not pResult[check]['ok']:
+                        fileOk = False
+                    summary = summary + " " + check + ": '" + str(len(pResult[check]['messages'])) + "' messages;"
+
+            if fileOk:
+                self.pLogger.info("File '" + str(pResult['file']) + "' is valid:" + summary)
+            else:
+                nFailed = nFailed + 1
+                self.pLogger.error("File '" + str(pResult['file']) + "' is not valid:" + summary)
+
+        self.pLogger.info("Summary: '" + str(len(pResultList_) - nFailed) + "' of '" + str(len(pResultList_)) + "' NetCDF files are valid.")
+
+        return
+
+
+def initCheckNetCdfWorker():
+    """Initializer of a worker process: Load shared read-only tables of the CF checker once per
+    process and detach handlers of the interface logger, results are returned instead"""
+
+    pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT)
+    if multiprocessing.current_process().name != 'MainProcess':
+        for pHandler in pLogger.handlers[:]:
+            pLogger.removeHandler(pHandler)
+
+    preloadCfTables()
+    return
+
+
+def checkNetCdfFileWorker(pArgs_):
+    """
+    Check one NetCDF file in a worker process.
+
+    INPUT_PARAMETERS:
+    pArgs       - tuple (NetCDF file name, check option string as for parser option [-f], force check
+                  even if result is cached)
+
+    RETURN_VALUE:
+    Dictionary with the keys 'file', 'exception' (None or error message), and 'cf' ('errors', 'warnings',
+    'messages', 'cached'), 'default' and 'station' ('ok', 'messages', 'cached'), each None if the check
+    was not choosen
+    """
+
+    (netCdfName, checkOption, forceCheck) = pArgs_
+    if not netCdfName.endswith(FILENAME_SUFFIX_NETCDF): #Add filename suffix '.nc' if this is missing
+        netCdfName = netCdfName + FILENAME_SUFFIX_NETCDF
+    pResult = {'file': netCdfName, 'exception': None, 'cf': None, 'default': None, 'station': None}
+
+    try:
+        pCheckCache = ModelCheckCache()
+        pCheckNameList = [checkName for checkName in ['cf', 'default', 'station'] if checkName in checkOption]
+
+        #Get cached results first, the file is only read if a result is missing
+        pCheckResultDict = dict()
+        if not forceCheck:
+            for checkName in pCheckNameList:
+                pCheckResult = pCheckCache.getResult(netCdfName, checkName)
+                if pCheckResult is not None:
+                    pCheckResult['cached'] = True
+                    pCheckResultDict[checkName] = pCheckResult
+
+        if len(pCheckResultDict) < len(pCheckNameList):
+            pDocNetCdf = ModelNetCdfRead(netCdfName)
+            pDataList = [pDocNetCdf.readDimensions(), pDocNetCdf.readGlobalAttributes(), pDocNetCdf.readVariables()]
+            pChecker = ModelCheckNetCdf(netCdfName, pDataList)
+            for checkName in pCheckNameList:
+                if not pCheckResultDict.has_key(checkName):
+                    pCheckResultDict[checkName] = pChecker.runCheck(checkName, pCheckCache, True, False)
+
+        for checkName in pCheckNameList:
+            pCheckResult = pCheckResultDict[checkName]
+            if checkName == 'cf':
+                errorStatus = pCheckResult['result']
+                pResult['cf'] = {'errors': max(errorStatus, 0), 'warnings': max(-errorStatus, 0), \
+                    'messages': pCheckResult['messages'], 'cached': pCheckResult['cached']}
+            else:
+                pResult[checkName] = {'ok': pCheckResult['result'], 'messages': pCheckResult['messages'], 'cached': pCheckResult['cached']}
+
+    except (Exception, SystemExit), e: #CFChecker exits on some errors
+        pResult['exception'] = str(e)
+
+    return pResult
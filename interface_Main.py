@@ -27,6 +27,7 @@ __version__ = "v0.1.2" #MajorVersion(backward_incompatible).MinorVersion(backwar
 import sys
 from optparse import OptionParser
 import logging
+import json
 
 #related libraries
 #local applications / library specific import
@@ -49,6 +50,8 @@ USAGE = "Usage: %prog [options] operation data\
     \n    - model2Model     Convert one single data model dataset to one single data model dataset\
     \n    - readModel       Read one single data model dataset with possibility to employ operations on it\
     \n    - readNc          Read one single NetCDF file with possibility to employ operations on it\
+    \n    - checkAll        Check multiple NetCDF files (wildcards (*) or catalog file) in parallel, see options [-f] [-w] [-j]\
+    \n    - stats           Calculate statistics and histograms of the data variables of a data model dataset or NetCDF file(s), see options [-e] [-j] [-u]\
     \n    - utilities       Apply special utility operations to the data by setting related options\
     \n\
     \ndata:\
@@ -118,6 +121,7 @@ class MainInterface:
         pControl.readDataNumpy()
         
         pControl.printModel() #Optional if parser option is set
+        pControl.checkDataValues() #Optional if parser option is set
 
         pControl.writeNetCdf()
 
@@ -150,6 +154,7 @@ class MainInterface:
         pControl.readNetCdf()
 
         pControl.printModel() #Optional if parser option is set
+        pControl.checkDataValues() #Optional if parser option is set
         
         pControl.writeNetCdf()
 
@@ -182,6 +187,7 @@ class MainInterface:
         pControl.readNetCdf()
 
         pControl.printModel() #Optional if parser option is set
+        pControl.checkDataValues() #Optional if parser option is set
         pControl.checkNetCdf() #Optional if parser option is set
 
         pControl.writeMetadataNcml()
@@ -209,6 +215,7 @@ class MainInterface:
         pControl.readDataNumpy()
 
         pControl.printModel() #Optional if parser option is set
+        pControl.checkDataValues() #Optional if parser option is set
         
         pControl.writeMetadataNcml()
         pControl.writeDataNumpy()
@@ -232,6 +239,7 @@ class MainInterface:
         pControl.readDataNumpy()
 
         pControl.printModel() #Optional if parser option is set
+        pControl.checkDataValues() #Optional if parser option is set
       
         #pControl.__del__()
         return
@@ -256,12 +264,72 @@ class MainInterface:
         pControl.readNetCdf()
 
         pControl.printModel() #Optional if parser option is set
+        pControl.checkDataValues() #Optional if parser option is set
         pControl.checkNetCdf() #Optional if parser option is set
 
         #pControl.__del__()
         return
 
     
+    def checkAll(self, infile_):
+        """
+        Checks multiple NetCDF files in parallel.
+
+        INPUT_PARAMETERS:
+        infile      - Wildcard expression of NetCDF files, or name of a catalog text file with one
+                      NetCDF file name per line (string)
+
+        COMMENTS:
+        The checks are choosen by parser option [-f] (all checks if not set), the number of worker
+        processes by option [-w]. The results per file can be written to a JSON file by option [-j].
+        """
+
+        self.pLogger.info("Operation: Check multiple NetCDF files")
+
+        pControl = ControlCheckFiles(infile_, self.pParserOptions)
+        pResultList = pControl.checkFiles()
+
+        if self.pParserOptions.jsonReport != '':
+            pReportFile = open(self.pParserOptions.jsonReport, 'w')
+            try:
+                json.dump(pResultList, pReportFile, indent = 2)
+            finally:
+                pReportFile.close()
+            self.pLogger.info("Check results saved in file '" + str(self.pParserOptions.jsonReport) + "'.")
+
+        return
+
+
+    def statistics(self, infile_):
+        """
+        Calculates statistics and histograms of the data variables without loading them as a whole.
+
+        INPUT_PARAMETERS:
+        infile      - Name of data files (data model) without suffixes or NetCDF file name(s) (string)
+
+        COMMENTS:
+        Statistics per time value are calculated if parser option [-e] is set. The statistics can be
+        written to a JSON file by option [-j], minimum and maximum can be saved as attribute 'actual_range'
+        by option [-u].
+        """
+
+        self.pLogger.info("Operation: Calculate statistics of data variables")
+
+        pControl = ControlModel(infile_, self.pParserOptions)
+        pStatsDict = pControl.computeStatistics()
+
+        if self.pParserOptions.jsonReport != '':
+            pReportFile = open(self.pParserOptions.jsonReport, 'w')
+            try:
+                json.dump(pStatsDict, pReportFile, indent = 2)
+            finally:
+                pReportFile.close()
+            self.pLogger.info("Statistics saved in file '" + str(self.pParserOptions.jsonReport) + "'.")
+
+        #pControl.__del__()
+        return
+
+
     def utilities(self, infile_):
         """
         Various utility options to modify the data model
@@ -281,9 +349,18 @@ class MainInterface:
         #Optional if parser option is set
         if not self.pParserOptions.makeBool is None: #Option makeBool is choosen
             pControl.makeNumpyVarBool()
+
+        elif not self.pParserOptions.decodeFlag is None: #Option decodeflag is choosen
+            pControl.decodeFlagVars()
+
+        elif not self.pParserOptions.resampleFreq is None: #Option resample is choosen
+            pControl.resampleTime()
+
+        elif not self.pParserOptions.gridOverviews is None: #Option overviews is choosen
+            pControl.makeGridOverviews()
        
         else: #If no option is choosen print information of all available utility options
-            self.pLogger.info("Set utilitity parser options [-b] with corresponding arguments to use this function.")
+            self.pLogger.info("Set utilitity parser options [-b], [-x], [-s] or [-g] with corresponding arguments to use this function.")
 
         #pControl.__del__()
         return
@@ -347,17 +424,38 @@ def main():
     pParser.set_defaults(printMeta = False)
     pParser.set_defaults(dataPath = pDefaultSettings.dataDirectory) 
     pParser.set_defaults(printVars = False)
-
-
+    pParser.set_defaults(checkValues = False)
+    pParser.set_defaults(nWorkers = 0)
+    pParser.set_defaults(forceCheck = False)
+    pParser.set_defaults(classTable = False)
+    pParser.set_defaults(jsonReport = '')
+    pParser.set_defaults(boolAsFlags = False)
+    pParser.set_defaults(resampleHow = 'mean')
+    pParser.set_defaults(statsPerTime = False)
+    pParser.set_defaults(storeActualRange = False)
+
+
+    pParser.add_option('-a', '--how', action = 'store', dest='resampleHow', choices = ['mean','min','max','sum','mode'], nargs = 1, help="Utility options [-s] [-g]: method to aggregate the values of each time interval or grid block, 'mode' only for [-g] (default = %default)")
     pParser.add_option("-b", "--makebool", action = 'store', dest='makeBool', nargs = 2, help="Utility operation to make booleans for values of data variable #'arg1' by ignoring values 'arg2,..'")# (default = %default)")
     pParser.add_option("-c", "--pcoords", action="store_true",  dest='printCoords', help="Print values of coordinate variables on screen (default = %default)")
     pParser.add_option("-d", "--doc", action="store_true",  dest='isDoc', help="Give more information by printing docstrings (default = %default)")
+    pParser.add_option("-e", "--pertime", action="store_true",  dest='statsPerTime', help="Operation 'stats': calculate statistics also for each time value (default = %default)")
     pParser.add_option("-f", "--filecheck", action = 'store', dest='checkNetCdf', choices = ['','cf','default','station','cf+default','cf+default+station'], nargs = 1, help="Check a NetCDF file if it is conform to on or more defined conventions (default = %default)")
+    pParser.add_option('-g', '--overviews', action = 'store', type ='string', dest='gridOverviews', nargs = 1, help="Utility operation to save coarsened grids for the factors 'arg1,..' (e.g. '2,4,8') as NetCDF files")# (default = %default)")
     pParser.add_option('-i', '--iterations', action = 'store', type ='int', dest='nIterations', nargs = 1, help="Number of iterations to employ operation (default = %default)")
+    pParser.add_option('-j', '--json', action = 'store', type ='string', dest='jsonReport', nargs = 1, help="Operation 'checkAll' / 'stats': save check results per file or statistics per variable to this JSON file (default = %default)")
+    pParser.add_option("-k", "--flags", action="store_true",  dest='boolAsFlags', help="Utility option [-b]: save one categorical variable with CF attributes 'flag_values' and 'flag_meanings' instead of one boolean variable per value (default = %default)")
     pParser.add_option('-l', '--log', action = 'store', dest='logLevel', choices = ['debug','info','warning','error','critical'], nargs = 1, help="Minimum level for printing information to the console (default = %default)")
     pParser.add_option("-m", "--pmeta", action="store_true",  dest='printMeta', help="Print NCML Metadata of data model on screen (default = %default)")
     pParser.add_option('-p', '--path', action = 'store', type ='string', dest='dataPath', nargs = 1, help="Directory for input / output files (default = %default)")
+    pParser.add_option("-q", "--quality", action="store_true",  dest='checkValues', help="Check data values chunk by chunk: valid range, type overflow, monotonic coordinates, _FillValue and NaN counts (default = %default)")
+    pParser.add_option("-r", "--recheck", action="store_true",  dest='forceCheck', help="Check NetCDF files again even if a cached check result exists (default = %default)")
+    pParser.add_option('-s', '--resample', action = 'store', type ='string', dest='resampleFreq', nargs = 1, help="Utility operation to aggregate data variables along the time axis to frequency 'arg', e.g. 'D', '6H', '1M' or 'Y'")# (default = %default)")
+    pParser.add_option("-t", "--classtable", action="store_true",  dest='classTable', help="Utility option [-b]: save lookup table of the boolean variables and their values as CSV file (default = %default)")
+    pParser.add_option("-u", "--actualrange", action="store_true",  dest='storeActualRange', help="Operation 'stats': save minimum and maximum as attribute 'actual_range' in NCML or NetCDF file (default = %default)")
     pParser.add_option("-v", "--pvars", action="store_true",  dest='printVars', help="Print values of data variables on screen (default = %default)")
+    pParser.add_option('-x', '--decodeflag', action = 'store', type ='string', dest='decodeFlag', nargs = 1, help="Utility operation to decode flag meaning 'arg' of categorical variables (see option [-k]) to a boolean variable")# (default = %default)")
+    pParser.add_option('-w', '--workers', action = 'store', type ='int', dest='nWorkers', nargs = 1, help="Operation 'checkAll': number of worker processes, '0' for number of CPUs (default = %default)")
 
     (options, args) = pParser.parse_args()
 
@@ -425,6 +523,12 @@ def main():
                 pInterfaceMain.netCdf2DataModel(infileName)
                 pInterfaceMain.dataModel2DataModel(infileName)
 
+            elif operation_ == 'checkAll':
+                pInterfaceMain.checkAll(infileName)
+
+            elif operation_ == 'stats':
+                pInterfaceMain.statistics(infileName)
+
             elif operation_ == 'utilities':
                 pInterfaceMain.utilities(infileName)
 
@@ -11,11 +11,13 @@ the class 'ControlModel' of the module 'interface_Control'
 __author__= "Nicolai Holzer"
 __author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 __date__ ="2011-04-15"
-__version__ = "v0.1.3"
+__version__ = "v0.1.5"
 
 
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-05-18: v0.1.5 grid data is memory mapped
+#2011-05-13: v0.1.4 numeric list attributes written with declared type, attribute values no longer parsed as octal / hex
 #2001-04-15: v0.1.3 little changes for new data conversions
 #2011-01-05: v0.1.2 logging implemented
 #2010-11-23: v0.1.1 comments and docstrings added
@@ -674,7 +676,7 @@ class ModelDataGridRead(ModelDataRead):
         """
 
         numpyFileName = infile_+FILENAME_SUFFIX_NUMPYDATA
-        self.pNumpy = numpy.load(str(numpyFileName)) 
+        self.pNumpy = numpy.load(str(numpyFileName), mmap_mode='r') #Data is read on demand
 
         ModelDataRead.__init__(self, infile_) #call superclass
 
@@ -888,11 +890,16 @@ class ModelNetCdfRead:
         return pAttrList
 
 
-    def readVariables(self):
+    def readVariables(self, isLazy_=False):
         """
         Reading variables and associated local attributes of NetCDF file and saving
         them to internal model
 
+        INPUT_PARAMETERS:
+        isLazy      - attach the NetCDF variables of more than one dimension instead of their
+                      data (bool). Their values are only read when slicing the data, so this
+                      instance must not be deleted as long as the data is used
+
         IMPORTANT:
         Activate function '.__correctVariableInputData' for manual bug fix of 'issue 34'
         (slicing MFDataset variables with dimensions of length 1) if API NetCDF4 is older then version 0.9
@@ -920,8 +927,11 @@ class ModelNetCdfRead:
             varNumpyShape = pMFNetCdfVariable.shape
             numpyVarType = self.pProcessingTool.dataType_2Numpy(varType)# convert to numpy dtype
 
-            pVarDataNumpy = numpy.empty(varNumpyShape, dtype = numpyVarType)
-            pVarDataNumpy = pMFNetCdfVariable [:]
+            if isLazy_ and len(pMFNetCdfVariable.dimensions) > 1: #Data variables are read on demand by slicing
+                pVarDataNumpy = pMFNetCdfVariable
+            else:
+                pVarDataNumpy = numpy.empty(varNumpyShape, dtype = numpyVarType)
+                pVarDataNumpy = pMFNetCdfVariable [:]
 
 #!!!Activate manual bug fix for issue 34 if API Netcdf4 older as version 0.9
             #pVarDataNumpy = self.__correctVariableInputData(pVarDataNumpy, varNumpyShape, varName)
@@ -1301,11 +1311,12 @@ class ModelDataWrite:
                         raise Exception("Error in writing Numpy Data. Data Variables have different shapes.")
                     if pVarDataNumpy.dtype != pVarDataNumpyComp.dtype:
                         raise Exception("Error in writing Numpy Data. Data Variables have different types.")
-                pVarDataNumpyComp = numpy.copy(pVarDataNumpy)
+                pVarDataNumpyComp = pVarDataNumpy #Only shape and type are compared
                 varNumpyNr = varNumpyNr+1
 
-        #Output numpy array in the form [time height latitude longitude]
-        pNumpyData = numpy.empty([varNumpyNr, pVarDataNumpy.shape[0], pVarDataNumpy.shape[1], pVarDataNumpy.shape[2], pVarDataNumpy.shape[3]], dtype = pVarDataNumpy.dtype)
+        #Output numpy array in the form [time height latitude longitude], memory mapped file
+        pNumpyData = numpy.lib.format.open_memmap(str(self.numpyFileName), mode = 'w+', dtype = pVarDataNumpy.dtype, \
+            shape = (varNumpyNr, pVarDataNumpy.shape[0], pVarDataNumpy.shape[1], pVarDataNumpy.shape[2], pVarDataNumpy.shape[3]))
 
         #!!! If height coordinate is missing use following commands below, and desactivate error message
         #pNumpyData = numpy.empty([varNumpyNr, pVarDataNumpy.shape[0], 1, pVarDataNumpy.shape[1], pVarDataNumpy.shape[2]], dtype = pVarDataNumpy.dtype)
@@ -1316,12 +1327,15 @@ class ModelDataWrite:
         varNumpyNr = 0
         for pVar in pVarList[:]:
             if pVar.getName() not in COORD_KEYWORDS: #all data variables must be of shape (time, z, lat, lon)
-                pNumpyData[varNumpyNr,:,:,:,:] = pVar.getData()
+                pVarDataNumpy = pVar.getData()
+                for i_time in xrange(0, pVarDataNumpy.shape[0]): #Time step by time step, data may be memory mapped or lazy
+                    pNumpyData[varNumpyNr,i_time,:,:,:] = pVarDataNumpy[i_time]
                 #pNumpyData[varNumpyNr,:,0,:,:] = pVar.getData() #If height coordinate is missing
 
                 varNumpyNr = varNumpyNr+1
 
-        numpy.save(self.numpyFileName, pNumpyData)
+        pNumpyData.flush()
+        del pNumpyData #Close memory map
 
         return
 
@@ -1484,14 +1498,7 @@ class ModelNetCdfWrite:
                         for elementList in attrValueListInput: #Convert all elements in input list
                             #Test if attribute is numeric, what is considered if attribute 'type' is set
                             if attrType in ALL_INTS: #Attribute type is integer
-                                if attrType in BYTE:
-                                    attrValue = int(elementList,8)
-                                elif attrType in SHORT:
-                                    attrValue = int(elementList,16)
-                                elif attrType in INTEGER:
-                                    attrValue = int(elementList,32)
-                                else:
-                                    attrValue = int(elementList)
+                                attrValue = int(elementList)
                             elif attrType in ALL_FLOATS: #Attribute type is float
                                 attrValue = float(elementList)
 
@@ -1500,6 +1507,10 @@ class ModelNetCdfWrite:
                                 attrValue = str(elementList)
 
                             attrValueList.append(attrValue)
+
+                        #Numeric lists are written with the declared type, e.g. 'flag_values' of type byte
+                        if (attrType in ALL_INTS or attrType in ALL_FLOATS) and not attrType in U_BYTE: #no numpy conversion for 'ubyte'
+                            attrValueList = numpy.array(attrValueList, dtype = self.pProcessingTool.dataType_2Numpy(attrType))
                           
                         self.pLogger.debug("Write listed local attribute from variable '" + str(pVar.getName()) + "' to NetCDF: Name: '" + str(attrName) + \
                         "'; Value: '" + str(attrValueList) + "'; Type: '" + str(attrType) + "' (" + str(type(attrValue)) + "); Separator: '" + str(attrSeparator) + "')")
@@ -1511,14 +1522,7 @@ class ModelNetCdfWrite:
                     else:
                         #Test if attribute is numeric, what is considered if attribute 'type' is set
                         if attrType in ALL_INTS: #Attribute type is integer
-                            if attrType in BYTE:
-                                attrValue = int(pVarAttr.getValue(),8)
-                            elif attrType in SHORT:
-                                attrValue = int(pVarAttr.getValue(),16)
-                            elif attrType in INTEGER:
-                                attrValue = int(pVarAttr.getValue(),32)
-                            else:
-                                attrValue = int(pVarAttr.getValue())
+                            attrValue = int(pVarAttr.getValue())
                         elif attrType in ALL_FLOATS: #Attribute type is float
                             attrValue = float(pVarAttr.getValue())
 
@@ -12,11 +12,18 @@ the class 'ControlModel' of the module 'interface_Control'
 __author__= "Nicolai Holzer"
 __author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 __date__ ="2011-03-28"
-__version__ = "v0.1.2"
+__version__ = "v0.1.9"
 
 
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-05-20: v0.1.9 streaming statistics and histograms of data variables added
+#2011-05-19: v0.1.8 spatial coarsening of grids to overview levels added
+#2011-05-18: v0.1.7 streaming temporal resampling of data variables added
+#2011-05-13: v0.1.6 variable can be changed to single categorical variable with CF flag attributes
+#2011-05-12: v0.1.5 vectorized and chunked conversion of variables to booleans
+#2011-05-10: v0.1.4 cache for results of NetCDF file checks added
+#2011-05-06: v0.1.3 chunked check of data values added
 #2011-01-14: v0.1.2 logging implemented, functionalities changed
 #2010-11-23: v0.1.1 comments and docstrings added
 #2010-10-08: v0.1.0 first version
@@ -25,19 +32,51 @@ __version__ = "v0.1.2"
 #Imported libraries
 #-------------------------------------------------------------------------------
 #standard libraries
+import os
+import sys
+import re
+import csv
 import logging
+import hashlib
+from StringIO import StringIO
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 #related libraries
 import numpy
+from netCDF4 import Dataset
 
 #local applications / library specific import
+from interface_Data import *
 from interface_Settings import *
 from interface_ProcessingTools import *
 from etc.progressBar import * #needs empty '__init__.py' file in directory
-from etc.cfchecks import startCfChecksFromInterface #needs empty '__init__.py' file in directory
+from etc.cfchecks import startCfChecksFromInterface, preloadCfTables, getCfCheckerVersions, getFileDigest #needs empty '__init__.py' file in directory
 
 #===============================================================================
 
+#Module constants
+#-------------------------------------------------------------------------------
+DATA_CHECK_CHUNK_ELEMENTS = 4194304 #Maximum number of values read at once when checking data values
+BOOL_CHUNK_ELEMENTS = 4194304 #Maximum number of output values created at once when changing a variable to booleans
+
+FILENAME_SUFFIX_CLASSTABLE = '__classes.csv' #Lookup table of boolean variables and their values
+
+RESAMPLE_CHUNK_ELEMENTS = 4194304 #Maximum number of values read at once when resampling data variables
+RESAMPLE_METHODS = {'mean': 'mean', 'min': 'minimum', 'max': 'maximum', 'sum': 'sum'} #Aggregation method and CF cell method
+RESAMPLE_FREQUENCY_SECONDS = {'H': 3600.0, 'D': 86400.0} #Frequencies of fixed length, months 'M' and years 'Y' by calendar
+
+COARSEN_CHUNK_ELEMENTS = 4194304 #Maximum number of values read at once when coarsening grids
+COARSEN_METHODS = {'mean': 'mean', 'min': 'minimum', 'max': 'maximum', 'sum': 'sum', 'mode': 'mode'} #Block method and CF cell method
+
+STATS_CHUNK_ELEMENTS = 4194304 #Maximum number of values read at once when calculating statistics
+STATS_HISTOGRAM_BINS = 20 #Number of histogram bins between minimum and maximum
+STATS_QUANTILE_SUBBINS = 64 #Number of sub-bins per histogram bin for approximate quantiles
+STATS_QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+
 
 
 class ModelCheckNetCdf:
@@ -71,6 +110,61 @@ class ModelCheckNetCdf:
         #"""Destructor"""
 
 
+    def runCheck(self, checkName_, pCheckCache_=None, forceCheck_=False, printOutput_=True):
+        """
+        Run check 'checkName' and return its result, use cached result if possible.
+
+        INPUT_PARAMETERS:
+        checkName       - 'cf', 'default' or 'station' (string)
+        CheckCache      - optional: instance of class 'ModelCheckCache' for cached results
+        forceCheck      - run check also if a cached result exists (boolean)
+        printOutput     - print screen output of the CF checker (boolean)
+
+        RETURN_VALUE:
+        Dictionary with the keys 'result' (return value of the check function), 'messages' (list
+        of error and warning messages) and 'cached' (True if result was taken from cache)
+        """
+
+        if pCheckCache_ is not None and not forceCheck_:
+            pCheckResult = pCheckCache_.getResult(self.netCdfName, checkName_)
+            if pCheckResult is not None:
+                pCheckResult['cached'] = True
+                return pCheckResult
+
+        pMessageHandler = MessageListHandler()
+        pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT)
+        pLogger.addHandler(pMessageHandler)
+
+        try:
+            if checkName_ == 'cf': #Screen output of CFChecker is captured
+                pStdout = sys.stdout
+                sys.stdout = StringIO()
+                try:
+                    result = self.checkCf()
+                finally:
+                    cfOutput = sys.stdout.getvalue()
+                    sys.stdout = pStdout
+                    if printOutput_:
+                        sys.stdout.write(cfOutput)
+                pMessageList = [line.strip() for line in cfOutput.splitlines() if line.startswith('ERROR') or line.startswith('WARNING')]
+            elif checkName_ == 'default':
+                result = self.checkDefaultSettings()
+                pMessageList = pMessageHandler.pMessageList
+            elif checkName_ == 'station':
+                result = self.checkStation()
+                pMessageList = pMessageHandler.pMessageList
+            else:
+                raise Exception("Error: Check '" + str(checkName_) + "' is unknown. Valid checks are 'cf', 'default' and 'station'.")
+        finally:
+            pLogger.removeHandler(pMessageHandler)
+
+        pCheckResult = {'result': result, 'messages': pMessageList, 'cached': False}
+        if pCheckCache_ is not None:
+            pCheckCache_.putResult(self.netCdfName, checkName_, pCheckResult)
+
+        return pCheckResult
+
+
     def checkCf(self):
         """
         Check if a NetCDF file is conform to the CF Convention.
@@ -78,10 +172,13 @@ class ModelCheckNetCdf:
         Use of Program 'cfchecker 2.0.2' written by Rosalyn Hatcher (Met Office, UK)
         that was adapted with different settings and the function 'startCfChecksFromInterface'
         so that it can be started from this interface.
+
+        The checker reads the file metadata through a netCDF4 handle and uses the data arrays of
+        the internal data model for value checks, so that data is not read a second time.
         """
 
         #'cfchecker'-program is in directory '/etc', but is startet from interface with its path
-        return startCfChecksFromInterface(self.netCdfName) #start cfchecks program
+        return startCfChecksFromInterface(self.netCdfName, self.pVarList) #start cfchecks program
 
 
     def checkDefaultSettings(self):
@@ -433,6 +530,362 @@ class ModelCheckNetCdf:
         
 
 
+#_______________________________________________________________________________
+
+class ModelCheckCache:
+    """
+    Class for caching results of NetCDF file checks.
+
+    A result is stored in a separate file in the cache directory. Its key is composed of the
+    md5 digest of the NetCDF file content, the name of the check and the versions of the checker,
+    of the CF convention and of the standard name and area type tables (and of the default settings
+    file for check 'default'). Results are evicted least recently used if more than 'maxEntries'
+    results are stored.
+    """
+
+
+    def __init__(self, cacheDirectory_=CHECK_CACHE_DIRECTORY, maxEntries_=CHECK_CACHE_MAX_ENTRIES):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        cacheDirectory  - directory of cached results, is created if not existing (string)
+        maxEntries      - maximum number of cached results (integer)
+        """
+
+        self.cacheDirectory = str(cacheDirectory_)
+        self.maxEntries = int(maxEntries_)
+        self.pDigestDict = dict() #File digests computed by this instance, key: (file name, mtime, size)
+        self.pVersionList = None #Versions of checker and tables, read on first use
+
+        self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+
+
+    #def __del__ (self):
+        #"""Destructor"""
+
+
+    def getResult(self, netCdfName_, checkName_):
+        """Return cached result dictionary of check 'checkName' for file 'netCdfName', or None if no
+        result is cached"""
+
+        cacheFileName = self.__getCacheFileName(netCdfName_, checkName_)
+        if not os.path.exists(cacheFileName):
+            return None
+
+        try:
+            pCacheFile = open(cacheFileName, 'rb')
+            try:
+                pCheckResult = pickle.load(pCacheFile)
+            finally:
+                pCacheFile.close()
+            os.utime(cacheFileName, None) #Mark as recently used
+        except Exception: #Corrupt or removed cache file
+            self.pLogger.debug("Cached check result '" + str(cacheFileName) + "' could not be read.")
+            return None
+
+        self.pLogger.debug("Use cached result of check '" + str(checkName_) + "' for file '" + str(netCdfName_) + "'.")
+        return pCheckResult
+
+
+    def putResult(self, netCdfName_, checkName_, pCheckResult_):
+        """Save result dictionary 'pCheckResult' of check 'checkName' for file 'netCdfName' to cache"""
+
+        if not os.path.isdir(self.cacheDirectory):
+            try:
+                os.makedirs(self.cacheDirectory)
+            except OSError: #Created by other process in the meantime or not allowed
+                if not os.path.isdir(self.cacheDirectory):
+                    self.pLogger.warning("Cache directory '" + str(self.cacheDirectory) + "' could not be created. Check result is not cached.")
+                    return
+
+        #Write to temporary file first, so that other processes never read incomplete results
+        cacheFileName = self.__getCacheFileName(netCdfName_, checkName_)
+        tmpFileName = cacheFileName + '.' + str(os.getpid()) + '.tmp'
+        pCacheFile = open(tmpFileName, 'wb')
+        try:
+            pickle.dump(pCheckResult_, pCacheFile, pickle.HIGHEST_PROTOCOL)
+        finally:
+            pCacheFile.close()
+        os.rename(tmpFileName, cacheFileName)
+
+        self.__evictResults()
+        return
+
+
+    def __getCacheFileName(self, netCdfName_, checkName_):
+        """Private function returning the cache file name of the key of a check result"""
+
+        if self.pVersionList is None:
+            self.pVersionList = getCfCheckerVersions() + [__version__]
+
+        pStat = os.stat(netCdfName_)
+        digestKey = (os.path.abspath(netCdfName_), pStat.st_mtime, pStat.st_size)
+        if not self.pDigestDict.has_key(digestKey):
+            self.pDigestDict[digestKey] = getFileDigest(netCdfName_)
+
+        pKeyList = [self.pDigestDict[digestKey], str(checkName_)] + self.pVersionList
+        if checkName_ == 'default': #Result depends also on default settings
+            pKeyList.append(getFileDigest(FILENAME_DEFAULT_SETTINGS_XML))
+
+        return os.path.join(self.cacheDirectory, hashlib.md5('|'.join(pKeyList)).hexdigest() + '.pickle')
+
+
+    def __evictResults(self):
+        """Private function removing least recently used results if more than 'maxEntries' results are cached"""
+
+        pFileList = [os.path.join(self.cacheDirectory, fileName) for fileName in os.listdir(self.cacheDirectory) if fileName.endswith('.pickle')]
+        if len(pFileList) <= self.maxEntries:
+            return
+
+        pTimeList = list()
+        for fileName in pFileList:
+            try:
+                pTimeList.append((os.path.getmtime(fileName), fileName))
+            except OSError: #Removed by other process
+                pass
+        pTimeList.sort()
+
+        for (mtime, fileName) in pTimeList[:len(pTimeList) - self.maxEntries]:
+            try:
+                os.remove(fileName)
+            except OSError:
+                pass
+
+        self.pLogger.debug("Removed '" + str(max(0, len(pTimeList) - self.maxEntries)) + "' least recently used check results from cache.")
+        return
+
+
+#-------------------------------------------------------------------------------
+
+class MessageListHandler(logging.Handler):
+    """Logging handler collecting formatted messages in a list"""
+
+    def __init__(self, level_=logging.WARNING):
+        logging.Handler.__init__(self, level_)
+        self.pMessageList = list()
+
+    def emit(self, record_):
+        self.pMessageList.append(str(record_.levelname) + ": " + str(record_.getMessage()))
+
+
+#_______________________________________________________________________________
+
+class ModelCheckDataValues:
+    """Class with functions to check the data values of the variables of the internal data model"""
+
+
+    def __init__(self, pVarList_, chunkElements_=DATA_CHECK_CHUNK_ELEMENTS):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        VarList         - variable list of the internal data model. The attached data can be numpy
+                          arrays, memory mapped numpy arrays or lazy NetCDF variables
+        chunkElements   - maximum number of values that are read and checked at once (integer)
+        """
+
+        self.pVarList = pVarList_
+        self.chunkElements = int(chunkElements_)
+
+        self.pProcessingTool = ProcessingTool()
+        self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+
+
+    #def __del__ (self):
+        #"""Destructor"""
+
+
+    def checkDataValues(self):
+        """
+        Check the data values of all variables of the internal data model.
+
+        RETURN_VALUE:
+        Tuple (dataOk, pSummaryDict): dataOk is False if one or more errors were found;
+        pSummaryDict contains a summary dictionary for each variable name as returned by
+        the function 'checkVariableValues'
+
+        COMMENTS:
+        Errors are values outside of 'valid_min', 'valid_max' or 'valid_range', values that
+        overflow the declared (packed) variable type and coordinate variables that are not
+        strictly monotonic. The number of _FillValue and NaN values is only reported.
+        """
+
+        dataOk = True
+        pSummaryDict = dict()
+
+        for pVar in self.pVarList[:]:
+            try:
+                pData = pVar.getData()
+            except AttributeError: #No data attached to variable
+                self.pLogger.warning("No data attached to variable '" + str(pVar.getName()) + "'. Data values are not checked.")
+                continue
+
+            pSummary = self.checkVariableValues(pVar, pData)
+            pSummaryDict[pVar.getName()] = pSummary
+
+            self.pLogger.info("Data values of variable '" + str(pVar.getName()) + "': '" + str(pSummary['values']) + "' values, '" + \
+                str(pSummary['fill']) + "' _FillValue, '" + str(pSummary['nan']) + "' NaN, '" + str(pSummary['belowValidMin']) + \
+                "' below valid minimum, '" + str(pSummary['aboveValidMax']) + "' above valid maximum, '" + str(pSummary['packedOverflow']) + \
+                "' overflow of type '" + str(pVar.getType()) + "'.")
+
+            if pSummary['belowValidMin'] > 0 or pSummary['aboveValidMax'] > 0:
+                self.pLogger.error("Variable '" + str(pVar.getName()) + "' has '" + str(pSummary['belowValidMin'] + pSummary['aboveValidMax']) + \
+                "' values outside of the valid range '" + str(pSummary['validRange']) + "'.")
+                dataOk = False
+            if pSummary['packedOverflow'] > 0:
+                self.pLogger.error("Variable '" + str(pVar.getName()) + "' has '" + str(pSummary['packedOverflow']) + \
+                "' values that can not be represented by the declared type '" + str(pVar.getType()) + "'.")
+                dataOk = False
+            if pSummary['monotonic'] is False:
+                self.pLogger.error("Coordinate variable '" + str(pVar.getName()) + "' is not strictly monotonic.")
+                dataOk = False
+            if pSummary['nan'] > 0:
+                self.pLogger.warning("Variable '" + str(pVar.getName()) + "' has '" + str(pSummary['nan']) + "' NaN values that are not declared as _FillValue.")
+
+        return (dataOk, pSummaryDict)
+
+
+    def checkVariableValues(self, pVar_, pData_):
+        """
+        Check data values 'pData' of variable 'pVar' chunk by chunk along the first axis, so
+        that memory use does not depend on the size of the variable.
+
+        RETURN_VALUE:
+        Dictionary with the keys 'values', 'fill', 'nan', 'belowValidMin', 'aboveValidMax',
+        'packedOverflow' (number of values), 'validRange' (list [min, max], None if not limited)
+        and 'monotonic' (boolean for coordinate variables, None for data variables)
+        """
+
+        #Get attributes that define valid values
+        #-------------------------------------------------------------------------------
+        fillValue = self.__getAttributeValues(pVar_, '_FillValue')
+        if fillValue is None:
+            fillValue = self.__getAttributeValues(pVar_, 'missing_value')
+        validRange = self.__getAttributeValues(pVar_, 'valid_range')
+        validMin = self.__getAttributeValues(pVar_, 'valid_min')
+        validMax = self.__getAttributeValues(pVar_, 'valid_max')
+        scaleFactor = self.__getAttributeValues(pVar_, 'scale_factor')
+        addOffset = self.__getAttributeValues(pVar_, 'add_offset')
+
+        if validRange is not None and len(validRange) == 2:
+            validMin = validRange[0:1]
+            validMax = validRange[1:2]
+        if validMin is not None:
+            validMin = validMin[0]
+        if validMax is not None:
+            validMax = validMax[0]
+
+        #Packed target: declared integer type different from type of the data array
+        pTargetInfo = None
+        try:
+            pTargetType = self.pProcessingTool.dataType_2Numpy(pVar_.getType())
+        except Exception: #e.g. char variables
+            pTargetType = None
+        if pTargetType is not None and pTargetType.kind in 'iu' and pTargetType != pData_.dtype:
+            pTargetInfo = numpy.iinfo(pTargetType)
+        if scaleFactor is None:
+            scaleFactor = [1.0]
+        if addOffset is None:
+            addOffset = [0.0]
+
+        isCoordinate = pVar_.getName() in COORD_KEYWORDS and pVar_.getName() not in ID and len(pData_.shape) == 1
+        isFloat = pData_.dtype.kind == 'f'
+
+        pSummary = {'values': 0, 'fill': 0, 'nan': 0, 'belowValidMin': 0, 'aboveValidMax': 0, 'packedOverflow': 0, \
+            'validRange': [validMin, validMax], 'monotonic': None}
+
+
+        #Check values chunk by chunk
+        #-------------------------------------------------------------------------------
+        if len(pData_.shape) == 0:
+            nRows = 1
+            rowsPerChunk = 1
+        else:
+            nRows = pData_.shape[0]
+            rowElements = 1
+            for dim in pData_.shape[1:]:
+                rowElements = rowElements * int(dim)
+            rowsPerChunk = max(1, self.chunkElements // max(1, rowElements))
+
+        lastValue = None #Last value of previous chunk for monotonic check
+        isIncreasing = True
+        isDecreasing = True
+
+        for rowStart in xrange(0, nRows, rowsPerChunk):
+            if len(pData_.shape) == 0:
+                pChunk = numpy.ma.asarray(pData_[...]).ravel()
+            else:
+                pChunk = numpy.ma.asarray(pData_[rowStart:rowStart+rowsPerChunk]).ravel()
+
+            pInvalid = numpy.ma.getmaskarray(pChunk).copy() #Masked by lazy NetCDF variable
+            pChunk = numpy.ma.getdata(pChunk)
+            pSummary['values'] = pSummary['values'] + pChunk.size
+
+            if fillValue is not None:
+                pInvalid |= (pChunk == pChunk.dtype.type(fillValue[0]))
+            pSummary['fill'] = pSummary['fill'] + int(pInvalid.sum())
+
+            if isFloat:
+                pIsNan = numpy.isnan(pChunk)
+                pIsNan &= ~pInvalid
+                pSummary['nan'] = pSummary['nan'] + int(pIsNan.sum())
+                pInvalid |= pIsNan
+
+            if isCoordinate: #float64, so that differences of unsigned integers do not wrap around
+                pCoord = pChunk.astype(numpy.float64)
+                if lastValue is not None:
+                    pDiff = numpy.diff(numpy.concatenate(([lastValue], pCoord)))
+                else:
+                    pDiff = numpy.diff(pCoord)
+                if pDiff.size > 0:
+                    isIncreasing = isIncreasing and bool((pDiff > 0).all())
+                    isDecreasing = isDecreasing and bool((pDiff < 0).all())
+                if pCoord.size > 0:
+                    lastValue = pCoord[-1]
+
+            pValid = pChunk[~pInvalid]
+            if pValid.size == 0:
+                continue
+
+            if validMin is not None:
+                pSummary['belowValidMin'] = pSummary['belowValidMin'] + int((pValid < validMin).sum())
+            if validMax is not None:
+                pSummary['aboveValidMax'] = pSummary['aboveValidMax'] + int((pValid > validMax).sum())
+
+            if pTargetInfo is not None:
+                pPacked = (pValid.astype(numpy.float64) - addOffset[0]) / scaleFactor[0]
+                if isFloat or scaleFactor[0] != 1.0 or addOffset[0] != 0.0:
+                    pPacked = numpy.round(pPacked)
+                pSummary['packedOverflow'] = pSummary['packedOverflow'] + \
+                    int((pPacked < pTargetInfo.min).sum()) + int((pPacked > pTargetInfo.max).sum())
+
+        if isCoordinate:
+            pSummary['monotonic'] = isIncreasing or isDecreasing
+
+        return pSummary
+
+
+    def __getAttributeValues(self, pVar_, attrName_):
+        """Private function returning the numeric values of local attribute 'attrName' of
+        variable 'pVar' as list of floats, or None if the attribute is not set or not numeric"""
+
+        for pVarAttr in pVar_.getAttributes():
+            if pVarAttr.getName() == attrName_:
+                separator = pVarAttr.getSeparator()
+                try:
+                    if separator != '':
+                        pValueList = self.pProcessingTool.string2List(pVarAttr.getValue(), separator)
+                    else:
+                        pValueList = str(pVarAttr.getValue()).replace(',', ' ').split()
+                    return [float(value) for value in pValueList]
+                except ValueError:
+                    self.pLogger.warning("Attribute '" + str(attrName_) + "' of variable '" + str(pVar_.getName()) + \
+                    "' with value '" + str(pVarAttr.getValue()) + "' is not numeric and is ignored for the data value check.")
+                    return None
+        return None
+
+
 #_______________________________________________________________________________
 
 class ModelData2Bool:
@@ -452,8 +905,10 @@ class ModelData2Bool:
         self.pDefaultSettings = DefaultSettings()
 
         self.numpyDataName = infile_+FILENAME_SUFFIX_NUMPYDATA
+        self.numpyDataTmpName = self.numpyDataName+'.tmp' #Output array, replaces input array when written
         self.ncmlName = infile_+FILENAME_SUFFIX_NCML
         #self.numpymetaName = infile_+FILENAME_SUFFIX_NUMPYXML
+        self.classTableName = infile_+FILENAME_SUFFIX_CLASSTABLE
 
         #Use Processing Tools
         self.pProcessingTool = ProcessingTool()
@@ -462,7 +917,9 @@ class ModelData2Bool:
 
         self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
 
-        self.pNumpyData = numpy.load(str(self.numpyDataName))
+        self.pNumpyData = numpy.load(str(self.numpyDataName), mmap_mode='r')
+        self.pClasses = None
+        self.isFlagVar = False #Output is single categorical variable, see function 'changeVar2FlagVar'
 
 
     #def __del__ (self):
@@ -479,6 +936,11 @@ class ModelData2Bool:
         position. Values in the list 'pBadValuesList' are excluded. The returning numpy
         array represents true/false values (or '1' and '0') in case that a value existed at this position.
         ! Numpy data type is 'Byte' instead of 'Bool' since the boolean data type does not exist for NetCDF !
+
+        COMMENTS:
+        The values (classes) are the distinct values of the chosen variable in ascending order.
+        Input and output arrays are memory mapped and converted in time chunks, the output
+        is written to a temporary file that replaces the input file in function 'writeNumpyData'.
         """
 
         #Get data and settings
@@ -490,45 +952,123 @@ class ModelData2Bool:
 
         dimVarIn = pInNumpy.shape[0] #Number of variables in array
 
-        #dimVarOut = Amount of values between maximum and minimum value expect bad values
-        dimVarOut = int(numpy.max(pInNumpy) - numpy.min(pInNumpy) + 1 - len(pBadValuesList_))
+        if varNr_ < 0 or varNr_ > dimVarIn-1: #If variable number is outside of dimension range
+            raise Exception("Error: Argument varNr (value '" + str(varNr_) +  "') is wrong. Argument varNr represents variable number of input data!")
+
+        pInVar = pInNumpy[varNr_] #(time, z, lat, lon)
 
         dimT = pInNumpy.shape[1] #Time Dimension
         dimZ = pInNumpy.shape[2] #Height Dimensions
         dimY = pInNumpy.shape[3] #Last but one axis top to bottom: lat -> row
         dimX = pInNumpy.shape[4] #Last axis left to right: lon -> col
+        timeElements = max(1, dimZ * dimY * dimX)
 
-        #Output data array
-        pNumpyConv = numpy.empty([dimVarOut, dimT, dimZ, dimY, dimX], dtype = numpy.int8)
+
+        #Get classes: distinct values of the chosen variable expect bad values
+        #-------------------------------------------------------------------------------
+        pClasses = self.__getClasses(pInVar, varNr_, pBadValuesList_)
+        dimVarOut = len(pClasses)
+
+        self.pLogger.info("Create '" + str(dimVarOut) + "' boolean variables for values '" + str(pClasses.tolist()) + "'.")
+
+
+        #Encode classes in time chunks into memory mapped output data array
+        #-------------------------------------------------------------------------------
+        pNumpyConv = numpy.lib.format.open_memmap(self.numpyDataTmpName, mode = 'w+', dtype = numpy.int8, \
+            shape = (dimVarOut, dimT, dimZ, dimY, dimX))
+        pClassNumbers = numpy.arange(dimVarOut).reshape(dimVarOut, 1, 1, 1, 1)
 
         #Define progress bar settings
         widgetsBar = ['Conversion status: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
                    ' ', ETA(), ' ', FileTransferSpeed()]
         progressBar = ProgressBar(widgets=widgetsBar, maxval=dimT).start()
 
+        timesPerChunk = max(1, BOOL_CHUNK_ELEMENTS // (timeElements * dimVarOut))
+        for i_time in xrange(0, dimT, timesPerChunk):
+            pChunk = numpy.asarray(pInVar[i_time:i_time+timesPerChunk])
+
+            #Class index for each value, '-1' for excluded values
+            pIndex = numpy.minimum(numpy.searchsorted(pClasses, pChunk), dimVarOut-1)
+            pIndex[pClasses[pIndex] != pChunk] = -1
+
+            pNumpyConv[:, i_time:i_time+timesPerChunk] = (pIndex[numpy.newaxis] == pClassNumbers)
+
+            progressBar.update(min(i_time+timesPerChunk, dimT))# Progress bar
+
+        pNumpyConv.flush()
+        self.pNumpyData = pNumpyConv
+        self.isFlagVar = False
+
+        return
+
+
+    def changeVar2FlagVar(self, varNr_, pBadValuesList_):
+        """
+        Change data to a single categorical variable
+
+        Compact alternative to function 'changeVar2BoolVars': Instead of one boolean variable per
+        value, the variable with number 'varNr' is changed to one variable containing the class number
+        of each value (value number in ascending order, '-1' for values of the list 'pBadValuesList').
+        The classes are described by the CF attributes 'flag_values' and 'flag_meanings' (see function
+        'writeMetadataNcml'), boolean variables can be decoded on demand by class 'ModelFlagDecoder'.
+        The numpy data type is 'Byte' for less then 128 classes, otherwise 'Short'.
+        """
 
         #Get data and settings
         #-------------------------------------------------------------------------------
+        self.pLogger.debug("Modify variable # '" + str(varNr_) +  "' to categorical numpy array by excluding the following values: '" + \
+        str(pBadValuesList_) + "'. Please wait...")
+
+        pInNumpy =  self.pNumpyData
+
+        dimVarIn = pInNumpy.shape[0] #Number of variables in array
+
         if varNr_ < 0 or varNr_ > dimVarIn-1: #If variable number is outside of dimension range
             raise Exception("Error: Argument varNr (value '" + str(varNr_) +  "') is wrong. Argument varNr represents variable number of input data!")
-            exit()
 
+        pInVar = pInNumpy[varNr_] #(time, z, lat, lon)
+
+        dimT = pInNumpy.shape[1] #Time Dimension
+        dimZ = pInNumpy.shape[2] #Height Dimensions
+        dimY = pInNumpy.shape[3] #Last but one axis top to bottom: lat -> row
+        dimX = pInNumpy.shape[4] #Last axis left to right: lon -> col
+        timeElements = max(1, dimZ * dimY * dimX)
+
+        pClasses = self.__getClasses(pInVar, varNr_, pBadValuesList_)
+        dimClasses = len(pClasses)
+        if dimClasses < 128:
+            pDataType = numpy.int8
         else:
-            for i_time in range (0, dimT, 1): #Go trough all times
-                dimVarOutNr = 0 #Running number for dimension variable of output numpy array
+            pDataType = numpy.int16
 
-                #For all values 'i_varOut' in between minimum and maximum of specifc data variable
-                for i_varOut in range (int(numpy.min(pInNumpy)), int(numpy.max(pInNumpy))+1, 1):#+1 to read also max value
-                    if not i_varOut in pBadValuesList_: #Ignore bad values
+        self.pLogger.info("Create categorical variable with '" + str(dimClasses) + "' classes for values '" + str(pClasses.tolist()) + "'.")
 
-                        #If value 'i_varOut' at specific position exists, then save true in output numpy, otherwise false
-                        pNumpyConv[dimVarOutNr, i_time, :,:,:] = numpy.where(pInNumpy[varNr_, i_time, :,:,:] == i_varOut, 1, 0)
-                        #pNumpyConv[dimVarOutNr, i_time, :,:,:] = numpy.where(pInNumpy[varNr_, i_time, :,:,:] == i_varOut, True, False)
-                        dimVarOutNr = dimVarOutNr + 1
 
-                progressBar.update(i_time+1)# Progress bar
-      
+        #Encode class numbers in time chunks into memory mapped output data array
+        #-------------------------------------------------------------------------------
+        pNumpyConv = numpy.lib.format.open_memmap(self.numpyDataTmpName, mode = 'w+', dtype = pDataType, \
+            shape = (1, dimT, dimZ, dimY, dimX))
+
+        #Define progress bar settings
+        widgetsBar = ['Conversion status: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
+                   ' ', ETA(), ' ', FileTransferSpeed()]
+        progressBar = ProgressBar(widgets=widgetsBar, maxval=dimT).start()
+
+        timesPerChunk = max(1, BOOL_CHUNK_ELEMENTS // timeElements)
+        for i_time in xrange(0, dimT, timesPerChunk):
+            pChunk = numpy.asarray(pInVar[i_time:i_time+timesPerChunk])
+
+            #Class index for each value, '-1' for excluded values
+            pIndex = numpy.minimum(numpy.searchsorted(pClasses, pChunk), dimClasses-1)
+            pIndex[pClasses[pIndex] != pChunk] = -1
+
+            pNumpyConv[0, i_time:i_time+timesPerChunk] = pIndex
+
+            progressBar.update(min(i_time+timesPerChunk, dimT))# Progress bar
+
+        pNumpyConv.flush()
         self.pNumpyData = pNumpyConv
+        self.isFlagVar = True
 
         return
 
@@ -537,10 +1077,51 @@ class ModelData2Bool:
         """Export numpy data array to file"""
        
         self.pLogger.debug("Numpy output will be file saved as '" + str(self.numpyDataName) + "'. Please wait...")
-        numpy.save(str(self.numpyDataName), self.pNumpyData) #Better as 'tofile'. Also possible: 'dump'
+        if isinstance(self.pNumpyData, numpy.memmap) and os.path.exists(self.numpyDataTmpName): #Already written by 'changeVar2BoolVars'
+            self.pNumpyData.flush()
+            os.rename(self.numpyDataTmpName, self.numpyDataName)
+        else:
+            numpy.save(str(self.numpyDataName), self.pNumpyData) #Better as 'tofile'. Also possible: 'dump'
         self.pLogger.debug("Done. Shape of resulting npy-file = '" + str(self.pNumpyData.shape) + "'; Data type: '" + str(self.pNumpyData.dtype) + "'.")
 
         return
+
+
+    def writeClassTable(self):
+        """Write lookup table of the output variables and their related input values (classes) as CSV
+        file. Function can be called after function 'changeVar2BoolVars' or 'changeVar2FlagVar' was executed"""
+
+        pClassFile = open(self.classTableName, 'wb')
+        try:
+            pWriter = csv.writer(pClassFile)
+            pWriter.writerow(['variable', 'value'])
+            for i_var in range(0, len(self.pClasses), 1):
+                pWriter.writerow(['variable #'+str(i_var), self.pClasses[i_var]])
+        finally:
+            pClassFile.close()
+
+        self.pLogger.info("Class lookup table saved as '" + str(self.classTableName) + "'.")
+        return
+
+
+    def __getClasses(self, pInVar_, varNr_, pBadValuesList_):
+        """Private function returning the distinct values of variable array 'pInVar' (read in time chunks)
+        in ascending order, expect values in list 'pBadValuesList' and NaN"""
+
+        dimT = pInVar_.shape[0]
+        timeElements = max(1, pInVar_[0].size)
+
+        timesPerChunk = max(1, BOOL_CHUNK_ELEMENTS // timeElements)
+        pClasses = numpy.array([], dtype = pInVar_.dtype)
+        for i_time in xrange(0, dimT, timesPerChunk):
+            pClasses = numpy.union1d(pClasses, numpy.unique(pInVar_[i_time:i_time+timesPerChunk]))
+
+        pClasses = numpy.array([value for value in pClasses if value == value and not value in pBadValuesList_], dtype = pInVar_.dtype) #value != value for NaN
+        if len(pClasses) == 0:
+            raise Exception("Error: Variable # '" + str(varNr_) + "' contains no values expect the excluded values '" + str(pBadValuesList_) + "'.")
+        self.pClasses = pClasses
+
+        return pClasses
     
 
     def writeMetadataNcml(self):
@@ -563,11 +1144,21 @@ class ModelData2Bool:
         self.pProcessNcml.fillNcmlMacroWithNumpy(pNumpyData)
 
         #Correct and complete entries
-        for i_var in range(0,dimVar,1): # otherwise returns list of ints from >= start and < end: 0 .. 10
-            varName = 'variable #'+str(i_var)
-            self.pProcessNcml.changeLocalAttribute(varName, '_FillValue', 'value', '0')
+        if self.isFlagVar: #Single categorical variable with CF flag attributes
+            varName = 'variable #0'
+            flagValues = ','.join([str(i_class) for i_class in range(0, len(self.pClasses), 1)])
+            flagMeanings = ' '.join(['value_' + str(value).replace('.', '_').replace('-', 'minus_') for value in self.pClasses.tolist()])
+            self.pProcessNcml.changeLocalAttribute(varName, '_FillValue', 'value', '-1')
+            self.pProcessNcml.addLocalAttribute(varName, 'flag_values', flagValues, str(pNumpyData.dtype), ',')
+            self.pProcessNcml.addLocalAttribute(varName, 'flag_meanings', flagMeanings, '', '')
+            progressBar.update(dimVar)# Progress bar
 
-            progressBar.update(i_var+1)# Progress bar
+        else:
+            for i_var in range(0,dimVar,1): # otherwise returns list of ints from >= start and < end: 0 .. 10
+                varName = 'variable #'+str(i_var)
+                self.pProcessNcml.changeLocalAttribute(varName, '_FillValue', 'value', '0')
+
+                progressBar.update(i_var+1)# Progress bar
 
         return
 
@@ -589,6 +1180,15 @@ class ModelData2Bool:
         #self.pProcessNcml.changeLocalAttribute(str(self.pDefaultSettings.axisHeightName), 'standard_name', 'value', '???')
         self.pProcessNcml.removeLocalAttribute(str(self.pDefaultSettings.axisHeightName), 'standard_name')
 
+        if self.isFlagVar: #Single categorical variable
+            self.pProcessNcml.changeVariable('variable #0', 'name', 'flood_occurrence')
+            self.pProcessNcml.changeLocalAttribute('flood_occurrence', 'units', 'value', '1')
+            self.pProcessNcml.changeLocalAttribute('flood_occurrence', 'long_name', 'value', 'flood occurrence class')
+            if len(self.pClasses) == 3: #Classes of the Waterwatch product, otherwise generic meanings remain
+                self.pProcessNcml.changeLocalAttribute('flood_occurrence', 'flag_meanings', 'value', 'nodata wet flooded')
+            self.pProcessNcml.removeLocalAttribute('flood_occurrence', 'standard_name')
+            return
+
 
         self.pProcessNcml.changeVariable('variable #0', 'name', 'nodata')
         self.pProcessNcml.changeLocalAttribute('nodata', 'units', 'value', '1')
@@ -611,4 +1211,959 @@ class ModelData2Bool:
         #self.pProcessNcml.changeLocalAttribute('flooded', 'standard_name', 'value', '')
         self.pProcessNcml.removeLocalAttribute('flooded', 'standard_name')
 
-        return
\ No newline at end of file
+        return
+
+#_______________________________________________________________________________
+
+class ModelFlagDecoder:
+    """This class is designed for decoding a categorical variable with the CF attributes
+    'flag_values' and 'flag_meanings' (see function 'changeVar2FlagVar' of class 'ModelData2Bool')
+    to boolean data on demand. Only the requested time steps of the data are read."""
+
+
+    def __init__(self, pVar_):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        Var             - variable of the internal data model with attributes 'flag_values' and
+                          'flag_meanings'. The attached data can be a numpy array or a memory mapped
+                          numpy array
+        """
+
+        self.pVar = pVar_
+
+        self.pProcessingTool = ProcessingTool()
+        self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+
+        self.pFlagDict = self.__getFlagDict()
+
+
+    #def __del__ (self):
+        #"""Destructor"""
+
+
+    def getFlagMeanings(self):
+        "Return list of flag meanings in the order of the flag values"
+        return sorted(self.pFlagDict.keys(), key = lambda meaning: self.pFlagDict[meaning])
+
+
+    def getBoolVar(self, meaning_, timeStart_=0, timeEnd_=None):
+        """
+        Return boolean data (numpy array of type 'int8') of the flag with meaning 'meaning' (string)
+        for the time steps 'timeStart' to 'timeEnd' (excluded, None for all time steps).
+        Values are '1' where the categorical variable equals the flag value, '-1' where it equals its
+        '_FillValue' (or is masked), otherwise '0'.
+        """
+
+        if not meaning_ in self.pFlagDict:
+            raise Exception("Error: Flag meaning '" + str(meaning_) + "' is not defined for variable '" + str(self.pVar.getName()) + \
+            "'. Defined flag meanings are '" + str(self.getFlagMeanings()) + "'.")
+
+        pData = self.pVar.getData()
+        pChunk = numpy.ma.asarray(pData[timeStart_:timeEnd_])
+
+        pBool = numpy.asarray(numpy.ma.getdata(pChunk) == self.pFlagDict[meaning_], dtype = numpy.int8)
+        pFill = numpy.ma.getmaskarray(pChunk) #Masked by lazy NetCDF variable
+        for pVarAttr in self.pVar.getAttributes():
+            if pVarAttr.getName() == '_FillValue': #Compared in data type of the data
+                pFill = pFill | (numpy.ma.getdata(pChunk) == self.pProcessingTool.castValue2DataType(pVarAttr.getValue(), pChunk.dtype))
+        pBool[pFill] = -1
+
+        return pBool
+
+
+    def decodeVariable(self, meaning_, outFileName_=None):
+        """
+        Return new boolean variable '<name>_<meaning>' of type 'byte' for the flag with meaning 'meaning'
+        (string), '_FillValue' is '-1'. The data is decoded in time chunks, so that a memory mapped
+        categorical variable is never loaded as a whole. If 'outFileName' (string) is given, the decoded
+        data is written into this memory mapped numpy file, otherwise it is held in memory.
+        """
+
+        pData = self.pVar.getData()
+        dimT = pData.shape[0]
+        timeElements = max(1, int(numpy.prod(pData.shape[1:])))
+        timesPerChunk = max(1, BOOL_CHUNK_ELEMENTS // timeElements)
+
+        if outFileName_ is None:
+            pDataOut = numpy.empty(pData.shape, dtype = numpy.int8)
+        else:
+            pDataOut = numpy.lib.format.open_memmap(str(outFileName_), mode = 'w+', dtype = numpy.int8, shape = tuple(pData.shape))
+        for i_time in xrange(0, dimT, timesPerChunk):
+            pDataOut[i_time:i_time+timesPerChunk] = self.getBoolVar(meaning_, i_time, i_time+timesPerChunk)
+        if outFileName_ is not None:
+            pDataOut.flush()
+
+        pVarOut = Variable(str(self.pVar.getName()) + '_' + str(meaning_), self.pVar.getShape(), BYTE[0])
+        for pVarAttr in self.pVar.getAttributes():
+            if pVarAttr.getName() in ['flag_values', 'flag_meanings', 'valid_min', 'valid_max', 'valid_range', 'actual_range', 'missing_value']:
+                continue
+            elif pVarAttr.getName() == '_FillValue':
+                pVarOut.addAttribute('_FillValue', BYTE[0], '-1', '')
+            elif pVarAttr.getName() == 'long_name':
+                pVarOut.addAttribute('long_name', pVarAttr.getType(), str(pVarAttr.getValue()) + ': ' + str(meaning_), pVarAttr.getSeparator())
+            else:
+                pVarOut.addAttribute(pVarAttr.getName(), pVarAttr.getType(), pVarAttr.getValue(), pVarAttr.getSeparator())
+        pVarOut.addData(pDataOut)
+
+        return pVarOut
+
+
+    def __getFlagDict(self):
+        """Private function returning dictionary of flag values (integers) by flag meaning (string)
+        out of the attributes 'flag_values' and 'flag_meanings' of the variable"""
+
+        flagValues = None
+        flagMeanings = None
+        for pVarAttr in self.pVar.getAttributes():
+            if pVarAttr.getName() == 'flag_values':
+                if pVarAttr.getSeparator() != '':
+                    flagValues = self.pProcessingTool.string2List(pVarAttr.getValue(), pVarAttr.getSeparator())
+                else:
+                    flagValues = str(pVarAttr.getValue()).replace(',', ' ').split()
+            elif pVarAttr.getName() == 'flag_meanings':
+                flagMeanings = str(pVarAttr.getValue()).split()
+
+        if flagValues is None or flagMeanings is None:
+            raise Exception("Error: Variable '" + str(self.pVar.getName()) + "' has no attributes 'flag_values' and 'flag_meanings'.")
+        if len(flagValues) != len(flagMeanings):
+            raise Exception("Error: Number of 'flag_values' '" + str(flagValues) + "' and 'flag_meanings' '" + str(flagMeanings) + \
+            "' of variable '" + str(self.pVar.getName()) + "' is different.")
+
+        return dict(zip(flagMeanings, [int(value) for value in flagValues]))
+
+
+#_______________________________________________________________________________
+
+class ModelResampleTime:
+    """This class is designed for aggregating the data variables of the internal data model
+    along the time axis to a lower frequency, e.g. half-hourly data to daily means. The data is
+    read in a single streaming pass, so that memory mapped numpy arrays and lazy NetCDF
+    variables are never loaded as a whole."""
+
+
+    def __init__(self, pDataList_, frequency_, method_, chunkElements_=RESAMPLE_CHUNK_ELEMENTS):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        DataList        - list of the internal data model [pDimList, pAttrList, pVarList] with attached data
+        frequency       - resampling frequency (string), a number of 'H' (hours), 'D' (days),
+                          'M' (months) or 'Y' (years), e.g. 'D', '6H' or '1M'
+        method          - aggregation method (string), one of 'mean', 'min', 'max' or 'sum'
+        chunkElements   - maximum number of values that are read at once (integer)
+        """
+
+        self.pDataList = pDataList_
+        self.chunkElements = int(chunkElements_)
+
+        pMatch = re.match(r'^\s*(\d*)\s*([HDMY])\s*$', str(frequency_).upper())
+        if pMatch is None:
+            raise Exception("Error: Resampling frequency '" + str(frequency_) + "' is not valid. Use a number of 'H' (hours), 'D' (days), 'M' (months) or 'Y' (years), e.g. 'D' or '6H'.")
+        if pMatch.group(1) == '':
+            self.frequencyCount = 1
+        else:
+            self.frequencyCount = int(pMatch.group(1))
+        self.frequencyUnit = pMatch.group(2)
+        if self.frequencyCount < 1:
+            raise Exception("Error: Resampling frequency '" + str(frequency_) + "' must be at least '1'.")
+        self.frequency = str(self.frequencyCount) + self.frequencyUnit
+
+        if not RESAMPLE_METHODS.has_key(method_):
+            raise Exception("Error: Resampling method '" + str(method_) + "' is not valid. Valid methods are '" + str(sorted(RESAMPLE_METHODS.keys())) + "'.")
+        self.method = method_
+
+        self.pProcessingTool = ProcessingTool()
+        self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+
+
+    #def __del__ (self):
+        #"""Destructor"""
+
+
+    def resampleTime(self):
+        """
+        Aggregate all data variables of the internal data model along the time axis.
+
+        RETURN_VALUE:
+        List of the new internal data model [pDimList, pAttrList, pVarList]: The time dimension and
+        the time coordinate variable contain one value per time interval (start of the interval),
+        the data variables contain the aggregated values. Attribute 'cell_methods' is added.
+
+        COMMENTS:
+        Values that are equal to the attribute '_FillValue' (or 'missing_value') and NaN values are
+        ignored. Intervals without any valid value are set to '_FillValue' (NaN if not defined).
+        Data of integer type is changed to 'double' for the methods 'mean' and 'sum'.
+        """
+
+        pDimList = self.pDataList[0]
+        pAttrList = self.pDataList[1]
+        pVarList = self.pDataList[2]
+
+        #Get time intervals
+        #-------------------------------------------------------------------------------
+        pTimeVar = None
+        for pVar in pVarList[:]:
+            if pVar.getName() in TIME:
+                pTimeVar = pVar
+        if pTimeVar is None:
+            raise Exception("Error: Data model has no time coordinate variable '" + str(TIME) + "'. Data can't be resampled.")
+
+        pTimeData = numpy.asarray(pTimeVar.getData()[:])
+        pTimes = pTimeData.astype(numpy.float64).ravel()
+        (pStarts, pEnds, pTimesOut) = self.__getTimeIntervals(pTimeVar, pTimes)
+
+        self.pLogger.info("Resample '" + str(len(pTimes)) + "' time values to '" + str(len(pTimesOut)) + "' intervals of '" + \
+        str(self.frequency) + "' by method '" + str(self.method) + "'.")
+
+
+        #Aggregate data variables, create new dimensions and variables
+        #-------------------------------------------------------------------------------
+        pDimListOut = list()
+        for pDim in pDimList[:]:
+            if pDim.getName() == pTimeVar.getShape().split()[0]: #Time dimension
+                pDimListOut.append(Dimension(pDim.getName(), len(pTimesOut), pDim.getIsUnlimited()))
+            else:
+                pDimListOut.append(pDim)
+
+        #Define progress bar settings
+        widgetsBar = ['Resampling status: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
+                   ' ', ETA(), ' ', FileTransferSpeed()]
+        progressBar = ProgressBar(widgets=widgetsBar, maxval=len(pVarList)).start()
+
+        pVarListOut = list()
+        for i_var in range(0, len(pVarList), 1):
+            pVar = pVarList[i_var]
+
+            if pVar is pTimeVar: #New variable, the input data model is not changed
+                pTimeVarOut = Variable(pVar.getName(), pVar.getShape(), pVar.getType())
+                for pVarAttr in pVar.getAttributes():
+                    pTimeVarOut.addAttribute(pVarAttr.getName(), pVarAttr.getType(), pVarAttr.getValue(), pVarAttr.getSeparator())
+                pTimeVarOut.addData(numpy.cast[pTimeData.dtype](pTimesOut))
+                pVarListOut.append(pTimeVarOut)
+            elif pVar.getName() in COORD_KEYWORDS: #Other coordinate variables are not changed
+                pVarListOut.append(pVar)
+            else:
+                pVarListOut.append(self.__resampleVariable(pVar, pStarts, pEnds))
+
+            progressBar.update(i_var+1)# Progress bar
+
+        return [pDimListOut, pAttrList, pVarListOut]
+
+
+    def __getTimeIntervals(self, pTimeVar_, pTimes_):
+        """Private function returning tuple (pStarts, pEnds, pTimesOut) of numpy arrays with the first
+        and last (excluded) time index of each interval and the start time of each interval in the
+        time units of the time coordinate variable"""
+
+        timeUnits = None
+        calendar = 'standard'
+        for pVarAttr in pTimeVar_.getAttributes():
+            if pVarAttr.getName() == 'units':
+                timeUnits = pVarAttr.getValue()
+            elif pVarAttr.getName() == 'calendar':
+                calendar = pVarAttr.getValue()
+        if timeUnits is None:
+            raise Exception("Error: Time coordinate variable '" + str(pTimeVar_.getName()) + "' has no attribute 'units'. Data can't be resampled.")
+
+        (timeUnit, unitSeconds, pReferenceTime) = self.pProcessingTool.parseTimeUnits(timeUnits)
+        pEpoch = datetime(1970, 1, 1)
+        pOffset = pReferenceTime - pEpoch
+        offsetSeconds = pOffset.days * 86400.0 + pOffset.seconds + pOffset.microseconds / 1000000.0 #Intervals are aligned to 1970-01-01
+
+        if RESAMPLE_FREQUENCY_SECONDS.has_key(self.frequencyUnit): #Intervals of fixed length
+            intervalSeconds = RESAMPLE_FREQUENCY_SECONDS[self.frequencyUnit] * self.frequencyCount
+            pKeys = numpy.floor((pTimes_ * unitSeconds + offsetSeconds) / intervalSeconds).astype(numpy.int64)
+            pIntervalTimes = (pKeys * intervalSeconds - offsetSeconds) / unitSeconds
+
+        else: #Intervals of months or years depend on calendar
+            if not calendar.lower() in STANDARD_CALENDARS:
+                raise Exception("Error: Resampling to months or years is not implemented for calendar '" + str(calendar) + "'.")
+            if self.frequencyUnit == 'Y':
+                intervalMonths = 12 * self.frequencyCount
+            else:
+                intervalMonths = self.frequencyCount
+
+            #Interval of each day is calculated only once, e.g. for 48 half-hourly time values
+            pDays = numpy.floor((pTimes_ * unitSeconds + offsetSeconds) / 86400.0).astype(numpy.int64) #Days since 1970-01-01
+            pUniqueDays, pInverse = numpy.unique(pDays, return_inverse = True)
+            pDayKeys = numpy.empty(len(pUniqueDays), dtype = numpy.int64)
+            pDayTimes = numpy.empty(len(pUniqueDays), dtype = numpy.float64)
+            for i_day in xrange(0, len(pUniqueDays)):
+                pDatetime = pEpoch + timedelta(days = int(pUniqueDays[i_day]))
+                pDayKeys[i_day] = (pDatetime.year * 12 + pDatetime.month - 1) // intervalMonths
+                startMonth = pDayKeys[i_day] * intervalMonths
+                pStart = datetime(int(startMonth // 12), int(startMonth % 12) + 1, 1) - pReferenceTime
+                pDayTimes[i_day] = (pStart.days * 86400.0 + pStart.seconds + pStart.microseconds / 1000000.0) / unitSeconds
+
+            pKeys = pDayKeys[pInverse]
+            pIntervalTimes = pDayTimes[pInverse]
+
+        if len(pKeys) > 1 and numpy.any(numpy.diff(pKeys) < 0):
+            raise Exception("Error: Time values of variable '" + str(pTimeVar_.getName()) + "' are not monotonic. Data can't be resampled.")
+
+        #Consecutive time values of the same interval
+        pStarts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(pKeys)) + 1))
+        pEnds = numpy.concatenate((pStarts[1:], [len(pKeys)]))
+
+        return (pStarts, pEnds, pIntervalTimes[pStarts])
+
+
+    def __resampleVariable(self, pVar_, pStarts_, pEnds_):
+        """Private function returning new variable with the data of variable 'pVar' aggregated for
+        each time interval. The data is read in chunks of time values of one interval"""
+
+        pData = pVar_.getData()
+        method = self.method
+
+        if numpy.issubdtype(pData.dtype, numpy.floating) or method in ['min', 'max']:
+            pDataType = pData.dtype
+            varType = pVar_.getType()
+        else: #Integer mean and sum
+            pDataType = numpy.dtype(numpy.float64)
+            varType = 'double'
+        isFloat = numpy.issubdtype(pData.dtype, numpy.floating)
+
+        fillValue = None #Compared in data type of the data, not as float64
+        for attrName in ['_FillValue', 'missing_value']:
+            for pVarAttr in pVar_.getAttributes():
+                if pVarAttr.getName() == attrName and fillValue is None:
+                    fillValue = self.pProcessingTool.castValue2DataType(pVarAttr.getValue(), pData.dtype)
+
+        if fillValue is None:
+            fillValueOut = numpy.nan
+        else:
+            fillValueOut = fillValue
+        if fillValue is None and not numpy.issubdtype(pDataType, numpy.floating):
+            fillValueOut = 0 #Integer data without _FillValue has always valid values
+
+        timeElements = max(1, pData[0].size)
+        timesPerChunk = max(1, self.chunkElements // timeElements)
+
+        pDataOut = numpy.empty((len(pStarts_),) + tuple(pData.shape[1:]), dtype = pDataType)
+
+        for i_interval in xrange(0, len(pStarts_)):
+            pAccumulate = None
+            pCount = None
+
+            for i_time in xrange(pStarts_[i_interval], pEnds_[i_interval], timesPerChunk):
+                pChunk = numpy.ma.asarray(pData[i_time:min(i_time+timesPerChunk, pEnds_[i_interval])])
+
+                pValid = ~numpy.ma.getmaskarray(pChunk) #Masked by lazy NetCDF variable
+                pChunk = numpy.ma.getdata(pChunk)
+                if not fillValue is None:
+                    pValid &= (pChunk != fillValue)
+                if isFloat:
+                    pValid &= (pChunk == pChunk) #NaN values
+                pChunk = pChunk.astype(numpy.float64)
+
+                if method in ['mean', 'sum']:
+                    pChunkResult = numpy.where(pValid, pChunk, 0.0).sum(axis = 0)
+                elif method == 'min':
+                    pChunkResult = numpy.where(pValid, pChunk, numpy.inf).min(axis = 0)
+                else: #max
+                    pChunkResult = numpy.where(pValid, pChunk, -numpy.inf).max(axis = 0)
+
+                if pAccumulate is None:
+                    pAccumulate = pChunkResult
+                    pCount = pValid.sum(axis = 0)
+                else:
+                    if method in ['mean', 'sum']:
+                        numpy.add(pAccumulate, pChunkResult, out = pAccumulate)
+                    elif method == 'min':
+                        numpy.minimum(pAccumulate, pChunkResult, out = pAccumulate)
+                    else: #max
+                        numpy.maximum(pAccumulate, pChunkResult, out = pAccumulate)
+                    numpy.add(pCount, pValid.sum(axis = 0), out = pCount)
+
+            if method == 'mean':
+                pAccumulate = pAccumulate / numpy.maximum(pCount, 1)
+            pAccumulate[pCount == 0] = fillValueOut
+
+            pDataOut[i_interval] = pAccumulate
+
+        #New variable with changed type and cell method
+        #-------------------------------------------------------------------------------
+        pVarOut = Variable(pVar_.getName(), pVar_.getShape(), varType)
+        cellMethods = 'time: ' + RESAMPLE_METHODS[method]
+        for pVarAttr in pVar_.getAttributes():
+            if pVarAttr.getName() == 'cell_methods':
+                cellMethods = str(pVarAttr.getValue()) + ' ' + cellMethods
+            elif pVarAttr.getName() in ['_FillValue', 'missing_value', 'valid_min', 'valid_max', 'valid_range'] and varType != pVar_.getType():
+                pVarOut.addAttribute(pVarAttr.getName(), varType, pVarAttr.getValue(), pVarAttr.getSeparator())
+            else:
+                pVarOut.addAttribute(pVarAttr.getName(), pVarAttr.getType(), pVarAttr.getValue(), pVarAttr.getSeparator())
+        pVarOut.addAttribute('cell_methods', '', cellMethods, '')
+        pVarOut.addData(pDataOut)
+
+        return pVarOut
+
+
+#_______________________________________________________________________________
+
+class ModelCoarsenGrid:
+    """This class is designed for creating coarsened versions (overview levels) of the gridded
+    data variables of the internal data model, e.g. with 2, 4 and 8 times larger grid cells.
+    The values of a block of grid cells are aggregated to one value by the block mean, minimum,
+    maximum, sum or the most frequent value (mode) for categorical data. All levels are created in
+    a single streaming pass over chunks of time values (or tiles of latitude rows) of the data."""
+
+
+    def __init__(self, pDataList_, pFactorList_, method_, chunkElements_=COARSEN_CHUNK_ELEMENTS):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        DataList        - list of the internal data model [pDimList, pAttrList, pVarList] with attached data
+        FactorList      - list of coarsening factors (integers), each factor must be a multiple of the
+                          previous factor, e.g. [2, 4, 8]
+        method          - block aggregation method (string), one of 'mean', 'min', 'max', 'sum' or 'mode'.
+                          Variables with attribute 'flag_values' are always aggregated by 'mode'
+        chunkElements   - maximum number of values that are read at once (integer)
+        """
+
+        self.pDataList = pDataList_
+        self.chunkElements = int(chunkElements_)
+
+        pFactorList = [int(factor) for factor in pFactorList_]
+        for i_factor in range(0, len(pFactorList), 1):
+            if i_factor == 0:
+                previousFactor = 1
+            else:
+                previousFactor = pFactorList[i_factor-1]
+            if pFactorList[i_factor] <= previousFactor or pFactorList[i_factor] % previousFactor != 0:
+                raise Exception("Error: Coarsening factors '" + str(pFactorList_) + "' must be ascending and each factor must be a multiple of the previous factor, e.g. '2,4,8'.")
+        if len(pFactorList) == 0:
+            raise Exception("Error: No coarsening factor defined.")
+        self.pFactorList = pFactorList
+
+        if not COARSEN_METHODS.has_key(method_):
+            raise Exception("Error: Coarsening method '" + str(method_) + "' is not valid. Valid methods are '" + str(sorted(COARSEN_METHODS.keys())) + "'.")
+        self.method = method_
+        self.pProcessingTool = ProcessingTool()
+
+        self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+
+
+    #def __del__ (self):
+        #"""Destructor"""
+
+
+    def coarsenGrid(self):
+        """
+        Create coarsened versions of all data variables of the internal data model.
+
+        RETURN_VALUE:
+        List of tuples (factor, pDataList) with a new internal data model for each coarsening
+        factor. Latitude and longitude dimensions and coordinates are changed to the centers of
+        the blocks, the data variables get the attribute 'cell_methods'.
+
+        COMMENTS:
+        Values equal to the attribute '_FillValue' (or 'missing_value') and NaN values are ignored,
+        blocks without valid values are set to '_FillValue'. Incomplete blocks at the grid border are
+        aggregated from the existing grid cells. Data of integer type is changed to 'double' for the
+        methods 'mean' and 'sum'.
+        """
+
+        pDimList = self.pDataList[0]
+        pAttrList = self.pDataList[1]
+        pVarList = self.pDataList[2]
+
+        #Get latitude and longitude coordinates
+        #-------------------------------------------------------------------------------
+        pLatVar = None
+        pLonVar = None
+        for pVar in pVarList[:]:
+            if pVar.getName() in LATITUDE:
+                pLatVar = pVar
+            elif pVar.getName() in LONGITUDE:
+                pLonVar = pVar
+        if pLatVar is None or pLonVar is None:
+            raise Exception("Error: Data model has no latitude or longitude coordinate variable. Grid can't be coarsened.")
+
+        latDimName = pLatVar.getShape().split()[0]
+        lonDimName = pLonVar.getShape().split()[0]
+        pLatValues = numpy.asarray(pLatVar.getData()[:]).ravel()
+        pLonValues = numpy.asarray(pLonVar.getData()[:]).ravel()
+
+
+        #Coarsen data variables of all levels
+        #-------------------------------------------------------------------------------
+        pDataVarList = [pVar for pVar in pVarList[:] if not pVar.getName() in COORD_KEYWORDS]
+        pVarOutDict = dict() #Coarsened variables by factor
+
+        #Define progress bar settings
+        widgetsBar = ['Coarsening status: ', Percentage(), ' ', Bar(marker=RotatingMarker()),
+                   ' ', ETA(), ' ', FileTransferSpeed()]
+        progressBar = ProgressBar(widgets=widgetsBar, maxval=max(1, len(pDataVarList))).start()
+
+        for i_var in range(0, len(pDataVarList), 1):
+            pVarOutList = self.__coarsenVariable(pDataVarList[i_var], latDimName, lonDimName)
+            for i_factor in range(0, len(self.pFactorList), 1):
+                pVarOutDict.setdefault(self.pFactorList[i_factor], list()).append(pVarOutList[i_factor])
+
+            progressBar.update(i_var+1)# Progress bar
+
+
+        #Create new data models
+        #-------------------------------------------------------------------------------
+        pLevelList = list()
+        for factor in self.pFactorList:
+            pLatOut = self.__getBlockCenters(pLatValues, factor).astype(pLatValues.dtype)
+            pLonOut = self.__getBlockCenters(pLonValues, factor).astype(pLonValues.dtype)
+
+            pDimListOut = list()
+            for pDim in pDimList[:]:
+                if pDim.getName() == latDimName:
+                    pDimListOut.append(Dimension(pDim.getName(), len(pLatOut), pDim.getIsUnlimited()))
+                elif pDim.getName() == lonDimName:
+                    pDimListOut.append(Dimension(pDim.getName(), len(pLonOut), pDim.getIsUnlimited()))
+                else:
+                    pDimListOut.append(pDim)
+
+            pVarListOut = list()
+            pDataVarIter = iter(pVarOutDict.get(factor, list()))
+            for pVar in pVarList[:]:
+                if pVar is pLatVar:
+                    pVarListOut.append(self.__copyVariable(pVar, pVar.getType(), pLatOut))
+                elif pVar is pLonVar:
+                    pVarListOut.append(self.__copyVariable(pVar, pVar.getType(), pLonOut))
+                elif pVar.getName() in COORD_KEYWORDS:
+                    pVarListOut.append(pVar)
+                else:
+                    pVarListOut.append(pDataVarIter.next())
+
+            pLevelList.append((factor, [pDimListOut, pAttrList, pVarListOut]))
+            self.pLogger.info("Overview level with factor '" + str(factor) + "' has '" + str(len(pLatOut)) + "' x '" + str(len(pLonOut)) + "' grid cells.")
+
+        return pLevelList
+
+
+    def __coarsenVariable(self, pVar_, latDimName_, lonDimName_):
+        """Private function returning list of new variables with the data of variable 'pVar' (shape
+        (time, z, lat, lon)) coarsened by each factor. The data is read in chunks of time values, if a single
+        time value has more than 'chunkElements' values in tiles of latitude rows aligned to the largest factor"""
+
+        pData = pVar_.getData()
+        isFloat = numpy.issubdtype(pData.dtype, numpy.floating)
+
+        method = self.method
+        for pVarAttr in pVar_.getAttributes():
+            if pVarAttr.getName() == 'flag_values': #Categorical data
+                method = 'mode'
+
+        if isFloat or method in ['min', 'max', 'mode']:
+            pDataType = pData.dtype
+            varType = pVar_.getType()
+        else: #Integer mean and sum
+            pDataType = numpy.dtype(numpy.float64)
+            varType = 'double'
+
+        fillValue = None #Compared in data type of the data, not as float64
+        for attrName in ['_FillValue', 'missing_value']:
+            for pVarAttr in pVar_.getAttributes():
+                if pVarAttr.getName() == attrName and fillValue is None:
+                    fillValue = self.pProcessingTool.castValue2DataType(pVarAttr.getValue(), pData.dtype)
+
+        if fillValue is None:
+            fillValueOut = numpy.nan
+        else:
+            fillValueOut = fillValue
+        if fillValue is None and not numpy.issubdtype(pDataType, numpy.floating):
+            fillValueOut = 0 #Integer data without _FillValue has always valid values
+
+        dimT = pData.shape[0]
+        dimY = pData.shape[-2]
+        timeElements = max(1, int(numpy.prod(pData.shape[1:])))
+        timesPerChunk = max(1, self.chunkElements // timeElements)
+        rowsPerChunk = dimY
+        if timeElements > self.chunkElements: #Tiles of latitude rows, blocks of all factors are complete within a tile
+            maxFactor = self.pFactorList[-1]
+            rowElements = max(1, timeElements // max(1, dimY))
+            rowsPerChunk = max(1, self.chunkElements // rowElements // maxFactor) * maxFactor
+
+        pDataOutList = list()
+        for factor in self.pFactorList:
+            pDataOutList.append(numpy.empty(tuple(pData.shape[:-2]) + (-(-pData.shape[-2] // factor), -(-pData.shape[-1] // factor)), dtype = pDataType))
+
+        #Coarsen data in chunks of time values (and latitude rows), each level is calculated from the previous level
+        #-------------------------------------------------------------------------------
+        for i_time in xrange(0, dimT, timesPerChunk):
+            for i_row in xrange(0, dimY, rowsPerChunk):
+                pChunk = numpy.ma.asarray(pData[i_time:i_time+timesPerChunk, :, i_row:i_row+rowsPerChunk, :])
+
+                pValid = ~numpy.ma.getmaskarray(pChunk) #Masked by lazy NetCDF variable
+                pChunk = numpy.ma.getdata(pChunk)
+                if not fillValue is None:
+                    pValid &= (pChunk != fillValue)
+                if isFloat:
+                    pValid &= (pChunk == pChunk) #NaN values
+                pChunk = pChunk.astype(numpy.float64)
+
+                if method == 'mode':
+                    pResultList = self.__coarsenChunkMode(pChunk, pValid)
+                else:
+                    if method in ['mean', 'sum']:
+                        pReduce = numpy.add.reduce
+                        padValue = 0.0
+                    elif method == 'min':
+                        pReduce = numpy.minimum.reduce
+                        padValue = numpy.inf
+                    else: #max
+                        pReduce = numpy.maximum.reduce
+                        padValue = -numpy.inf
+
+                    pValues = numpy.where(pValid, pChunk, padValue)
+                    pCount = pValid.astype(numpy.int32)
+                    previousFactor = 1
+                    pResultList = list()
+                    for factor in self.pFactorList:
+                        pValues = self.__blockReduce(pValues, factor // previousFactor, pReduce, padValue)
+                        pCount = self.__blockReduce(pCount, factor // previousFactor, numpy.add.reduce, 0)
+                        previousFactor = factor
+
+                        if method == 'mean':
+                            pResult = pValues / numpy.maximum(pCount, 1)
+                        else:
+                            pResult = pValues.copy()
+                        pResult[pCount == 0] = fillValueOut
+                        pResultList.append(pResult)
+
+                for i_factor in range(0, len(self.pFactorList), 1):
+                    if method == 'mode':
+                        pResultList[i_factor][numpy.isnan(pResultList[i_factor])] = fillValueOut
+                    rowOut = i_row // self.pFactorList[i_factor]
+                    pDataOutList[i_factor][i_time:i_time+timesPerChunk, :, rowOut:rowOut+pResultList[i_factor].shape[-2], :] = pResultList[i_factor]
+
+
+        #New variables with changed type and cell method
+        #-------------------------------------------------------------------------------
+        pVarOutList = list()
+        for i_factor in range(0, len(self.pFactorList), 1):
+            pVarOut = self.__copyVariable(pVar_, varType, pDataOutList[i_factor], \
+                str(latDimName_) + ': ' + str(lonDimName_) + ': ' + COARSEN_METHODS[method])
+            pVarOutList.append(pVarOut)
+
+        return pVarOutList
+
+
+    def __coarsenChunkMode(self, pChunk_, pValid_):
+        """Private function returning list of arrays with the most frequent valid value of each block of
+        array 'pChunk' for each factor (NaN if a block has no valid value). The values of each class are
+        counted one after another, so that the counts of each level are summed up from the previous level"""
+
+        pClasses = numpy.unique(pChunk_[pValid_])
+
+        pBestCountList = [None] * len(self.pFactorList)
+        pBestValueList = [None] * len(self.pFactorList)
+        for value in pClasses:
+            pCount = ((pChunk_ == value) & pValid_).astype(numpy.int32)
+            previousFactor = 1
+            for i_factor in range(0, len(self.pFactorList), 1):
+                factor = self.pFactorList[i_factor]
+                pCount = self.__blockReduce(pCount, factor // previousFactor, numpy.add.reduce, 0)
+                previousFactor = factor
+
+                if pBestCountList[i_factor] is None:
+                    pBestCountList[i_factor] = numpy.zeros(pCount.shape, dtype = numpy.int32)
+                    pBestValueList[i_factor] = numpy.empty(pCount.shape, dtype = numpy.float64)
+                    pBestValueList[i_factor].fill(numpy.nan)
+                pIsBest = pCount > pBestCountList[i_factor]
+                pBestCountList[i_factor][pIsBest] = pCount[pIsBest]
+                pBestValueList[i_factor][pIsBest] = value
+
+        if len(pClasses) == 0: #No valid values in chunk
+            previousShape = pChunk_.shape
+            for i_factor in range(0, len(self.pFactorList), 1):
+                factor = self.pFactorList[i_factor]
+                pBestValueList[i_factor] = numpy.empty(tuple(previousShape[:-2]) + (-(-previousShape[-2] // factor), -(-previousShape[-1] // factor)))
+                pBestValueList[i_factor].fill(numpy.nan)
+
+        return pBestValueList
+
+
+    def __blockReduce(self, pArray_, ratio_, pReduce_, padValue_):
+        """Private function reducing blocks of 'ratio' x 'ratio' values of the last two axes of array 'pArray'
+        by function 'pReduce' (e.g. numpy.add.reduce). Incomplete blocks at the border are filled with 'padValue'"""
+
+        if ratio_ == 1:
+            return pArray_
+
+        shape = pArray_.shape
+        dimY = -(-shape[-2] // ratio_) #Number of blocks, rounded up
+        dimX = -(-shape[-1] // ratio_)
+
+        if dimY * ratio_ != shape[-2] or dimX * ratio_ != shape[-1]: #Pad incomplete blocks
+            pPadded = numpy.empty(tuple(shape[:-2]) + (dimY * ratio_, dimX * ratio_), dtype = pArray_.dtype)
+            pPadded.fill(padValue_)
+            pPadded[..., :shape[-2], :shape[-1]] = pArray_
+            pArray_ = pPadded
+
+        #Reshape to (..., blocks y, values y, blocks x, values x) without copying data
+        pBlocks = pArray_.reshape(tuple(shape[:-2]) + (dimY, ratio_, dimX, ratio_))
+        return pReduce_(pReduce_(pBlocks, axis = -1), axis = -2)
+
+
+    def __getBlockCenters(self, pCoordinates_, factor_):
+        """Private function returning the coordinates of the block centers of evenly spaced coordinates"""
+
+        dimCoarse = -(-len(pCoordinates_) // factor_)
+        if len(pCoordinates_) < 2:
+            return numpy.asarray(pCoordinates_, dtype = numpy.float64)[:dimCoarse]
+
+        step = (float(pCoordinates_[-1]) - float(pCoordinates_[0])) / (len(pCoordinates_) - 1)
+        return float(pCoordinates_[0]) + (numpy.arange(dimCoarse, dtype = numpy.float64) * factor_ + (factor_ - 1) / 2.0) * step
+
+
+    def __copyVariable(self, pVar_, type_, pData_, cellMethods_=None):
+        """Private function returning a copy of variable 'pVar' with type 'type' and data 'pData'.
+        Optionally attribute 'cell_methods' is completed by 'cellMethods'"""
+
+        pVarOut = Variable(pVar_.getName(), pVar_.getShape(), type_)
+        for pVarAttr in pVar_.getAttributes():
+            if pVarAttr.getName() == 'cell_methods' and not cellMethods_ is None:
+                cellMethods_ = str(pVarAttr.getValue()) + ' ' + cellMethods_
+            elif pVarAttr.getName() in ['_FillValue', 'missing_value', 'valid_min', 'valid_max', 'valid_range'] and type_ != pVar_.getType():
+                pVarOut.addAttribute(pVarAttr.getName(), type_, pVarAttr.getValue(), pVarAttr.getSeparator())
+            else:
+                pVarOut.addAttribute(pVarAttr.getName(), pVarAttr.getType(), pVarAttr.getValue(), pVarAttr.getSeparator())
+        if not cellMethods_ is None:
+            pVarOut.addAttribute('cell_methods', '', cellMethods_, '')
+        pVarOut.addData(pData_)
+
+        return pVarOut
+
+
+#_______________________________________________________________________________
+
+class ModelDataStatistics:
+    """This class is designed for calculating statistics of the data variables of the internal data
+    model in streaming passes over chunks of the data, so that also datasets larger than the memory
+    can be analysed (memory mapped numpy arrays or lazy NetCDF variables)"""
+
+
+    def __init__(self, pVarList_, perTime_=False, chunkElements_=STATS_CHUNK_ELEMENTS):
+        """
+        Constructor.
+
+        INPUT_PARAMETERS:
+        VarList         - variable list of the internal data model with attached data
+        perTime         - if True, count, fill count, minimum, maximum, mean and standard deviation
+                          are also calculated for each time value (boolean)
+        chunkElements   - maximum number of values that are read at once (integer)
+        """
+
+        self.pVarList = pVarList_
+        self.perTime = bool(perTime_)
+        self.chunkElements = int(chunkElements_)
+
+        self.pStatsDict = dict() #Statistics by variable name
+
+        self.pProcessingTool = ProcessingTool()
+        self.pLogger = logging.getLogger(INTERFACE_LOGGER_ROOT+"."+__name__+"."+self.__class__.__name__)
+
+
+    #def __del__ (self):
+        #"""Destructor"""
+
+
+    def computeStatistics(self):
+        """
+        Calculate statistics of all data variables.
+
+        RETURN_VALUE:
+        Dictionary with a dictionary for each variable name with the keys 'type', 'count' (valid values),
+        'fill' (_FillValue, missing_value and NaN values), 'min', 'max', 'mean', 'std', 'quantiles'
+        (dictionary by quantile), 'histogram' (dictionary with lists 'edges' and 'counts') and
+        optionally 'perTime' (dictionary of lists). Values are None if there are no valid values.
+
+        COMMENTS:
+        Each variable is read twice: The first pass calculates count, minimum, maximum, mean and
+        standard deviation (by merging the chunks with the algorithm of Welford / Chan), the second pass
+        calculates a fixed-bin histogram between minimum and maximum. Quantiles are approximated
+        by linear interpolation within a histogram of 'STATS_QUANTILE_SUBBINS' times more bins.
+        """
+
+        for pVar in self.pVarList[:]:
+            if pVar.getName() in COORD_KEYWORDS:
+                continue
+            try:
+                pData = pVar.getData()
+            except AttributeError: #No data attached to variable
+                self.pLogger.warning("No data attached to variable '" + str(pVar.getName()) + "'. Statistics are not calculated.")
+                continue
+
+            pStats = self.computeVariableStatistics(pVar, pData)
+            self.pStatsDict[pVar.getName()] = pStats
+
+            self.pLogger.info("Statistics of variable '" + str(pVar.getName()) + "': '" + str(pStats['count']) + "' values, '" + \
+            str(pStats['fill']) + "' fill values, minimum '" + str(pStats['min']) + "', maximum '" + str(pStats['max']) + "', mean '" + \
+            str(pStats['mean']) + "', standard deviation '" + str(pStats['std']) + "', median '" + str(pStats['quantiles'].get('0.5')) + "'.")
+
+        return self.pStatsDict
+
+
+    def computeVariableStatistics(self, pVar_, pData_):
+        """Calculate statistics of data 'pData' (first axis is time) of variable 'pVar'
+        in chunks along the first axis, see function 'computeStatistics'"""
+
+        isFloat = numpy.issubdtype(pData_.dtype, numpy.floating)
+
+        fillValue = None #Compared in data type of the data, not as float64
+        missingValue = None
+        for pVarAttr in pVar_.getAttributes():
+            if pVarAttr.getName() == '_FillValue':
+                fillValue = self.pProcessingTool.castValue2DataType(pVarAttr.getValue(), pData_.dtype)
+            elif pVarAttr.getName() == 'missing_value':
+                missingValue = self.pProcessingTool.castValue2DataType(pVarAttr.getValue(), pData_.dtype)
+
+        dimT = pData_.shape[0]
+        timeElements = max(1, int(numpy.prod(pData_.shape[1:])))
+        timesPerChunk = max(1, self.chunkElements // timeElements)
+
+        #First pass: count, minimum, maximum, mean and variance
+        #-------------------------------------------------------------------------------
+        count = 0
+        fill = 0
+        mean = 0.0
+        m2 = 0.0 #Sum of squared differences from the mean
+        minValue = None
+        maxValue = None
+        pPerTime = {'count': [], 'fill': [], 'min': [], 'max': [], 'mean': [], 'std': []}
+
+        for i_time in xrange(0, dimT, timesPerChunk):
+            (pChunk, pValid) = self.__readChunk(pData_[i_time:i_time+timesPerChunk], fillValue, missingValue, isFloat)
+
+            pValues = pChunk[pValid]
+            chunkCount = len(pValues)
+            fill = fill + pValid.size - chunkCount
+            if chunkCount > 0:
+                chunkMean = pValues.mean()
+                chunkM2 = ((pValues - chunkMean)**2).sum()
+
+                #Merge chunk with previous values
+                delta = chunkMean - mean
+                newCount = count + chunkCount
+                mean = mean + delta * chunkCount / newCount
+                m2 = m2 + chunkM2 + delta**2 * count * chunkCount / newCount
+                count = newCount
+
+                if minValue is None:
+                    minValue = pValues.min()
+                    maxValue = pValues.max()
+                else:
+                    minValue = min(minValue, pValues.min())
+                    maxValue = max(maxValue, pValues.max())
+
+            if self.perTime:
+                for i_row in range(0, pChunk.shape[0], 1):
+                    pRowValues = pChunk[i_row][pValid[i_row]]
+                    pPerTime['count'].append(int(len(pRowValues)))
+                    pPerTime['fill'].append(int(pValid.shape[1] - len(pRowValues)))
+                    if len(pRowValues) > 0:
+                        pPerTime['min'].append(float(pRowValues.min()))
+                        pPerTime['max'].append(float(pRowValues.max()))
+                        pPerTime['mean'].append(float(pRowValues.mean()))
+                        pPerTime['std'].append(float(pRowValues.std()))
+                    else:
+                        for key in ['min', 'max', 'mean', 'std']:
+                            pPerTime[key].append(None)
+
+        pStats = {'type': str(pVar_.getType()), 'count': int(count), 'fill': int(fill), 'min': None, 'max': None, 'mean': None, 'std': None, \
+            'quantiles': dict(), 'histogram': {'edges': [], 'counts': []}}
+        if self.perTime:
+            pStats['perTime'] = pPerTime
+        if count == 0:
+            return pStats
+
+        pStats['min'] = float(minValue)
+        pStats['max'] = float(maxValue)
+        pStats['mean'] = float(mean)
+        pStats['std'] = float(numpy.sqrt(m2 / count))
+
+
+        #Second pass: histogram between minimum and maximum
+        #-------------------------------------------------------------------------------
+        nBins = STATS_HISTOGRAM_BINS * STATS_QUANTILE_SUBBINS
+        pEdges = numpy.linspace(minValue, maxValue, nBins + 1)
+        pCounts = numpy.zeros(nBins, dtype = numpy.int64)
+        binWidth = (maxValue - minValue) / nBins
+
+        for i_time in xrange(0, dimT, timesPerChunk):
+            (pChunk, pValid) = self.__readChunk(pData_[i_time:i_time+timesPerChunk], fillValue, missingValue, isFloat)
+            pValues = pChunk[pValid]
+            if binWidth > 0:
+                pBins = numpy.minimum(((pValues - minValue) / binWidth).astype(numpy.int64), nBins - 1)
+            else: #All values are equal
+                pBins = numpy.zeros(len(pValues), dtype = numpy.int64)
+            pCounts += numpy.bincount(pBins, minlength = nBins)[:nBins]
+
+        pStats['histogram']['edges'] = pEdges[::STATS_QUANTILE_SUBBINS].tolist()
+        pStats['histogram']['counts'] = pCounts.reshape(STATS_HISTOGRAM_BINS, STATS_QUANTILE_SUBBINS).sum(axis = 1).tolist()
+
+        #Approximate quantiles by linear interpolation of the cumulative distribution
+        pCumulative = numpy.concatenate(([0], numpy.cumsum(pCounts))) / float(count)
+        for quantile in STATS_QUANTILES:
+            pStats['quantiles'][str(quantile)] = float(numpy.interp(quantile, pCumulative, pEdges))
+
+        return pStats
+
+
+    def storeActualRangeNcml(self, ncmlFileName_):
+        """Save minimum and maximum of each variable as attribute 'actual_range' in NCML XML file 'ncmlFileName'"""
+
+        pProcessNcml = ProcessNcml(ncmlFileName_)
+        for pVar in self.pVarList[:]:
+            if self.pStatsDict.has_key(pVar.getName()) and not self.pStatsDict[pVar.getName()]['min'] is None:
+                pStats = self.pStatsDict[pVar.getName()]
+                pProcessNcml.removeLocalAttribute(str(pVar.getName()), 'actual_range')
+                pProcessNcml.addLocalAttribute(str(pVar.getName()), 'actual_range', self.__formatValue(pVar, pStats['min']) + ',' + \
+                    self.__formatValue(pVar, pStats['max']), str(pVar.getType()), ',')
+
+        self.pLogger.info("Attribute 'actual_range' saved in NCML file '" + str(ncmlFileName_) + "'.")
+        return
+
+
+    def storeActualRangeNetCdf(self, netCdfFileName_):
+        """Save minimum and maximum of each variable as attribute 'actual_range' in NetCDF file 'netCdfFileName'"""
+
+        pNetCdf = Dataset(netCdfFileName_, 'a')
+        try:
+            for pVar in self.pVarList[:]:
+                if self.pStatsDict.has_key(pVar.getName()) and not self.pStatsDict[pVar.getName()]['min'] is None:
+                    pStats = self.pStatsDict[pVar.getName()]
+                    pNetCdfVar = pNetCdf.variables[pVar.getName()]
+                    pNetCdfVar.actual_range = numpy.array([pStats['min'], pStats['max']], dtype = pNetCdfVar.dtype)
+        finally:
+            pNetCdf.close()
+
+        self.pLogger.info("Attribute 'actual_range' saved in NetCDF file '" + str(netCdfFileName_) + "'.")
+        return
+
+
+    def __readChunk(self, pChunk_, fillValue_, missingValue_, isFloat_):
+        """Private function returning tuple (pChunk, pValid) of the data chunk 'pChunk' as float64 array of shape
+        (time, values) and the boolean array of its valid values. Fill and missing values are compared in the
+        data type of the chunk before the conversion, values masked by a lazily read NetCDF variable are invalid"""
+
+        pChunk = numpy.ma.asarray(pChunk_)
+        pValid = ~numpy.ma.getmaskarray(pChunk)
+        pChunk = numpy.ma.getdata(pChunk)
+        if not fillValue_ is None:
+            pValid &= (pChunk != fillValue_)
+        if not missingValue_ is None:
+            pValid &= (pChunk != missingValue_)
+        if isFloat_:
+            pValid &= (pChunk == pChunk) #NaN values
+
+        return (pChunk.astype(numpy.float64).reshape(pChunk.shape[0], -1), pValid.reshape(pChunk.shape[0], -1))
+
+
+    def __formatValue(self, pVar_, value_):
+        """Private function returning value as string according to the type of variable 'pVar'"""
+
+        if pVar_.getType() in ALL_INTS:
+            return str(int(round(value_)))
+        else:
+            return repr(float(value_))
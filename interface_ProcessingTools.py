@@ -12,11 +12,15 @@ used by other modules that are intended to convert data to and fromt the data mo
 __author__= "Nicolai Holzer"
 __author_email__ = "first-name dot last-name @ mailbox.tu-dresden.de"
 __date__ ="2011-04-15"
-__version__ = "v0.1.3"
+__version__ = "v0.1.7"
 
 
 #Changelog
 #-------------------------------------------------------------------------------
+#2011-05-31: v0.1.7 time values of a list of dates
+#2011-05-24: v0.1.6 NCML file can be filled by shape and data type of a numpy data array without the array
+#2011-05-17: v0.1.5 time values calculated arithmetically for standard calendars, time units parsed once
+#2011-05-16: v0.1.4 chunked in-place unit conversion of data variables by Udunits2 added
 #2001-04-15: v0.1.3 little changes for NcML attributes
 #2011-01-14: v0.1.2 functionalities changed
 #2010-11-23: v0.1.1 comments and docstrings added
@@ -44,6 +48,24 @@ from interface_Settings import *
 
 #===============================================================================
 
+#Module constants
+#-------------------------------------------------------------------------------
+UNIT_CONVERSION_CHUNK_ELEMENTS = 4194304 #Maximum number of values converted at once
+
+pUdunitsUnitSystemCache = dict() #Udunits2 library and unit system by XML database, read only once per process
+
+#Time units and their length in seconds
+TIME_UNIT_SECONDS = {'days': 86400.0, 'day': 86400.0, 'd': 86400.0,
+    'hours': 3600.0, 'hour': 3600.0, 'hrs': 3600.0, 'hr': 3600.0, 'h': 3600.0,
+    'minutes': 60.0, 'minute': 60.0, 'mins': 60.0, 'min': 60.0,
+    'seconds': 1.0, 'second': 1.0, 'secs': 1.0, 'sec': 1.0, 's': 1.0,
+    'milliseconds': 0.001, 'millisecond': 0.001, 'msecs': 0.001, 'msec': 0.001, 'ms': 0.001}
+#Calendars for that time values can be calculated arithmetically (Gregorian calendar after its introduction)
+STANDARD_CALENDARS = ['standard', 'gregorian', 'proleptic_gregorian']
+GREGORIAN_START = datetime(1582, 10, 15)
+
+pTimeUnitsCache = dict() #Parsed time units by units string
+
 
 
 class ProcessingTool:
@@ -128,7 +150,8 @@ class ProcessingTool:
         INPUT_PARAMETERS:
         units           - Time unit and starting date of values (string) in the form of
             'unit since reference time' (e.g. 'hours since 1970-01-01 00:00:0.0'). The 
-            following unit values are allowed: 'days', 'hours', 'minutes', 'seconds'
+            following unit values are allowed: 'days', 'hours', 'minutes', 'seconds', 'msec'
+            and their abbreviations (see constant 'TIME_UNIT_SECONDS')
         quantity        - Duration, number of values to generate from the starting date (integer)
         timeStep        - Repeat interval, as multiplicator for timedelta (float), for example '0.5' (hours)
         
@@ -137,38 +160,31 @@ class ProcessingTool:
         
         COMMENTS:
         The calculated time values in the numpy array have its reference date defined
-        in the constant 'self.pDefaultSettings.varTimeAttrUnits' (module interface_Contants)
+        in the constant 'self.pDefaultSettings.varTimeAttrUnits' (module interface_Contants).
+        For standard calendars the values are calculated arithmetically for all values at once,
+        otherwise a list of python datetime objects is converted by the NetCDF4 API.
         """
 
         self.pDefaultSettings = DefaultSettings()
 
         dimTime = int(quantity_)
         timeStep = float(timeStep_)
-        timeVarUnits = str(units_)
 
-        #Split time unit and time starting date
-        [timeVarRefUnit,timeVarRefTimeIso] = timeVarUnits.split(' since ')
+        (timeVarRefUnit, unitSeconds, pDatetimeVar) = self.parseTimeUnits(units_)
+        (outRefUnit, outUnitSeconds, pDatetimeOut) = self.parseTimeUnits(self.pDefaultSettings.varTimeAttrUnits)
+        calendar = str(self.pDefaultSettings.varTimeAttrCalendar)
 
-        #Parse ISO8601 with python dateutil, convert to python datetime object
-        pDatetimeVar = dateutil.parser.parse(timeVarRefTimeIso)
+        if calendar.lower() in STANDARD_CALENDARS and (calendar.lower() == 'proleptic_gregorian' or \
+            (pDatetimeVar >= GREGORIAN_START and pDatetimeOut >= GREGORIAN_START)):
+            #Time values as offset of reference times plus multiples of the time step, calculated for all values at once
+            pOffset = pDatetimeVar - pDatetimeOut
+            offsetSeconds = pOffset.days * 86400.0 + pOffset.seconds + pOffset.microseconds / 1000000.0
+            pTimes = (numpy.arange(dimTime, dtype = numpy.float64) * (timeStep * unitSeconds) + offsetSeconds) / outUnitSeconds
 
-        #Necessary because keyword-arguments (like hours,...) cannot automatically filled in by a positional argument
-        if timeVarRefUnit == 'days':
-            pTimedelta = timedelta(days = timeStep)
-        elif timeVarRefUnit == 'hours':
-            pTimedelta = timedelta(hours = timeStep)
-        elif timeVarRefUnit == 'minutes':
-            pTimedelta = timedelta(minutes = timeStep)
-        elif timeVarRefUnit == 'seconds':
-            pTimedelta = timedelta(seconds = timeStep)
-        #elif timeVarRefUnit == 'milliseconds': #not implemented yet
-        #    pTimedelta = timedelta(milliseconds = timeStep)
-        else:
-            raise Exception("Error: Time unit unfortunately '" + str(timeVarRefUnit) + "' not implemented yet!")
-        
-        #Create Numpy array with time values by using NetCDF4 API functions
-        dates = [pDatetimeVar+n*pTimedelta for n in range(dimTime)]
-        pTimes = date2num(dates,units=str(self.pDefaultSettings.varTimeAttrUnits),calendar=str(self.pDefaultSettings.varTimeAttrCalendar))
+        else: #Non-standard calendar, create Numpy array with time values by using NetCDF4 API functions
+            pTimedelta = timedelta(seconds = timeStep * unitSeconds)
+            dates = [pDatetimeVar+n*pTimedelta for n in range(dimTime)]
+            pTimes = date2num(dates,units=str(self.pDefaultSettings.varTimeAttrUnits),calendar=calendar)
 
 ############################################# PROBLEM TYPE OF TIME ARRAY, MUST ROUND IT
         #pTimes = pTimes.astype(numpy.float64)
@@ -177,27 +193,140 @@ class ProcessingTool:
         return pTimes
 
 
+    def createTimeValuesFromDates(self, pDatetimeList_):
+        """
+        Creates numpy array with time values of the python datetime objects in list 'pDatetimeList',
+        e.g. for irregular time steps. The time values have the reference date defined in the constant
+        'self.pDefaultSettings.varTimeAttrUnits' (see function 'createTimeValuesNumpy').
+        """
+
+        self.pDefaultSettings = DefaultSettings()
+
+        pTimes = date2num(list(pDatetimeList_), units=str(self.pDefaultSettings.varTimeAttrUnits), \
+            calendar=str(self.pDefaultSettings.varTimeAttrCalendar))
+        pTimes = numpy.around(numpy.array(pTimes, dtype = numpy.float64, ndmin = 1), decimals = 8) #Necessary to round unequal values
+
+        return pTimes
+
+
+    def parseTimeUnits(self, units_):
+        """
+        Parse time units 'units' (string) in the form of 'unit since reference time'
+        (e.g. 'hours since 1970-01-01 00:00:0.0').
+
+        RETURN_VALUE:
+        Tuple (unit, unitSeconds, pReferenceTime): time unit (string), length of time unit in
+        seconds (float) and reference time as python datetime object (UTC, without time zone)
+
+        COMMENTS:
+        Each units string is only parsed once per process.
+        """
+
+        timeVarUnits = str(units_).strip()
+
+        if pTimeUnitsCache.has_key(timeVarUnits):
+            return pTimeUnitsCache[timeVarUnits]
+
+        #Split time unit and time starting date
+        try:
+            [timeVarRefUnit,timeVarRefTimeIso] = timeVarUnits.split(' since ')
+        except ValueError:
+            raise Exception("Error: Time units '" + str(timeVarUnits) + "' are not in the form 'unit since reference time'!")
+
+        timeVarRefUnit = timeVarRefUnit.strip()
+        if not TIME_UNIT_SECONDS.has_key(timeVarRefUnit.lower()):
+            raise Exception("Error: Time unit unfortunately '" + str(timeVarRefUnit) + "' not implemented yet!")
+
+        #Parse ISO8601 with python dateutil, convert to python datetime object
+        pDatetimeVar = dateutil.parser.parse(timeVarRefTimeIso)
+        if not pDatetimeVar.tzinfo is None: #Reference time with time zone is changed to UTC
+            pDatetimeVar = (pDatetimeVar - pDatetimeVar.utcoffset()).replace(tzinfo = None)
+
+        pTimeUnitsCache[timeVarUnits] = (timeVarRefUnit, TIME_UNIT_SECONDS[timeVarRefUnit.lower()], pDatetimeVar)
+
+        return pTimeUnitsCache[timeVarUnits]
+
+
     def scaleNumpyDataVariable(self, pNumpyData_, varNr_, scaleFactor_):
         """Scale values of data variable #varNr in data variable array
         pNumpyData with value scaleFactor. varNr must be of same type as
         numpy data array"""
 
+        return self.convertNumpyDataVariable(pNumpyData_, varNr_, scaleFactor_, 0.0)
+
+
+    def convertNumpyDataUnits(self, pNumpyData_, varNr_, fromUnit_, toUnit_, fillValue_=None, pProcessNcml_=None, varName_=None):
+        """
+        Convert values of data variable #varNr in data variable array pNumpyData from unit
+        'fromUnit' to unit 'toUnit' (e.g. 'hPa' to 'Pa' or 'degC' to 'K'), see function
+        'convertNumpyDataVariable'.
+
+        INPUT_PARAMETERS:
+        NumpyData       - numpy data array (var, time, z, lat, lon), preferably memory mapped
+                          with mode 'r+' so that the conversion is done in the file
+        varNr           - variable number in data array (integer)
+        fromUnit        - Udunits2 unit of the data values (string)
+        toUnit          - Udunits2 unit the data values are converted to (string)
+        fillValue       - optional: values equal to 'fillValue' are not converted
+        ProcessNcml     - optional: instance of class 'ProcessNcml'; attribute 'units' of
+                          variable with name 'varName' is changed to 'toUnit'
+        varName         - optional: variable name in NCML XML file (string)
+
+        RETURN_VALUE:
+        Converted numpy data array
+        """
+
+        (scaleFactor, addOffset) = self.getUdunitsConversion(fromUnit_, toUnit_)
+
+        pNumpyData = self.convertNumpyDataVariable(pNumpyData_, varNr_, scaleFactor, addOffset, fillValue_)
+
+        if not pProcessNcml_ is None:
+            pProcessNcml_.changeLocalAttribute(varName_, 'units', 'value', str(toUnit_))
+
+        return pNumpyData
+
+
+    def convertNumpyDataVariable(self, pNumpyData_, varNr_, scaleFactor_, addOffset_, fillValue_=None):
+        """
+        Convert values of data variable #varNr in data variable array pNumpyData
+        in place to 'value * scaleFactor + addOffset'.
+
+        COMMENTS:
+        The data is converted in chunks along the time axis with ufuncs writing to the chunk itself,
+        so that no buffer of the size of the variable is needed. For integer arrays the results
+        are truncated to the data type by a buffer of chunk size. Values equal to 'fillValue' are
+        kept. If the data array is memory mapped, the changes are flushed to the file.
+        """
+
         pNumpyData = pNumpyData_
 
-        #dimVar = pNumpyData.shape[0] #Number of variables in array
         dimT = pNumpyData.shape[1] #Time Dimension
-        dimZ = pNumpyData.shape[2] #Level Dimensions
-        dimY = pNumpyData.shape[3] #Last but one axis top to bottom: lat -> row
-        dimX = pNumpyData.shape[4] #Last axis left to right: lon -> col
+        timeElements = max(1, pNumpyData[varNr_, 0].size) #Values of one time step (z, lat, lon)
+        timesPerChunk = max(1, UNIT_CONVERSION_CHUNK_ELEMENTS // timeElements)
+
+        isFloat = numpy.issubdtype(pNumpyData.dtype, numpy.floating)
+
+        for i_time in xrange(0, dimT, timesPerChunk):
+            pChunk = pNumpyData[varNr_, i_time:i_time+timesPerChunk] #View on data array
 
-        pBuffer = numpy.zeros((dimY,dimX), dtype = pNumpyData.dtype)
+            if not fillValue_ is None:
+                pFill = (pChunk == fillValue_)
 
-        #Scale variable varNr_
-        for i_time in range(0, dimT, 1):
-            for i_z in range(0, dimZ, 1):
-                pBuffer[:,:] = pNumpyData[varNr_,i_time,i_z,:,:]
-                pBuffer[:,:] = numpy.cast[pNumpyData.dtype](pBuffer[:,:]*scaleFactor_)
-                pNumpyData[varNr_,i_time,i_z,:,:] = pBuffer[:,:]
+            if isFloat:
+                numpy.multiply(pChunk, scaleFactor_, out = pChunk)
+                if addOffset_ != 0.0:
+                    numpy.add(pChunk, addOffset_, out = pChunk)
+            else:
+                pBuffer = numpy.multiply(pChunk, float(scaleFactor_))
+                if addOffset_ != 0.0:
+                    numpy.add(pBuffer, addOffset_, out = pBuffer)
+                pChunk[...] = pBuffer #Truncated to data type
+
+            if not fillValue_ is None:
+                pChunk[pFill] = fillValue_
+
+        if isinstance(pNumpyData, numpy.memmap):
+            pNumpyData.flush()
 
         return pNumpyData
 
@@ -224,6 +353,20 @@ class ProcessingTool:
             "'. !!!Problems with string 'Byte' might occure, deactivate if necessary in module 'interface_Settings.py' (see known bugs)")
 
 
+    def castValue2DataType(self, value_, pDataType_):
+        """
+        Return value 'value' (string or number, e.g. of attribute '_FillValue') as numpy scalar of data
+        type 'pDataType', so that it can be compared exactly with data of this type. A float32 value like
+        '1e20' differs from the float64 value '1e20' and would otherwise never match.
+        """
+
+        pDataType = numpy.dtype(pDataType_)
+        try:
+            return pDataType.type(value_)
+        except (ValueError, TypeError): #e.g. '-9999.0' for an integer data type
+            return pDataType.type(float(value_))
+
+
     def dataType_2Numpy(self, intype_):
         """Converts an input data type string to the related numpy dtype data type string"""
 
@@ -336,12 +479,68 @@ class ProcessingTool:
         well as correct settings of the global Udunits constants in 'interface_Settings.py'.
         """
 
-        self.pDefaultSettings = DefaultSettings()
-
         #Define settings
         #-------------------------------------------------------------------------------
         unit = unit_
 
+        (udunitsLib, udunitsUnitSystem) = self.__getUdunitsUnitSystem()
+
+
+        # Check if unit is recognized by Udunits package
+        #-------------------------------------------------------------------------------
+        # !Checks obviously no numbers if they are of type string!
+
+        udunitsUnit = udunitsLib.ut_parse(udunitsUnitSystem, str(unit), 0) #UT_ASCII
+        if udunitsUnit: #Unit recognized
+            isUdunits = True
+        else: #Unit not recognized
+            isUdunits = False
+
+        udunitsLib.ut_free(udunitsUnit) #Free up udunitsUnit ressources
+
+        return isUdunits
+
+
+    def getUdunitsConversion(self, fromUnit_, toUnit_):
+        """
+        Return tuple (scaleFactor, addOffset) that converts values of unit 'fromUnit' to
+        unit 'toUnit' by 'value * scaleFactor + addOffset', as defined by the Udunits2 library.
+
+        IMPORTANT:
+        Only linear conversions are supported, e.g. no conversion of logarithmic units.
+        """
+
+        (udunitsLib, udunitsUnitSystem) = self.__getUdunitsUnitSystem()
+
+        fromUnit = udunitsLib.ut_parse(udunitsUnitSystem, str(fromUnit_), 0) #UT_ASCII
+        toUnit = udunitsLib.ut_parse(udunitsUnitSystem, str(toUnit_), 0)
+        try:
+            if not fromUnit or not toUnit:
+                raise Exception("Error: Unit '" + str(fromUnit_) + "' or '" + str(toUnit_) + "' is not conform to the Udunits2 library.")
+
+            converter = udunitsLib.ut_get_converter(fromUnit, toUnit)
+            if not converter:
+                raise Exception("Error: Unit '" + str(fromUnit_) + "' can not be converted to unit '" + str(toUnit_) + "'.")
+
+            #Linear conversion is defined by the converted values of 0 and 1
+            addOffset = udunitsLib.cv_convert_double(converter, 0.0)
+            scaleFactor = udunitsLib.cv_convert_double(converter, 1.0) - addOffset
+            udunitsLib.cv_free(converter)
+        finally:
+            udunitsLib.ut_free(fromUnit)
+            udunitsLib.ut_free(toUnit)
+
+        return (scaleFactor, addOffset)
+
+
+    def __getUdunitsUnitSystem(self):
+        """Private function returning tuple of the Udunits2 library and the Udunits2 unit system.
+        The XML database is read only once per process"""
+
+        self.pDefaultSettings = DefaultSettings()
+
+        #Define settings
+        #-------------------------------------------------------------------------------
         udunitsLib = self.pDefaultSettings.udunitsLib #UDUNITS_LIB
         udunitsKey = 'UDUNITS'
 
@@ -352,6 +551,20 @@ class ProcessingTool:
             udunits = str(self.pDefaultSettings.udunitsXml) #UDUNITS_XML
         udunits = udunits.strip()
 
+        if pUdunitsUnitSystemCache.has_key(udunits): #Library with declared prototypes and its unit system
+            return pUdunitsUnitSystemCache[udunits]
+
+        #Pointers must not be truncated to integers
+        udunitsLib.ut_read_xml.restype = c_void_p
+        udunitsLib.ut_parse.restype = c_void_p
+        udunitsLib.ut_parse.argtypes = [c_void_p, c_char_p, c_int]
+        udunitsLib.ut_free.argtypes = [c_void_p]
+        udunitsLib.ut_get_converter.restype = c_void_p
+        udunitsLib.ut_get_converter.argtypes = [c_void_p, c_void_p]
+        udunitsLib.cv_convert_double.restype = c_double
+        udunitsLib.cv_convert_double.argtypes = [c_void_p, c_double]
+        udunitsLib.cv_free.argtypes = [c_void_p]
+
 
         #Initialization of Udunits2
         #-------------------------------------------------------------------------------
@@ -372,20 +585,9 @@ class ProcessingTool:
 
         old_handler = ut_set_error_message_handler(ut_write_to_stderr)
 
+        pUdunitsUnitSystemCache[udunits] = (udunitsLib, udunitsUnitSystem)
 
-        # Check if unit is recognized by Udunits package
-        #-------------------------------------------------------------------------------
-        # !Checks obviously no numbers if they are of type string!
-
-        udunitsUnit = udunitsLib.ut_parse(udunitsUnitSystem, unit, "UT_ASCII")
-        if udunitsUnit: #Unit recognized
-            isUdunits = True
-        else: #Unit not recognized
-            isUdunits = False
-
-        udunitsLib.ut_free(udunitsUnit) #Free up udunitsUnit ressources
-
-        return isUdunits
+        return (udunitsLib, udunitsUnitSystem)
 
 
 
@@ -746,28 +948,37 @@ class ProcessNcml(ProcessXml):
     def fillNcmlMacroWithNumpy(self, pNumpyData_):
         """Fill metadata in NCML file by the metadata that can be extracted out of 
         input numpy data array (numpy array in shape of grid or station file)"""
+
+        self.fillNcmlMacroWithShape(pNumpyData_.shape, pNumpyData_.dtype)
+        return
+
+
+    def fillNcmlMacroWithShape(self, pShape_, pDataType_):
+        """Fill metadata in NCML file by the shape 'pShape' (tuple) and the data type 'pDataType' (numpy dtype)
+        of a numpy data array in shape of grid or station file. The array itself is not needed."""
     
-        #Get metadata information from file
+        #Get metadata information from shape
         #-------------------------------------------------------------------------------
-        pNumpyData = pNumpyData_
+        pShape = tuple(pShape_)
+        pDataType = numpy.dtype(pDataType_)
 
-        if pNumpyData.ndim == 2: #(time, variable) considered as station data
-            dimVar = pNumpyData.shape[1] #Number of variables in table
-            dimT = pNumpyData.shape[0]  #Time Dimension
+        if len(pShape) == 2: #(time, variable) considered as station data
+            dimVar = pShape[1] #Number of variables in table
+            dimT = pShape[0]  #Time Dimension
             dimZ = int(1) #Station only has one coordinate
             dimY = int(1)
             dimX = int(1)
 
-        elif pNumpyData.ndim == 5: #(variable, time, z, lat, lon) considered as grid data
-            dimVar = pNumpyData.shape[0] #Number of variables in array
-            dimT = pNumpyData.shape[1] #Time Dimension
-            dimZ = pNumpyData.shape[2] #Height Dimensions
-            dimY = pNumpyData.shape[3] #Last but one axis top to bottom: lat -> row
-            dimX = pNumpyData.shape[4] #Last axis left to right: lon -> col
+        elif len(pShape) == 5: #(variable, time, z, lat, lon) considered as grid data
+            dimVar = pShape[0] #Number of variables in array
+            dimT = pShape[1] #Time Dimension
+            dimZ = pShape[2] #Height Dimensions
+            dimY = pShape[3] #Last but one axis top to bottom: lat -> row
+            dimX = pShape[4] #Last axis left to right: lon -> col
 
         else:
             raise Exception("Error: Numpy data file can't be read since number of dimensions '" \
-            + str(pNumpyData.ndim) + "' is not allowed.")
+            + str(len(pShape)) + "' is not allowed.")
 
         #Write metadata NCML file
         #-------------------------------------------------------------------------------
@@ -782,11 +993,11 @@ class ProcessNcml(ProcessXml):
             varName = 'variable #'+str(i_var)
             stringVarShape = str(self.pDefaultSettings.axisTimeName) + " " + str(self.pDefaultSettings.axisHeightName) \
                 + " " + str(self.pDefaultSettings.axisLatitudeName) + " " + str(self.pDefaultSettings.axisLongitudeName)
-            self.addVariable(varName, stringVarShape, str(pNumpyData.dtype))
+            self.addVariable(varName, stringVarShape, str(pDataType))
             self.addLocalAttribute(varName, "units", "", "", "")
             self.addLocalAttribute(varName, "long_name", "", "", "")
             self.addLocalAttribute(varName, "standard_name", "", "", "")
-            self.addLocalAttribute(varName, "_FillValue", "", str(pNumpyData.dtype), "")
+            self.addLocalAttribute(varName, "_FillValue", "", str(pDataType), "")
 
         return
 
@@ -48,6 +48,9 @@ import logging
 INTERFACE_LOGGER_ROOT = 'interface' #Logger root name for interface
 FILENAME_DEFAULT_SETTINGS_XML = 'interface_Settings.xml' #Logger file name
 
+CHECK_CACHE_DIRECTORY = '.checkcache' #Directory for cached results of NetCDF file checks
+CHECK_CACHE_MAX_ENTRIES = 5000 #Least recently used check results are removed if more results are cached
+
 
 #Constants declaring filename suffixes
 #-------------------------------------------------------------------------------